@@ -0,0 +1,218 @@
+# api_clients.py - реестр API клиентов (сборки лаунчера, плагины серверов, реселлеры)
+#
+# Ключи хранятся в таблице api_clients только в виде sha256 дайджеста. Сервер
+# держит словарь дайджест -> клиент в памяти и перечитывает таблицу, когда она
+# меняется, поэтому ротация ключей не требует перезапуска.
+#
+# Управление:
+#   python api_clients.py add --name "Launcher 1.4" --kind launcher --scopes auth,stats --rate 50
+#   python api_clients.py add --name "Shop" --kind reseller --scopes keys --key-quota 10000
+#   python api_clients.py add --name "Prometheus" --kind monitoring --scopes metrics --rate 5
+#   python api_clients.py rotate 3
+#   python api_clients.py revoke 3
+#   python api_clients.py list
+import argparse
+import hashlib
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+
+from ratelimit import TokenBucket
+
+SCOPES = ("auth", "stats", "keys", "payments", "metrics")
+KINDS = ("launcher", "plugin", "reseller", "monitoring")
+
+
+def hash_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def generate_api_key() -> str:
+    return "rc_" + secrets.token_urlsafe(32)
+
+
+class ApiClient:
+    __slots__ = ("id", "name", "kind", "digest", "scopes", "rate_limit", "key_quota")
+
+    def __init__(self, id: int, name: str, kind: str, digest: str, scopes: FrozenSet[str], rate_limit: float,
+                 key_quota: Optional[int] = None):
+        self.id = id
+        self.name = name
+        self.kind = kind
+        self.digest = digest
+        self.scopes = scopes
+        self.rate_limit = rate_limit
+        self.key_quota = key_quota  # ключей в сутки, None — общая квота из config
+
+
+class ApiClientRegistry:
+    """Клиенты API в памяти: поиск по дайджесту ключа и лимит запросов на клиента"""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], reload_interval: float = 30):
+        self.connect = connect
+        self.reload_interval = reload_interval
+        self._static: Dict[str, ApiClient] = {}
+        self._clients: Dict[str, ApiClient] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._fingerprint: Optional[Tuple] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def add_static(self, client_id: int, name: str, kind: str, api_key: str, scopes, rate_limit: float):
+        """Клиент, заданный в коде (общий ключ старых лаунчеров)"""
+        client = ApiClient(client_id, name, kind, hash_key(api_key), frozenset(scopes), rate_limit)
+        self._static[client.digest] = client
+        self._clients = {**self._clients, client.digest: client}
+
+    def _read_fingerprint(self, conn) -> Tuple:
+        return tuple(conn.execute("SELECT COUNT(*), MAX(updated_at) FROM api_clients").fetchone())
+
+    def load(self):
+        """Полная перезагрузка реестра из БД"""
+        clients = dict(self._static)
+        try:
+            conn = self.connect()
+            try:
+                fingerprint = self._read_fingerprint(conn)
+                rows = conn.execute('''
+                    SELECT id, name, kind, key_digest, scopes, rate_limit, key_quota
+                    FROM api_clients WHERE is_active = 1
+                ''').fetchall()
+            finally:
+                conn.close()
+        except sqlite3.OperationalError as e:
+            # Таблицы ещё нет (БД не инициализирована ботом) — работаем со статическими клиентами
+            print(f"[ApiClients] Реестр недоступен: {e}")
+            fingerprint, rows = None, []
+
+        for row in rows:
+            client_id, name, kind, digest, scopes, rate_limit, key_quota = tuple(row)
+            scope_set = frozenset(s.strip() for s in (scopes or "").split(",") if s.strip())
+            clients[digest] = ApiClient(client_id, name, kind, digest, scope_set, rate_limit or 10, key_quota)
+
+        # Замена словаря целиком — читатели без блокировки видят либо старый, либо новый
+        self._clients = clients
+        self._fingerprint = fingerprint
+        self._loaded = True
+
+    def reload_if_changed(self) -> bool:
+        try:
+            conn = self.connect()
+            try:
+                fingerprint = self._read_fingerprint(conn)
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            return False
+
+        if fingerprint == self._fingerprint:
+            return False
+        self.load()
+        return True
+
+    def run_reloader(self):
+        """Фоновая проверка изменений таблицы api_clients"""
+        while True:
+            time.sleep(self.reload_interval)
+            if self.reload_if_changed():
+                print(f"[ApiClients] Реестр перезагружен: {len(self._clients)} клиентов")
+
+    def authenticate(self, api_key: str) -> Optional[ApiClient]:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+        # Поиск идёт по sha256 от ключа, а не по самому ключу: время поиска в
+        # словаре не даёт подобрать ключ по символам, отдельное сравнение не нужно
+        return self._clients.get(hash_key(api_key))
+
+    def throttle(self, client: ApiClient) -> float:
+        """Лимит запросов клиента: 0 — можно, иначе Retry-After в секундах"""
+        with self._lock:
+            bucket = self._buckets.get(client.id)
+            if bucket is None or bucket.rate != client.rate_limit:
+                bucket = self._buckets[client.id] = TokenBucket(client.rate_limit, max(1.0, client.rate_limit * 2))
+            return bucket.consume()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+# ==================== УПРАВЛЕНИЕ КЛИЕНТАМИ ====================
+
+def _parse_scopes(value: str) -> str:
+    scopes = [s.strip() for s in value.split(",") if s.strip()]
+    unknown = set(scopes) - set(SCOPES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Неизвестные права: {', '.join(sorted(unknown))}")
+    return ",".join(scopes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Управление API клиентами Raven Client")
+    parser.add_argument("--db", default="raven_client.db", help="Путь к базе данных")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Создать клиента и выдать ключ")
+    add.add_argument("--name", required=True)
+    add.add_argument("--kind", choices=KINDS, required=True)
+    add.add_argument("--scopes", type=_parse_scopes, required=True, help=f"Через запятую: {','.join(SCOPES)}")
+    add.add_argument("--rate", type=float, default=10, help="Запросов в секунду")
+    add.add_argument("--key-quota", type=int, help="Ключей в сутки через /api/keys/batch (по умолчанию — из config)")
+
+    rotate = commands.add_parser("rotate", help="Выдать клиенту новый ключ (старый перестаёт работать)")
+    rotate.add_argument("client_id", type=int)
+
+    revoke = commands.add_parser("revoke", help="Отключить клиента")
+    revoke.add_argument("client_id", type=int)
+
+    commands.add_parser("list", help="Список клиентов")
+    args = parser.parse_args()
+
+    from database import Database
+    Database(args.db)
+
+    conn = sqlite3.connect(args.db)
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+
+    if args.command == "add":
+        api_key = generate_api_key()
+        cursor.execute('''
+            INSERT INTO api_clients (name, kind, key_digest, scopes, rate_limit, key_quota, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (args.name, args.kind, hash_key(api_key), args.scopes, args.rate, args.key_quota, now, now))
+        print(f"✅ Клиент #{cursor.lastrowid} создан\n🔑 Ключ (показывается один раз): {api_key}")
+    elif args.command == "rotate":
+        api_key = generate_api_key()
+        cursor.execute('''
+            UPDATE api_clients SET key_digest = ?, updated_at = ? WHERE id = ?
+        ''', (hash_key(api_key), now, args.client_id))
+        if cursor.rowcount:
+            print(f"✅ Ключ клиента #{args.client_id} заменён\n🔑 Новый ключ: {api_key}")
+        else:
+            print("❌ Клиент не найден")
+    elif args.command == "revoke":
+        cursor.execute('''
+            UPDATE api_clients SET is_active = 0, updated_at = ? WHERE id = ?
+        ''', (now, args.client_id))
+        print(f"✅ Клиент #{args.client_id} отключён" if cursor.rowcount else "❌ Клиент не найден")
+    else:
+        for row in cursor.execute('''
+            SELECT id, name, kind, scopes, rate_limit, key_quota, is_active, updated_at FROM api_clients
+        '''):
+            client_id, name, kind, scopes, rate_limit, key_quota, is_active, updated_at = row
+            status = "✅" if is_active else "🚫"
+            quota = f" | ключей/сутки: {key_quota}" if key_quota is not None else ""
+            print(f"{status} #{client_id} {name} [{kind}] права: {scopes} | {rate_limit}/с{quota} | изменён {updated_at}")
+
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,151 @@
 # api_server.py - API сервер для связи бота и лаунчера
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from functools import wraps
 import hashlib
+import hmac
+import json
+import math
+import queue
 import secrets
 import time
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import threading
 
+import keycodes
+import passwords
+from api_clients import ApiClientRegistry
+from config import (
+    PAYMENT_PROVIDER_SECRETS, PAYMENT_WEBHOOK_TOLERANCE, KEY_BATCH_MAX, KEY_DAILY_QUOTA, KEY_STATUS_MAX
+)
+from metrics import REGISTRY, CONTENT_TYPE, Counter, Gauge, Histogram, record_cache
+from ratelimit import RateLimiter, TTLCache
+
 app = Flask(__name__)
 
 # ⚠️ ВАЖНО: Этот ключ должен совпадать с ключом в лаунчере!
 API_SECRET = "RavenClient_SuperSecret_2024!@#$"
 DB_PATH = "raven_client.db"
 
+# Лимиты попыток входа (token bucket: токенов в секунду, размер ведра)
+LOGIN_IP_RATE, LOGIN_IP_BURST = 1.0, 10
+LOGIN_NICKNAME_RATE, LOGIN_NICKNAME_BURST = 0.2, 5
+FAILED_LOGIN_TTL = 60  # сколько секунд помнить неверный пароль существующего ника
+
 # Хранилище активных сессий
 active_sessions = {}
 
+login_ip_limiter = RateLimiter(LOGIN_IP_RATE, LOGIN_IP_BURST)
+login_nickname_limiter = RateLimiter(LOGIN_NICKNAME_RATE, LOGIN_NICKNAME_BURST)
+failed_logins = TTLCache(FAILED_LOGIN_TTL)
+
+# Очередь записей в таблицу logs (пишутся фоновым потоком пачками)
+log_queue = queue.Queue()
+workers_started = False
+
+# ==================== МЕТРИКИ ====================
+
+REQUESTS = Counter("raven_api_requests_total", "Запросы к API по маршруту и статусу", ("route", "method", "status"))
+REQUEST_LATENCY = Histogram("raven_api_request_seconds", "Время обработки запроса", ("route",))
+DB_QUERY_LATENCY = Histogram("raven_api_db_query_seconds", "Время SQL запросов по меткам", ("statement",))
+SESSIONS_EXPIRED = Counter("raven_api_sessions_expired_total", "Удалённые истекшие сессии")
+ACTIVE_SESSIONS = Gauge("raven_api_active_sessions", "Количество активных сессий")
+ACTIVE_SESSIONS.set_function(lambda: len(active_sessions))
+LOG_QUEUE_DEPTH = Gauge("raven_api_log_queue_depth", "Записи логов, ожидающие сохранения")
+LOG_QUEUE_DEPTH.set_function(lambda: log_queue.qsize())
+PASSWORD_REHASHED = Counter("raven_api_password_rehashed_total", "Пароли, перехэшированные при входе")
+LOGIN_THROTTLED = Counter("raven_api_login_throttled_total", "Отклонённые лимитером попытки входа", ("limiter",))
+AUTH_FAILURES = Counter("raven_api_auth_failures_total", "Отклонённые API ключи", ("reason",))
+CLIENT_REQUESTS = Counter("raven_api_client_requests_total", "Запросы по API клиентам", ("client",))
+KEYS_ISSUED = Counter("raven_api_keys_issued_total", "Ключи, выпущенные через API", ("client",))
+KEY_ORDERS = Counter("raven_api_key_orders_total", "Заказы ключей по итогу", ("result",))
+PAYMENT_WEBHOOKS = Counter("raven_api_payment_webhooks_total", "Уведомления платёжных провайдеров", ("provider", "result"))
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, route=route)
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+def too_many_requests(retry_after: float, what: str = "попыток входа"):
+    """Ответ 429 с заголовком Retry-After"""
+    seconds = max(1, math.ceil(retry_after))
+    response = jsonify({
+        "success": False,
+        "error": f"Слишком много {what}. Повторите через {seconds} сек."
+    })
+    response.headers['Retry-After'] = str(seconds)
+    return response, 429
+
 def get_db():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
-def verify_api_key(f):
-    """Декоратор для проверки API ключа"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        api_key = request.headers.get('X-API-Key')
-        if not api_key:
-            return jsonify({"success": False, "error": "API key required"}), 401
-        
-        expected_key = hashlib.sha256(API_SECRET.encode()).hexdigest()[:32]
-        if api_key != expected_key:
-            return jsonify({"success": False, "error": "Invalid API key"}), 401
-        
-        return f(*args, **kwargs)
-    return decorated
+def db_execute(cursor, label: str, sql: str, params=()):
+    """Выполнение запроса с замером времени по метке"""
+    with DB_QUERY_LATENCY.time(statement=label):
+        return cursor.execute(sql, params)
+
+def log_action(user_id: int, action: str, details: str):
+    """Постановка записи лога в очередь (без блокировки запроса)"""
+    log_queue.put((user_id, action, details, datetime.now().isoformat()))
+
+# Реестр API клиентов. Общий ключ старых лаунчеров остаётся как клиент #0
+api_clients = ApiClientRegistry(get_db)
+api_clients.add_static(
+    0, "legacy launcher", "launcher",
+    hashlib.sha256(API_SECRET.encode()).hexdigest()[:32],
+    scopes=("auth", "stats"), rate_limit=1000
+)
+
+def verify_api_key(scope: str):
+    """Декоратор для проверки API ключа и прав клиента"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            api_key = request.headers.get('X-API-Key')
+            if not api_key:
+                AUTH_FAILURES.inc(reason="missing")
+                return jsonify({"success": False, "error": "API key required"}), 401
+            
+            client = api_clients.authenticate(api_key)
+            if client is None:
+                AUTH_FAILURES.inc(reason="invalid")
+                return jsonify({"success": False, "error": "Invalid API key"}), 401
+            
+            if scope not in client.scopes:
+                AUTH_FAILURES.inc(reason="scope")
+                return jsonify({"success": False, "error": "Insufficient scope"}), 403
+            
+            retry_after = api_clients.throttle(client)
+            if retry_after:
+                AUTH_FAILURES.inc(reason="rate_limit")
+                return too_many_requests(retry_after, "запросов")
+            
+            CLIENT_REQUESTS.inc(client=client.name)
+            g.api_client = client
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+@app.route('/metrics', methods=['GET'])
+@verify_api_key('metrics')
+def metrics():
+    """Метрики в формате Prometheus (в них имена клиентов, поэтому только по ключу)"""
+    return Response(REGISTRY.render(), headers={"Content-Type": CONTENT_TYPE})
 
 # ==================== АВТОРИЗАЦИЯ ====================
 
 @app.route('/api/auth/login', methods=['POST'])
-@verify_api_key
+@verify_api_key('auth')
 def login():
     """Авторизация пользователя"""
     data = request.json
@@ -55,18 +160,51 @@ def login():
             "error": "Никнейм и пароль обязательны"
         })
     
+    # Лимиты по IP и по никнейму
+    retry_after = login_ip_limiter.hit(request.remote_addr)
+    if retry_after:
+        LOGIN_THROTTLED.inc(limiter="ip")
+        return too_many_requests(retry_after)
+    
+    retry_after = login_nickname_limiter.hit(nickname.lower())
+    if retry_after:
+        LOGIN_THROTTLED.inc(limiter="nickname")
+        return too_many_requests(retry_after)
+    
+    # Недавно неудачная пара ник/пароль — не трогаем БД
+    failed_key = (nickname, hashlib.sha256(password.encode()).hexdigest())
+    is_failed = failed_key in failed_logins
+    record_cache("login_failed", is_failed)
+    if is_failed:
+        return jsonify({
+            "success": False,
+            "error": "Неверный никнейм или пароль"
+        })
+    
     conn = get_db()
     cursor = conn.cursor()
     
-    # Ищем пользователя
-    cursor.execute(
-        "SELECT * FROM users WHERE nickname = ? AND password = ?",
-        (nickname, password)
-    )
-    user = cursor.fetchone()
+    # Ищем пользователя (пароль проверяется в пуле хэширования)
+    db_execute(cursor, "select_user_login", "SELECT * FROM users WHERE nickname = ?", (nickname,))
+    rows = cursor.fetchall()
+    user = None
+    try:
+        for row in rows:
+            if passwords.pool.run(passwords.verify_password, password, row['password']):
+                user = row
+                break
+    except passwords.HashPoolBusy:
+        conn.close()
+        response = jsonify({"success": False, "error": "Сервер перегружен, повторите попытку"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     
     if not user:
         conn.close()
+        # Кэшируем только неверный пароль существующего аккаунта: ник, которого
+        # ещё нет, может через секунду зарегистрироваться в боте (другой процесс)
+        if rows:
+            failed_logins.set(failed_key)
         return jsonify({
             "success": False,
             "error": "Неверный никнейм или пароль"
@@ -74,6 +212,13 @@ def login():
     
     user = dict(user)
     
+    # Старый открытый пароль или устаревшие параметры — перехэшируем в фоне
+    if passwords.needs_rehash(user['password']):
+        try:
+            passwords.pool.submit(rehash_password, user['user_id'], password, user['password'])
+        except passwords.HashPoolBusy:
+            pass  # перехэшируем при следующем входе
+    
     # Проверяем бан
     if user['is_banned'] == 1:
         conn.close()
@@ -92,7 +237,8 @@ def login():
     
     # Привязываем HWID если не привязан
     if not user['hwid'] and hwid:
-        cursor.execute(
+        db_execute(
+            cursor, "update_hwid",
             "UPDATE users SET hwid = ? WHERE user_id = ?",
             (hwid, user['user_id'])
         )
@@ -119,14 +265,11 @@ def login():
     }
     active_sessions[session_token] = session_data
     
-    # Логируем вход
-    cursor.execute('''
-        INSERT INTO logs (user_id, action, details, created_at)
-        VALUES (?, 'LAUNCHER_LOGIN', ?, ?)
-    ''', (user['user_id'], f"HWID: {hwid[:16]}...", datetime.now().isoformat()))
-    conn.commit()
     conn.close()
     
+    # Логируем вход
+    log_action(user['user_id'], 'LAUNCHER_LOGIN', f"HWID: {hwid[:16]}...")
+    
     # Получаем инфо о подписке
     sub_info = get_subscription_info(user)
     
@@ -141,7 +284,7 @@ def login():
     })
 
 @app.route('/api/auth/verify_session', methods=['POST'])
-@verify_api_key
+@verify_api_key('auth')
 def verify_session():
     """Проверка активной сессии"""
     data = request.json
@@ -165,7 +308,7 @@ def verify_session():
     # Проверяем пользователя в БД
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE user_id = ?", (session['user_id'],))
+    db_execute(cursor, "select_user_session", "SELECT * FROM users WHERE user_id = ?", (session['user_id'],))
     user = cursor.fetchone()
     conn.close()
     
@@ -192,7 +335,7 @@ def verify_session():
     })
 
 @app.route('/api/auth/logout', methods=['POST'])
-@verify_api_key
+@verify_api_key('auth')
 def logout():
     """Выход из сессии"""
     data = request.json
@@ -205,6 +348,22 @@ def logout():
 
 # ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
 
+def rehash_password(user_id: int, password: str, old_stored: str):
+    """Замена пароля на хэш с текущими параметрами (выполняется в пуле хэширования)"""
+    new_stored = passwords.hash_password(password)
+    conn = get_db()
+    cursor = conn.cursor()
+    # Условие на старое значение — не затираем пароль, если его успели сменить
+    db_execute(
+        cursor, "update_password_hash",
+        "UPDATE users SET password = ? WHERE user_id = ? AND password = ?",
+        (new_stored, user_id, old_stored)
+    )
+    conn.commit()
+    conn.close()
+    if cursor.rowcount:
+        PASSWORD_REHASHED.inc()
+
 def check_subscription(user: dict) -> bool:
     """Проверка активности подписки"""
     if not user.get('subscription_end'):
@@ -242,16 +401,217 @@ def get_subscription_info(user: dict) -> dict:
     except:
         return {"active": False, "type": None, "days_left": 0}
 
+# ==================== КЛЮЧИ (РЕСЕЛЛЕРЫ) ====================
+
+# Тариф -> дней (0 — навсегда), как у кнопок gen_key_* в админке
+KEY_DAYS = {'1_day': 1, '14_days': 14, '30_days': 30, 'forever': 0}
+
+def order_keys(cursor, order_id: int) -> list:
+    db_execute(cursor, "select_order_keys", "SELECT key FROM keys WHERE order_id = ? ORDER BY id", (order_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+@app.route('/api/keys/batch', methods=['POST'])
+@verify_api_key('keys')
+def issue_keys():
+    """Заказ пачки ключей.
+    
+    Заголовок Idempotency-Key обязателен: повтор запроса с тем же ключом (обрыв
+    связи, ретрай) возвращает уже выпущенные ключи, а не новую пачку. Проверка
+    заказа, квоты и вставка всех ключей идут одной транзакцией.
+    """
+    client = g.api_client
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+    if not idempotency_key or len(idempotency_key) > 128:
+        return jsonify({"success": False, "error": "Idempotency-Key header required"}), 400
+    
+    data = request.get_json(silent=True) or {}
+    tariff = data.get('tariff')
+    count = data.get('count')
+    if tariff not in KEY_DAYS or not isinstance(count, int) or not 1 <= count <= KEY_BATCH_MAX:
+        return jsonify({
+            "success": False,
+            "error": f"tariff: {', '.join(KEY_DAYS)}; count: 1..{KEY_BATCH_MAX}"
+        }), 400
+    
+    now = datetime.now()
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        db_execute(
+            cursor, "select_key_order",
+            "SELECT id, key_type, count, created_at FROM key_orders WHERE client_id = ? AND idempotency_key = ?",
+            (client.id, idempotency_key)
+        )
+        order = cursor.fetchone()
+        if order:
+            if (order['key_type'], order['count']) != (tariff, count):
+                KEY_ORDERS.inc(result="conflict")
+                return jsonify({"success": False, "error": "Idempotency-Key already used for another order"}), 409
+            KEY_ORDERS.inc(result="replayed")
+            return jsonify({
+                "success": True, "order_id": order['id'], "replayed": True,
+                "tariff": tariff, "keys": order_keys(cursor, order['id'])
+            })
+        
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        db_execute(
+            cursor, "sum_key_orders",
+            "SELECT COALESCE(SUM(count), 0) FROM key_orders WHERE client_id = ? AND created_at >= ?",
+            (client.id, day_start.isoformat())
+        )
+        quota = client.key_quota if client.key_quota is not None else KEY_DAILY_QUOTA
+        issued_today = cursor.fetchone()[0]
+        if issued_today + count > quota:
+            KEY_ORDERS.inc(result="quota")
+            response = jsonify({
+                "success": False,
+                "error": f"Суточная квота ключей: {quota}",
+                "remaining": max(0, quota - issued_today)
+            })
+            # Квота обновляется в полночь
+            response.headers['Retry-After'] = str(math.ceil((day_start + timedelta(days=1) - now).total_seconds()))
+            return response, 429
+        
+        db_execute(
+            cursor, "insert_key_order",
+            "INSERT INTO key_orders (client_id, idempotency_key, key_type, count, created_at) VALUES (?, ?, ?, ?, ?)",
+            (client.id, idempotency_key, tariff, count, now.isoformat())
+        )
+        order_id = cursor.lastrowid
+        keys = [keycodes.generate_key() for _ in range(count)]
+        with DB_QUERY_LATENCY.time(statement="insert_keys"):
+            cursor.executemany(
+                "INSERT INTO keys (key, key_type, days, created_at, order_id) VALUES (?, ?, ?, ?, ?)",
+                [(key, tariff, KEY_DAYS[tariff], now.isoformat(), order_id) for key in keys]
+            )
+        conn.commit()
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+    
+    KEY_ORDERS.inc(result="created")
+    KEYS_ISSUED.inc(count, client=client.name)
+    return jsonify({"success": True, "order_id": order_id, "replayed": False, "tariff": tariff, "keys": keys})
+
+@app.route('/api/keys/status', methods=['GET'])
+@verify_api_key('keys')
+def keys_status():
+    """Статус ключей клиента: ?keys=K1,K2,... (до KEY_STATUS_MAX) или ?order=<Idempotency-Key>.
+    
+    Видны только ключи из заказов этого клиента, чужие отвечают not_found.
+    """
+    client = g.api_client
+    conn = get_db()
+    cursor = conn.cursor()
+    order = request.args.get('order')
+    if order is not None:
+        db_execute(cursor, "select_order_keys_status", '''
+            SELECT k.key, k.key_type, k.is_used, k.used_at
+            FROM key_orders o JOIN keys k ON k.order_id = o.id
+            WHERE o.client_id = ? AND o.idempotency_key = ?
+            ORDER BY k.id
+        ''', (client.id, order))
+        requested = None
+    else:
+        raw = [value for value in request.args.get('keys', '').split(',') if value.strip()]
+        if not raw or len(raw) > KEY_STATUS_MAX:
+            conn.close()
+            return jsonify({"success": False, "error": f"keys: 1..{KEY_STATUS_MAX} через запятую или order"}), 400
+        requested = {value.strip(): keycodes.parse_key(value) for value in raw}
+        valid = sorted({key for key in requested.values() if key})
+        placeholders = ", ".join("?" * len(valid))
+        db_execute(cursor, "select_keys_status", f'''
+            SELECT k.key, k.key_type, k.is_used, k.used_at
+            FROM keys k JOIN key_orders o ON o.id = k.order_id
+            WHERE k.key IN ({placeholders}) AND o.client_id = ?
+        ''', (*valid, client.id))
+    found = {
+        row['key']: {
+            "status": "used" if row['is_used'] else "unused",
+            "tariff": row['key_type'],
+            "used_at": row['used_at']
+        }
+        for row in cursor.fetchall()
+    }
+    conn.close()
+    
+    if requested is not None:
+        found = {
+            value: found.get(key) or {"status": "invalid" if key is None else "not_found"}
+            for value, key in requested.items()
+        }
+    return jsonify({"success": True, "keys": found})
+
+# ==================== ПЛАТЕЖИ ====================
+
+def payment_signature(secret: str, timestamp: str, body: bytes) -> str:
+    """HMAC-SHA256 от "<timestamp>.<тело>" — так же подписывает fake_provider.py"""
+    return hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+
+@app.route('/api/payments/webhook/<provider>', methods=['POST'])
+def payment_webhook(provider):
+    """Уведомление провайдера об оплате.
+    
+    Событие только сохраняется в payment_events (повтор того же txn_id —
+    дубликат, 200 без изменений), подтверждает платёж воркер бота
+    (payment_events.py). Поэтому ответ быстрый, а провайдер, не получивший
+    ответа, может спокойно повторить запрос.
+    """
+    secret = PAYMENT_PROVIDER_SECRETS.get(provider)
+    if secret is None:
+        PAYMENT_WEBHOOKS.inc(provider="unknown", result="unknown_provider")
+        return jsonify({"success": False, "error": "Unknown provider"}), 404
+    
+    body = request.get_data()
+    timestamp = request.headers.get('X-Timestamp', '')
+    signature = request.headers.get('X-Signature', '')
+    try:
+        fresh = abs(time.time() - int(timestamp)) <= PAYMENT_WEBHOOK_TOLERANCE
+    except ValueError:
+        fresh = False
+    if not fresh or not hmac.compare_digest(payment_signature(secret, timestamp, body), signature):
+        PAYMENT_WEBHOOKS.inc(provider=provider, result="bad_signature")
+        return jsonify({"success": False, "error": "Invalid signature"}), 401
+    
+    try:
+        event = json.loads(body)
+        txn_id = str(event['txn_id'])
+        payment_id = int(event['order_id'])
+        amount = float(event['amount'])
+        event_type = str(event.get('status', 'paid'))
+    except (ValueError, TypeError, KeyError):
+        PAYMENT_WEBHOOKS.inc(provider=provider, result="bad_payload")
+        return jsonify({"success": False, "error": "Invalid payload"}), 400
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    db_execute(
+        cursor, "insert_payment_event",
+        '''INSERT OR IGNORE INTO payment_events
+           (provider, txn_id, payment_id, amount, event_type, payload, received_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        (provider, txn_id, payment_id, amount, event_type, body.decode(errors='replace'), datetime.now().isoformat())
+    )
+    conn.commit()
+    duplicate = cursor.rowcount == 0
+    conn.close()
+    
+    PAYMENT_WEBHOOKS.inc(provider=provider, result="duplicate" if duplicate else "accepted")
+    return jsonify({"success": True, "duplicate": duplicate})
+
 # ==================== СТАТИСТИКА ====================
 
 @app.route('/api/stats/online', methods=['GET'])
-@verify_api_key
+@verify_api_key('stats')
 def get_online():
     """Получение количества онлайн пользователей"""
     current_time = time.time()
     expired = [k for k, v in active_sessions.items() if current_time > v['expires_at']]
     for k in expired:
-        del active_sessions[k]
+        active_sessions.pop(k, None)
+    SESSIONS_EXPIRED.inc(len(expired))
     
     return jsonify({
         "success": True,
@@ -267,12 +627,45 @@ def cleanup_sessions():
         current_time = time.time()
         expired = [k for k, v in active_sessions.items() if current_time > v['expires_at']]
         for k in expired:
-            del active_sessions[k]
+            active_sessions.pop(k, None)
+        SESSIONS_EXPIRED.inc(len(expired))
         print(f"[Cleanup] Удалено {len(expired)} истекших сессий")
 
+def log_writer():
+    """Фоновая запись логов пачками"""
+    while True:
+        batch = [log_queue.get()]
+        while len(batch) < 500:
+            try:
+                batch.append(log_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        try:
+            conn = get_db()
+            with DB_QUERY_LATENCY.time(statement="insert_logs"):
+                conn.executemany('''
+                    INSERT INTO logs (user_id, action, details, created_at)
+                    VALUES (?, ?, ?, ?)
+                ''', batch)
+                conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"[Logs] Ошибка записи {len(batch)} логов: {e}")
+
+def start_background_workers():
+    """Запуск фоновых потоков сервера (однократно)"""
+    global workers_started
+    if workers_started:
+        return
+    workers_started = True
+    threading.Thread(target=cleanup_sessions, daemon=True).start()
+    threading.Thread(target=log_writer, daemon=True).start()
+    api_clients.load()
+    threading.Thread(target=api_clients.run_reloader, daemon=True).start()
+
 if __name__ == '__main__':
-    cleanup_thread = threading.Thread(target=cleanup_sessions, daemon=True)
-    cleanup_thread.start()
+    start_background_workers()
     
     print("=" * 50)
     print("🚀 Raven Client API Server")
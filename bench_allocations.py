@@ -0,0 +1,157 @@
+# bench_allocations.py - память, выделяемая на один апдейт и на одну клавиатуру
+#
+# 1. Клавиатуры: каждая функция из keyboards.py вызывается N раз, результаты
+#    сохраняются; прирост памяти / N — сколько байт новых объектов даёт вызов.
+# 2. Апдейты: типичные нажатия (меню, профиль, покупка, админка) прогоняются
+#    через диспетчер с настоящими роутерами и middleware, Telegram подменён
+#    заглушкой. Для каждого апдейта считается пик выделенной памяти (tracemalloc)
+#    и время.
+#
+# БД создаётся во временном каталоге. Пример:
+#   python bench_allocations.py --rounds 300
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp(prefix="raven_bench_"))
+
+import config  # noqa: E402
+
+BENCH_ADMIN = 1
+BENCH_USER = 2
+config.ADMIN_IDS[:] = [BENCH_ADMIN]
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+import callbacks as cb  # noqa: E402
+import keyboards  # noqa: E402
+from database import db  # noqa: E402
+from handlers import user, admin, payment  # noqa: E402
+from middlewares.user_context import UserContextMiddleware  # noqa: E402
+
+
+class NullSession(BaseSession):
+    """Сессия без сети: любой метод Telegram сразу успешен"""
+
+    async def make_request(self, bot, method, timeout=None):
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+KEYBOARDS = {
+    "main_menu_keyboard": (),
+    "admin_menu_keyboard": (),
+    "subscription_keyboard": (),
+    "back_to_menu_keyboard": (),
+    "payment_keyboard": ("30_days",),
+    "user_manage_keyboard": (BENCH_USER, False, True),
+    "payment_confirm_keyboard": (1, BENCH_USER),
+}
+
+UPDATES = {
+    "main_menu": (BENCH_USER, cb.MAIN_MENU.pack()),
+    "profile": (BENCH_USER, cb.PROFILE.pack()),
+    "buy_menu": (BENCH_USER, cb.BUY_MENU.pack()),
+    "buy_tariff": (BENCH_USER, cb.BUY.pack("30_days")),
+    "admin_stats": (BENCH_ADMIN, cb.ADMIN_STATS.pack()),
+    "manage_user": (BENCH_ADMIN, cb.MANAGE_USER.pack(BENCH_USER)),
+}
+
+
+def bench_keyboards(calls: int) -> dict:
+    report = {}
+    for name, args in KEYBOARDS.items():
+        build = getattr(keyboards, name)
+        build(*args)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [build(*args) for _ in range(calls)]
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        report[name] = round((after - before) / calls, 1)
+        del kept
+    return report
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> Update:
+    user_obj = {"id": user_id, "is_bot": False, "first_name": "Bench"}
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "from": user_obj, "chat_instance": "bench", "data": data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": {"id": user_id, "type": "private"}, "text": "bench"}
+        }
+    })
+
+
+async def bench_updates(rounds: int) -> dict:
+    db.register_user(BENCH_ADMIN, "admin", "admin", "x")
+    db.register_user(BENCH_USER, "user", "bench_user", "x")
+    db.add_subscription(BENCH_USER, "30_days", 30)
+
+    bot = Bot("42:BENCH", session=NullSession())
+    dp = Dispatcher()
+    dp.message.outer_middleware(UserContextMiddleware())
+    dp.callback_query.outer_middleware(UserContextMiddleware())
+    dp.include_router(user.router)
+    dp.include_router(admin.router)
+    dp.include_router(payment.router)
+
+    report = {}
+    update_id = 0
+    for name, (user_id, data) in UPDATES.items():
+        updates = []
+        for _ in range(rounds):
+            update_id += 1
+            updates.append(callback_update(update_id, user_id, data))
+        for update in updates[:20]:  # прогрев
+            await dp.feed_update(bot, update)
+
+        peaks = []
+        tracemalloc.start()
+        start = time.perf_counter()
+        for update in updates:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            await dp.feed_update(bot, update)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        elapsed = time.perf_counter() - start
+        tracemalloc.stop()
+
+        peaks.sort()
+        report[name] = {
+            "peak_bytes_p50": peaks[len(peaks) // 2],
+            "peak_bytes_mean": round(sum(peaks) / len(peaks)),
+            "us_per_update": round(elapsed / rounds * 1e6, 1),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на апдейт и на клавиатуру")
+    parser.add_argument("--rounds", type=int, default=200, help="Апдейтов каждого вида")
+    parser.add_argument("--calls", type=int, default=2000, help="Вызовов каждой клавиатуры")
+    args = parser.parse_args()
+
+    report = {
+        "keyboard_bytes_per_call": bench_keyboards(args.calls),
+        "updates": asyncio.run(bench_updates(args.rounds)),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# bench_passwords.py - пропускная способность входа лаунчера при разной стоимости KDF
+#
+# Для каждой стоимости поднимает api_server на временной БД с паролями,
+# захэшированными с этой стоимостью, и в замкнутом цикле (--clients потоков)
+# вызывает /api/auth/login. Выводит JSON: входов в секунду и p50/p95/p99.
+#
+# Пример:
+#   python bench_passwords.py --algorithm pbkdf2_sha256 --costs 50000,100000,200000,400000
+#   python bench_passwords.py --algorithm scrypt --costs 12,13,14,15
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import passwords
+from load_test import LoadRunner, percentile, seed_users, start_server
+from ratelimit import RateLimiter
+
+
+def bench_cost(algorithm: str, cost: int, users: int, clients: int, duration: float) -> dict:
+    import api_server
+
+    passwords.algorithm = algorithm
+    passwords.cost = cost
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        accounts = seed_users(db_path, users)
+        server, api_key = start_server(db_path)
+        # Один и тот же ник логинится много раз подряд — лимит по нику здесь мешает
+        api_server.login_nickname_limiter = RateLimiter(rate=1e9, capacity=1e9)
+
+        runner = LoadRunner(server.server_port, api_key, accounts, {"login": 1})
+        deadline = time.perf_counter() + duration
+
+        def client_loop():
+            while time.perf_counter() < deadline:
+                runner.run_one("login")
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        server.shutdown()
+
+    latencies = sorted(runner.latencies["login"])
+    return {
+        "algorithm": algorithm,
+        "cost": cost,
+        "logins": len(latencies),
+        "errors": runner.errors["login"],
+        "logins_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк входа при разной стоимости хэширования паролей")
+    parser.add_argument("--algorithm", choices=passwords.ALGORITHMS, default=passwords.algorithm)
+    parser.add_argument("--costs", default="50000,100000,200000,400000",
+                        help="Через запятую: итерации PBKDF2 или log2 N для scrypt")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=16, help="Параллельных клиентов")
+    parser.add_argument("--duration", type=float, default=10, help="Секунд на каждую стоимость")
+    args = parser.parse_args()
+
+    results = [
+        bench_cost(args.algorithm, int(cost), args.users, args.clients, args.duration)
+        for cost in args.costs.split(",")
+    ]
+    print(json.dumps({
+        "hash_workers": passwords.pool.executor._max_workers,
+        "clients": args.clients,
+        "results": results,
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
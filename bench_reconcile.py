@@ -0,0 +1,84 @@
+# bench_reconcile.py - скорость сверки выписки (reconcile.py)
+#
+# Генерирует выписку CSV на N строк и N/2 ожидающих платежей: часть переводов
+# совпадает с заявками, часть без ID, с чужой суммой или дублирует перевод.
+# Замеряется чтение + сопоставление (без БД) и, отдельно, подтверждение
+# найденных платежей одной транзакцией во временной БД.
+#
+# Пример:
+#   python bench_reconcile.py --rows 10000
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp(prefix="raven_bench_"))
+
+from config import PRICES  # noqa: E402
+from database import db  # noqa: E402
+import reconcile  # noqa: E402
+
+
+def make_statement(pending, rows: int) -> bytes:
+    out = io.StringIO()
+    out.write("Дата;Номер операции;Сумма;Назначение платежа\n")
+    amounts = list(PRICES.values())
+    today = date.today().strftime("%d.%m.%Y")
+    for n in range(rows):
+        kind = random.random()
+        if kind < 0.6 and pending:
+            payment = random.choice(pending)
+            user_id, amount = payment['user_id'], payment['amount']
+        else:
+            user_id, amount = random.randrange(10 ** 8, 10 ** 10), random.choice(amounts)
+        comment = f"Перевод по СБП. Сообщение: {user_id}" if kind < 0.9 else "Перевод без комментария"
+        out.write(f"{today};{n};" + f"{amount:.2f}".replace(".", ",") + f";{comment}\n")
+    return out.getvalue().encode("cp1251")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сверки выписки")
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    sub_types = list(PRICES)
+    for n in range(args.rows // 2):
+        user_id = 10 ** 8 + n
+        db.register_user(user_id, None, f"user{n}", "x")
+        sub_type = random.choice(sub_types)
+        db.create_payment(user_id, PRICES[sub_type], sub_type)
+    pending = db.get_pending_payments()
+    statement = make_statement(pending, args.rows)
+
+    start = time.perf_counter()
+    report = reconcile.match_statement(
+        reconcile.read_statement(io.BytesIO(statement)), db.get_pending_payments(), db.get_used_txns(reconcile.PROVIDER)
+    )
+    match_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    confirmed = db.confirm_txn_payments(
+        reconcile.PROVIDER, [(row.txn_key, payment_id, row.amount / 100) for row, payment_id in report.matched], admin_id=1
+    )
+    confirm_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "rows": report.rows,
+        "pending": len(pending),
+        "matched": len(report.matched),
+        "ambiguous": len(report.ambiguous),
+        "unmatched": len(report.unmatched),
+        "confirmed": len(confirmed),
+        "match_seconds": round(match_seconds, 3),
+        "confirm_seconds": round(confirm_seconds, 3),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
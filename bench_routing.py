@@ -0,0 +1,155 @@
+# bench_routing.py - стоимость маршрутизации нажатий: F.data-фильтры против CallbackTable
+#
+# Собирает два диспетчера с одинаковым числом пустых хендлеров нажатий:
+#   - "filters": по хендлеру на префикс, F.data.startswith(...) — aiogram
+#     проверяет фильтры по очереди, пока не найдёт подходящий;
+#   - "table":   те же хендлеры в CallbackTable — один фильтр, поиск в словаре.
+# и прогоняет через dp.feed_update одни и те же апдейты (первый, средний,
+# последний хендлер и случайный), без обращения к Telegram.
+#
+# Перед замером проверяется, что callback_data старого формата (кнопки в уже
+# отправленных сообщениях) по-прежнему разбирается: по образцу на каждый
+# legacy-префикс из callbacks.py.
+#
+# Пример:
+#   python bench_routing.py --handlers 150 --updates 20000
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Update
+
+import callbacks as cb
+from callbacks import Action, CallbackTable
+
+
+def callback_update(update_id: int, data: str) -> Update:
+    user = {"id": 1, "is_bot": False, "first_name": "Bench"}
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "from": user, "chat_instance": "bench", "data": data,
+            "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "bench"}
+        }
+    })
+
+
+# callback_data кнопок до перехода на префиксы -> (действие, поля)
+LEGACY_SAMPLES = {
+    "main_menu": (cb.MAIN_MENU, {}),
+    "profile": (cb.PROFILE, {}),
+    "activate_key": (cb.ACTIVATE_KEY, {}),
+    "buy_subscription": (cb.BUY_MENU, {}),
+    "use_promo": (cb.USE_PROMO, {}),
+    "download_client": (cb.DOWNLOAD, {}),
+    "my_payments": (cb.MY_PAYMENTS, {}),
+    "help": (cb.HELP, {}),
+    "buy_1_day": (cb.BUY, {"sub_type": "1_day"}),
+    "paid_forever": (cb.PAID, {"sub_type": "forever"}),
+    "admin_menu": (cb.ADMIN_MENU, {}),
+    "admin_stats": (cb.ADMIN_STATS, {}),
+    "admin_users": (cb.ADMIN_USERS, {}),
+    "admin_find_user": (cb.ADMIN_FIND_USER, {}),
+    "admin_users_sub": (cb.ADMIN_USERS_SUB, {}),
+    "admin_users_banned": (cb.ADMIN_USERS_BANNED, {}),
+    "admin_keys": (cb.ADMIN_KEYS, {}),
+    "admin_create_key": (cb.ADMIN_CREATE_KEY, {}),
+    "admin_all_keys": (cb.ADMIN_ALL_KEYS, {}),
+    "admin_unused_keys": (cb.ADMIN_UNUSED_KEYS, {}),
+    "admin_payments": (cb.ADMIN_PAYMENTS, {}),
+    "admin_broadcast": (cb.ADMIN_BROADCAST, {}),
+    "gen_key_14_days": (cb.GEN_KEY, {"key_type": "14_days"}),
+    "manage_user_7058964435": (cb.MANAGE_USER, {"user_id": 7058964435}),
+    "ban_123": (cb.BAN_USER, {"user_id": 123}),
+    "unban_123": (cb.UNBAN_USER, {"user_id": 123}),
+    "remove_sub_123": (cb.REMOVE_SUB, {"user_id": 123}),
+    "give_sub_123": (cb.GIVE_SUB, {"user_id": 123}),
+    "give_1_day_123": (cb.GIVE_SUB_TYPE, {"sub_type": "1_day", "user_id": 123}),
+    "give_forever_5": (cb.GIVE_SUB_TYPE, {"sub_type": "forever", "user_id": 5}),
+    "user_logs_123": (cb.USER_LOGS, {"user_id": 123}),
+    "confirm_pay_42": (cb.CONFIRM_PAYMENT, {"payment_id": 42}),
+    "reject_pay_42": (cb.REJECT_PAYMENT, {"payment_id": 42}),
+}
+
+
+def check_legacy() -> int:
+    """Разбор старых callback_data; SystemExit при расхождении"""
+    covered = {action.prefix for action, _ in LEGACY_SAMPLES.values()}
+    missing = [a.legacy for a in cb.ACTIONS.values() if a.legacy and a.prefix not in covered]
+    if missing:
+        raise SystemExit(f"Нет образцов для legacy-префиксов: {', '.join(missing)}")
+    for data, (action, fields) in LEGACY_SAMPLES.items():
+        parsed = cb.parse(data)
+        if parsed is None or parsed[0] is not action or parsed[1] != fields:
+            raise SystemExit(f"{data!r}: ожидалось {action.prefix} {fields}, разобрано {parsed}")
+    return len(LEGACY_SAMPLES)
+
+
+def make_handler():
+    async def handler(callback, **kwargs):
+        return True
+    return handler
+
+
+def build_filters(count: int) -> Dispatcher:
+    dp = Dispatcher()
+    router = Router()
+    for i in range(count):
+        router.callback_query.register(make_handler(), F.data.startswith(f"bench_action_{i}_"))
+    dp.include_router(router)
+    return dp
+
+
+def build_table(actions) -> Dispatcher:
+    dp = Dispatcher()
+    router = Router()
+    table = CallbackTable(router)
+    for action in actions:
+        table(action)(make_handler())
+    dp.include_router(router)
+    return dp
+
+
+async def measure(dp: Dispatcher, bot: Bot, updates) -> float:
+    """Среднее время feed_update в микросекундах"""
+    for update in updates[:200]:  # прогрев
+        await dp.feed_update(bot, update)
+    start = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - start) / len(updates) * 1e6
+
+
+async def run(count: int, total: int) -> dict:
+    bot = Bot("42:BENCH")
+    actions = [Action(f"x{cb.to_base36(i)}", user_id=int) for i in range(count)]
+    filters_dp = build_filters(count)
+    table_dp = build_table(actions)
+
+    positions = {"first": [0] * total, "middle": [count // 2] * total, "last": [count - 1] * total,
+                 "random": [random.randrange(count) for _ in range(total)]}
+    report = {"legacy_checked": check_legacy(), "handlers": count, "updates": total, "us_per_update": {}}
+    for name, indexes in positions.items():
+        old = [callback_update(n, f"bench_action_{i}_{n}") for n, i in enumerate(indexes)]
+        new = [callback_update(n, actions[i].pack(n)) for n, i in enumerate(indexes)]
+        report["us_per_update"][name] = {
+            "filters": round(await measure(filters_dp, bot, old), 2),
+            "table": round(await measure(table_dp, bot, new), 2),
+        }
+    await bot.session.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк маршрутизации callback_query")
+    parser.add_argument("--handlers", type=int, default=120)
+    parser.add_argument("--updates", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.handlers, args.updates)), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,20 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, BOT_MODE, METRICS_HOST, METRICS_PORT, FSM_STORAGE, FSM_STATE_TTL, FSM_CACHE, UPDATE_ORDERING
 from handlers import user, admin, payment  # Добавлен payment
+from broadcast import broadcasts
+from database import db
+from fsm_storage import SQLiteStorage
+from metrics import start_exporter
+from outbox import notifier
+from payment_events import payment_events
+from scheduler import expiry_scheduler
+from middlewares.metrics import HandlerMetricsMiddleware, ApiMetricsMiddleware
+from middlewares.ordering import OrderingMiddleware
+from middlewares.throttling import ThrottlingMiddleware
+from middlewares.user_context import UserContextMiddleware
+from webhook import run_webhook
 
 # Логирование
 logging.basicConfig(
@@ -20,20 +32,64 @@ async def main():
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    bot.session.middleware(ApiMetricsMiddleware())
     
     # Создаём диспетчер
-    dp = Dispatcher()
+    if FSM_STORAGE == "sqlite":
+        storage = SQLiteStorage(db.db_name, ttl=FSM_STATE_TTL, use_cache=FSM_CACHE)
+        storage.start_cleanup()
+    else:
+        storage = None  # MemoryStorage по умолчанию
+    dp = Dispatcher(storage=storage)
+    
+    # Апдейты одного пользователя по порядку — до всех остальных middleware
+    if UPDATE_ORDERING:
+        dp.update.outer_middleware(OrderingMiddleware())
+    
+    # Антифлуд раньше загрузки пользователя — лишние нажатия не доходят до БД
+    throttling = ThrottlingMiddleware()
+    dp.message.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(throttling)
+    
+    # Пользователь загружается один раз на апдейт, забаненные отсекаются до хендлеров
+    dp.message.outer_middleware(UserContextMiddleware())
+    dp.callback_query.outer_middleware(UserContextMiddleware())
+    
+    # Метрики хендлеров
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
     
     # Регистрируем роутеры
     dp.include_router(user.router)
     dp.include_router(admin.router)
     dp.include_router(payment.router)  # Добавлен payment
     
+    # Экспорт метрик
+    if METRICS_PORT:
+        await start_exporter(METRICS_HOST, METRICS_PORT)
+        logger.info(f"📈 Метрики: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    
     # Запускаем
     logger.info("🦅 Бот Raven Client запущен!")
     
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    # Очередь уведомлений и напоминания об окончании подписки
+    notifier.start(bot)
+    expiry_scheduler.start()
+    
+    # Автоподтверждение оплат по уведомлениям провайдера (api_server.py)
+    payment_events.start()
+    
+    # Продолжаем рассылки, прерванные перезапуском
+    broadcasts.resume(bot)
+    
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+    finally:
+        await notifier.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,163 @@
+# broadcast.py - рассылки: параллельная отправка под общим лимитом, с сохранением прогресса
+import asyncio
+import logging
+from typing import List
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError
+)
+from aiogram.types import Message
+
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PROGRESS_INTERVAL
+from database import db, Database
+from metrics import Counter
+from outbox import telegram_bucket
+from ratelimit import AsyncTokenBucket
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_MESSAGES = Counter("raven_bot_broadcast_messages_total", "Сообщения рассылок по результату", ("result",))
+
+MAX_ATTEMPTS = 5
+FLUSH_SIZE = 200  # результатов в одной записи в БД
+
+
+class BroadcastEngine:
+    """Запуск, выполнение и возобновление рассылок"""
+
+    def __init__(self, database: Database, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY,
+                 progress_interval: float = BROADCAST_PROGRESS_INTERVAL):
+        self.db = database
+        self.bucket = AsyncTokenBucket(rate, rate)
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.jobs = {}  # broadcast_id -> asyncio.Task
+
+    async def start(self, bot: Bot, message: Message, status_message: Message) -> int:
+        """Новая рассылка копии message; прогресс пишется в status_message"""
+        broadcast_id = self.db.create_broadcast(
+            message.from_user.id, message.chat.id, message.message_id,
+            status_message.chat.id, status_message.message_id
+        )
+        self._spawn(bot, broadcast_id)
+        return broadcast_id
+
+    def resume(self, bot: Bot) -> List[int]:
+        """Продолжение рассылок, прерванных перезапуском"""
+        broadcast_ids = [b for b in self.db.get_running_broadcasts() if b not in self.jobs]
+        for broadcast_id in broadcast_ids:
+            logger.info(f"📨 Продолжаем рассылку #{broadcast_id}")
+            self._spawn(bot, broadcast_id)
+        return broadcast_ids
+
+    def _spawn(self, bot: Bot, broadcast_id: int):
+        task = asyncio.create_task(self._run(bot, broadcast_id))
+        self.jobs[broadcast_id] = task
+        task.add_done_callback(lambda _: self.jobs.pop(broadcast_id, None))
+
+    async def _run(self, bot: Bot, broadcast_id: int):
+        job = self.db.get_broadcast(broadcast_id)
+        queue = asyncio.Queue()
+        for user_id in self.db.get_pending_recipients(broadcast_id):
+            queue.put_nowait(user_id)
+
+        results = []
+        blocked = []
+
+        def flush():
+            if results:
+                self.db.save_broadcast_results(broadcast_id, results)
+                results.clear()
+            if blocked:
+                self.db.set_blocked_bot(blocked)
+                blocked.clear()
+
+        async def worker():
+            while True:
+                user_id = await queue.get()
+                try:
+                    try:
+                        status, error = await self._deliver(bot, job, user_id)
+                    except Exception as e:
+                        logger.exception(f"Рассылка #{broadcast_id}: сбой отправки {user_id}")
+                        status, error = 'failed', str(e)
+                    BROADCAST_MESSAGES.inc(result=status)
+                    results.append((user_id, status, error))
+                    if status == 'blocked':
+                        blocked.append(user_id)
+                    if len(results) >= FLUSH_SIZE:
+                        flush()
+                finally:
+                    queue.task_done()
+
+        async def progress():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                flush()
+                await self._show_progress(bot, job, finished=False)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        progress_task = asyncio.create_task(progress())
+        try:
+            await queue.join()
+        finally:
+            for task in (*workers, progress_task):
+                task.cancel()
+            flush()
+
+        self.db.finish_broadcast(broadcast_id)
+        await self._show_progress(bot, job, finished=True)
+
+    async def _deliver(self, bot: Bot, job: dict, user_id: int) -> tuple:
+        """Отправка одному получателю: (статус, текст ошибки)"""
+        for attempt in range(MAX_ATTEMPTS):
+            # Свой лимит рассылки плюс общий лимит бота, чтобы оставалось место уведомлениям
+            await self.bucket.acquire()
+            await telegram_bucket.acquire()
+            try:
+                await bot.copy_message(user_id, job['from_chat_id'], job['message_id'])
+                return 'sent', None
+            except TelegramRetryAfter as e:
+                # Флуд-лимит касается всего бота — останавливаем общий поток отправки
+                self.bucket.pause(e.retry_after)
+                telegram_bucket.pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError as e:
+                return 'blocked', e.message
+            except TelegramBadRequest as e:
+                if 'chat not found' in e.message.lower():
+                    return 'blocked', e.message
+                return 'failed', e.message
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"Рассылка #{job['id']}: ошибка отправки {user_id}: {e}")
+                await asyncio.sleep(2 ** attempt)
+        return 'failed', 'Превышено число попыток'
+
+    async def _show_progress(self, bot: Bot, job: dict, finished: bool):
+        counts = self.db.get_broadcast_counts(job['id'])
+        done = job['total'] - counts.get('pending', 0)
+
+        if finished:
+            header = f"✅ <b>Рассылка #{job['id']} завершена!</b>"
+        else:
+            header = f"📨 <b>Рассылка #{job['id']}</b>: {done}/{job['total']}"
+
+        text = (
+            f"{header}\n\n"
+            f"📨 Отправлено: {counts.get('sent', 0)}\n"
+            f"🚫 Заблокировали бота: {counts.get('blocked', 0)}\n"
+            f"❌ Ошибок: {counts.get('failed', 0)}"
+        )
+        try:
+            await bot.edit_message_text(
+                text, chat_id=job['status_chat_id'], message_id=job['status_message_id'], parse_mode="HTML"
+            )
+        except TelegramBadRequest:
+            pass  # текст не изменился или сообщение удалено
+        except (TelegramNetworkError, TelegramServerError, TelegramRetryAfter) as e:
+            logger.warning(f"Рассылка #{job['id']}: не удалось обновить прогресс: {e}")
+
+
+broadcasts = BroadcastEngine(db)
@@ -0,0 +1,204 @@
+# callbacks.py - формат callback_data и маршрутизация нажатий по таблице
+#
+# callback_data = "<префикс>[:<поле>:<поле>...]", целые числа упакованы в base36
+# ("u:2kf0ql" вместо "manage_user_7058964435"). Каждое действие описано
+# объектом Action в этом модуле; keyboards.py собирает кнопки через pack(),
+# а хендлеры регистрируются в CallbackTable своего роутера и получают поля
+# уже разобранными, как именованные аргументы.
+#
+# CallbackTable вешает на роутер один хендлер, фильтр которого находит
+# нужную функцию по префиксу в словаре — без перебора F.data.startswith(...).
+import string
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import CallbackQuery
+
+SEP = ":"
+_DIGITS = string.digits + string.ascii_lowercase
+
+# префикс -> Action, общий для всех роутеров
+ACTIONS: Dict[str, "Action"] = {}
+
+
+def to_base36(value: int) -> str:
+    if value < 0:
+        return "-" + to_base36(-value)
+    digits = []
+    while True:
+        value, rest = divmod(value, 36)
+        digits.append(_DIGITS[rest])
+        if not value:
+            return "".join(reversed(digits))
+
+
+class Action:
+    """Тип нажатия: короткий префикс и типизированные поля (int или str)"""
+    __slots__ = ("prefix", "fields", "legacy")
+
+    def __init__(self, prefix: str, legacy: Optional[str] = None, **fields: type):
+        assert SEP not in prefix and prefix not in ACTIONS, prefix
+        self.prefix = prefix
+        self.fields: Tuple[Tuple[str, type], ...] = tuple(fields.items())
+        # Формат callback_data до перехода на префиксы (кнопки в уже отправленных сообщениях)
+        self.legacy = legacy
+        ACTIONS[prefix] = self
+
+    def pack(self, *values: Any) -> str:
+        if len(values) != len(self.fields):
+            raise ValueError(f"{self.prefix}: ожидается {len(self.fields)} полей, передано {len(values)}")
+        if not values:
+            return self.prefix
+        parts = [self.prefix]
+        for (name, kind), value in zip(self.fields, values):
+            if kind is int:
+                parts.append(to_base36(int(value)))
+            else:
+                value = str(value)
+                if SEP in value:
+                    raise ValueError(f"{self.prefix}.{name}: недопустимый символ {SEP!r}")
+                parts.append(value)
+        data = SEP.join(parts)
+        if len(data.encode()) > 64:
+            raise ValueError(f"callback_data длиннее 64 байт: {data}")
+        return data
+
+    def unpack(self, payload: str) -> Dict[str, Any]:
+        """Поля из части callback_data после префикса; ValueError при несовпадении"""
+        if not self.fields:
+            if payload:
+                raise ValueError(payload)
+            return {}
+        values = payload.split(SEP)
+        if len(values) != len(self.fields):
+            raise ValueError(payload)
+        return {
+            name: int(value, 36) if kind is int else value
+            for (name, kind), value in zip(self.fields, values)
+        }
+
+
+def parse(data: str) -> Optional[Tuple[Action, Dict[str, Any]]]:
+    """(действие, поля) по callback_data или None"""
+    prefix, _, payload = data.partition(SEP)
+    action = ACTIONS.get(prefix)
+    if action is None:
+        return _parse_legacy(data)
+    try:
+        return action, action.unpack(payload)
+    except ValueError:
+        return None
+
+
+def _parse_legacy(data: str) -> Optional[Tuple[Action, Dict[str, Any]]]:
+    """Старый формат ("manage_user_123", "paid_1_day", "give_1_day_123") — только для промахов по таблице.
+
+    Поля шли через "_" и могли сами содержать "_" ("1_day"), поэтому значения
+    отрезаются справа: всё лишнее достаётся первому полю.
+    """
+    for action in _LEGACY_ORDER:
+        if not action.fields:
+            if data == action.legacy:
+                return action, {}
+        elif data.startswith(action.legacy) and len(data) > len(action.legacy):
+            values = data[len(action.legacy):].rsplit("_", len(action.fields) - 1)
+            if len(values) != len(action.fields) or not all(values):
+                return None
+            try:
+                return action, {
+                    name: int(value) if kind is int else value
+                    for (name, kind), value in zip(action.fields, values)
+                }
+            except ValueError:
+                return None
+    return None
+
+
+class CallbackTable:
+    """Таблица хендлеров нажатий роутера: префикс -> функция"""
+
+    def __init__(self, router: Router):
+        self._handlers: Dict[str, CallableObject] = {}
+        router.callback_query.register(self._dispatch, self._resolve)
+
+    def __call__(self, action: Action) -> Callable:
+        """Декоратор: @callbacks(ACTION)"""
+        def decorator(callback: Callable) -> Callable:
+            assert action.prefix not in self._handlers, action.prefix
+            self._handlers[action.prefix] = CallableObject(callback)
+            return callback
+        return decorator
+
+    def _resolve(self, callback: CallbackQuery) -> Union[bool, Dict[str, Any]]:
+        if not callback.data:
+            return False
+        parsed = parse(callback.data)
+        if parsed is None:
+            return False
+        action, fields = parsed
+        handler = self._handlers.get(action.prefix)
+        if handler is None:
+            return False
+        # callback_handler — настоящий хендлер, его имя видит HandlerMetricsMiddleware
+        return {"callback_handler": handler, **fields}
+
+    @staticmethod
+    async def _dispatch(callback: CallbackQuery, callback_handler: CallableObject, **kwargs: Any) -> Any:
+        return await callback_handler.call(callback, **kwargs)
+
+
+# ========== ДЕЙСТВИЯ ==========
+
+# Пользователь
+MAIN_MENU = Action("m", legacy="main_menu")
+PROFILE = Action("p", legacy="profile")
+ACTIVATE_KEY = Action("k", legacy="activate_key")
+BUY_MENU = Action("s", legacy="buy_subscription")
+USE_PROMO = Action("pr", legacy="use_promo")
+DOWNLOAD = Action("d", legacy="download_client")
+MY_PAYMENTS = Action("mp", legacy="my_payments")
+MY_PAYMENTS_PAGE = Action("mpp", before_id=int)
+HELP = Action("h", legacy="help")
+BUY = Action("b", legacy="buy_", sub_type=str)
+PAID = Action("pd", legacy="paid_", sub_type=str)
+
+# Админ: меню
+ADMIN_MENU = Action("a", legacy="admin_menu")
+ADMIN_STATS = Action("as", legacy="admin_stats")
+ADMIN_USERS = Action("au", legacy="admin_users")
+ADMIN_FIND_USER = Action("af", legacy="admin_find_user")
+ADMIN_USERS_SUB = Action("aus", legacy="admin_users_sub")
+ADMIN_USERS_BANNED = Action("aub", legacy="admin_users_banned")
+ADMIN_KEYS = Action("ak", legacy="admin_keys")
+ADMIN_CREATE_KEY = Action("ac", legacy="admin_create_key")
+ADMIN_ALL_KEYS = Action("aak", legacy="admin_all_keys")
+ADMIN_UNUSED_KEYS = Action("auk", legacy="admin_unused_keys")
+ADMIN_PAYMENTS = Action("ap", legacy="admin_payments")
+ADMIN_BROADCAST = Action("ab", legacy="admin_broadcast")
+ADMIN_ANALYTICS = Action("an", days=int)
+GEN_KEY = Action("g", legacy="gen_key_", key_type=str)
+
+# Админ: управление пользователем
+MANAGE_USER = Action("u", legacy="manage_user_", user_id=int)
+BAN_USER = Action("ub", legacy="ban_", user_id=int)
+UNBAN_USER = Action("uu", legacy="unban_", user_id=int)
+REMOVE_SUB = Action("ur", legacy="remove_sub_", user_id=int)
+GIVE_SUB = Action("ug", legacy="give_sub_", user_id=int)
+GIVE_SUB_TYPE = Action("gs", legacy="give_", sub_type=str, user_id=int)
+USER_LOGS = Action("ul", legacy="user_logs_", user_id=int)
+
+# Админ: платежи
+CONFIRM_PAYMENT = Action("pc", legacy="confirm_pay_", payment_id=int)
+REJECT_PAYMENT = Action("px", legacy="reject_pay_", payment_id=int)
+PAYMENTS_PAGE = Action("pq", before_id=int)
+TOGGLE_PAYMENT = Action("pt", payment_id=int, before_id=int)
+CONFIRM_SELECTED = Action("pcs")
+REJECT_SELECTED = Action("pxs")
+RECONCILE = Action("prc")
+
+# Сначала точные совпадения, затем самые длинные префиксы ("buy_subscription" раньше "buy_")
+_LEGACY_ORDER = sorted(
+    (action for action in ACTIONS.values() if action.legacy),
+    key=lambda action: (bool(action.fields), -len(action.legacy))
+)
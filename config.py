@@ -24,3 +24,98 @@ PAYMENT_CARD = "2200 7017 7318 8609"  # Замени на свою карту
 
 PAYMENT_SBP = "Я бомж, у меня нету номера :("  # Замени на свой номер
 
+# Повторное «Оплатил(а)» по тому же тарифу в течение окна возвращает уже
+# созданную заявку вместо новой (и админы не получают её ещё раз)
+PAYMENT_DEDUP_MINUTES = 30
+PAYMENTS_PAGE_SIZE = 8  # платежей на странице очереди в админке
+USER_PAYMENTS_PAGE_SIZE = 10  # платежей на странице «Мои платежи»
+ANALYTICS_PERIODS = (7, 30, 90)  # периоды (дней) на экране аналитики, первый — по умолчанию
+RECONCILE_MAX_BYTES = 5 * 1024 * 1024  # размер выписки для сверки (reconcile.py)
+
+# Автоподтверждение оплат по уведомлениям провайдера (POST /api/payments/webhook/<провайдер>).
+# Тело подписывается HMAC-SHA256 секретом провайдера; fake_provider.py — локальная замена провайдера
+PAYMENT_PROVIDER_SECRETS = {
+    "fake": "change_me_provider_secret",
+}
+PAYMENT_WEBHOOK_TOLERANCE = 300  # секунд: допустимое расхождение X-Timestamp, старые подписи не принимаются
+PAYMENT_EVENTS_POLL_SECONDS = 1  # как часто воркер бота проверяет новые события
+PAYMENT_EVENTS_BATCH = 200  # событий за одну транзакцию
+
+# Промокоды (promo.py): сколько секунд кэшировать код в памяти и сколько кодов помнить.
+# Несуществующие коды тоже кэшируются — перебор не доходит до БД
+PROMO_CACHE_TTL = 60
+PROMO_CACHE_SIZE = 10_000
+
+# Фильтр Блума неиспользованных ключей (keycodes.py): доля ложных срабатываний и как
+# часто подгружать ключи, созданные другими процессами (API реселлеров)
+KEY_FILTER_ERROR_RATE = 0.01
+KEY_FILTER_REFRESH_SECONDS = 5
+
+# API реселлеров (api_server.py): ключей в одном заказе, в сутки на клиента
+# (если у клиента не задана своя квота, см. api_clients.py --key-quota), ключей в запросе статуса
+KEY_BATCH_MAX = 5000
+KEY_DAILY_QUOTA = 20_000
+KEY_STATUS_MAX = 500
+
+
+
+# Экспорт метрик бота (Prometheus), None — отключить
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9101
+
+# Хэширование паролей: "pbkdf2_sha256" (стоимость = число итераций) или "scrypt" (стоимость = log2 N)
+PASSWORD_HASH_ALGORITHM = "pbkdf2_sha256"
+PASSWORD_HASH_COST = 200_000
+PASSWORD_HASH_WORKERS = 4  # потоков для хэширования
+PASSWORD_HASH_MAX_PENDING = 64  # задач в очереди, дальше — отказ "сервер занят"
+
+# Рассылка: сообщений в секунду (лимит Telegram ~30/с), параллельных отправок, период обновления прогресса
+BROADCAST_RATE = 25
+BROADCAST_CONCURRENCY = 10
+BROADCAST_PROGRESS_INTERVAL = 3
+
+# Получение апдейтов: "polling" (для разработки) или "webhook"
+BOT_MODE = "polling"
+WEBHOOK_BASE_URL = "https://example.com"  # Публичный адрес, за которым стоит WEBHOOK_HOST:WEBHOOK_PORT
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_SECRET = "change_me_webhook_secret"  # Заголовок X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _ и -)
+WEBHOOK_HOST = "127.0.0.1"
+WEBHOOK_PORT = 8080
+
+# Апдейты одного пользователя обрабатываются строго по очереди, разных — параллельно
+UPDATE_ORDERING = True
+UPDATE_CONCURRENCY = 64  # апдейтов в обработке одновременно (все пользователи)
+
+# Хранилище состояний FSM: "sqlite" (переживает перезапуск) или "memory"
+FSM_STORAGE = "sqlite"
+FSM_STATE_TTL = 24 * 3600  # Брошенные состояния удаляются через сутки
+FSM_CACHE = True  # Кэш в памяти; отключить, если бот запущен в нескольких процессах
+
+# Антифлуд: (запросов в секунду, запас) для группы хендлеров
+THROTTLE_LIMITS = {
+    "default": (2, 6),    # кнопки меню, профиль, помощь
+    "messages": (1, 5),   # текстовые сообщения и команды
+    "payments": (0.2, 3), # заявки на оплату и история платежей
+}
+# Префикс действия из callbacks.py -> группа (PAID, MY_PAYMENTS)
+THROTTLE_GROUPS = {
+    "pd": "payments",
+    "mp": "payments",
+}
+THROTTLE_MAX_USERS = 50_000  # пользователей в памяти лимитера
+
+# Отпечатки последних правок сообщений (render.py): сколько сообщений помнить
+RENDER_CACHE_SIZE = 20_000
+
+# Исходящие сообщения: общий лимит Telegram (сообщений в секунду на бота, его делят
+# уведомления и рассылка), лимит на один чат, воркеры очереди уведомлений
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+NOTIFY_WORKERS = 8
+NOTIFY_MAX_ATTEMPTS = 5
+
+# Напоминания об окончании подписки: за сколько часов (по убыванию), затем уведомление об окончании
+SUBSCRIPTION_REMINDER_HOURS = (24, 1)
+SCHEDULER_HORIZON_HOURS = 36  # на сколько вперёд планировщик держит окончания в памяти
+SCHEDULER_RELOAD_MINUTES = 30  # как часто перечитывать окончания из БД
+SCHEDULER_GRACE_HOURS = 24  # подписки, закончившиеся пока бот был выключен, ещё получают уведомление
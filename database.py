@@ -1,16 +1,34 @@
 import sqlite3
-from datetime import datetime, timedelta
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
 from typing import Optional, List, Dict, Any
-import secrets
-import string
+import threading
+import time
+
+import keycodes
+from config import (
+    SUBSCRIPTION_REMINDER_HOURS, PAYMENT_DEDUP_MINUTES, KEY_FILTER_ERROR_RATE, KEY_FILTER_REFRESH_SECONDS
+)
+
+# Счётчик SQL запросов текущего апдейта (выставляется в middlewares/user_context.py)
+query_counter: ContextVar[Optional[List[int]]] = ContextVar("query_counter", default=None)
+
+def _count_query(statement: str):
+    counter = query_counter.get()
+    if counter is not None and not statement.startswith(("BEGIN", "COMMIT", "ROLLBACK")):
+        counter[0] += 1
 
 class Database:
     def __init__(self, db_name: str = "raven_client.db"):
         self.db_name = db_name
         self.init_db()
+        self._key_filter_lock = threading.Lock()
+        self.load_key_filter()
     
     def get_connection(self):
-        return sqlite3.connect(self.db_name)
+        conn = sqlite3.connect(self.db_name)
+        conn.set_trace_callback(_count_query)
+        return conn
     
     def init_db(self):
         """Инициализация базы данных"""
@@ -35,6 +53,14 @@ class Database:
             )
         ''')
         
+        self._ensure_column(cursor, "users", "blocked_bot", "INTEGER DEFAULT 0")
+        # Сколько уведомлений об окончании текущей подписки уже отправлено (см. scheduler.py)
+        self._ensure_column(cursor, "users", "notice_level", "INTEGER DEFAULT 0")
+        # Первая подтверждённая оплата (когорты регистрация -> оплата в daily_rollups)
+        self._ensure_column(cursor, "users", "first_paid_at", "TEXT")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_nickname ON users(nickname)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_subscription_end ON users(subscription_end)")
+        
         # Таблица ключей
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS keys (
@@ -49,6 +75,24 @@ class Database:
                 is_used INTEGER DEFAULT 0
             )
         ''')
+        # Заказ реселлера, в котором выпущен ключ (api_server.py: /api/keys/batch)
+        self._ensure_column(cursor, "keys", "order_id", "INTEGER")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_keys_order ON keys(order_id) WHERE order_id IS NOT NULL")
+        
+        # Заказы ключей через API: повтор запроса с тем же Idempotency-Key возвращает тот же заказ
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS key_orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                client_id INTEGER,
+                idempotency_key TEXT,
+                key_type TEXT,
+                count INTEGER,
+                created_at TEXT,
+                UNIQUE (client_id, idempotency_key)
+            )
+        ''')
+        # Суточная квота реселлера
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_key_orders_client ON key_orders(client_id, created_at)")
         
         # Таблица платежей
         cursor.execute('''
@@ -63,6 +107,121 @@ class Database:
                 confirmed_by INTEGER
             )
         ''')
+        # Поиск открытой заявки пользователя по тарифу (create_payment)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_payments_pending_user
+            ON payments(user_id, subscription_type, created_at) WHERE status = 'pending'
+        ''')
+        # Очередь ожидающих платежей в админке (get_pending_page)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_pending ON payments(id) WHERE status = 'pending'")
+        # История платежей пользователя (get_user_payments): покрывающий, страница
+        # читается из индекса без обращения к таблице. Прежний (user_id, id) не нужен
+        cursor.execute("DROP INDEX IF EXISTS idx_payments_user")
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_payments_user_history
+            ON payments(user_id, id, amount, subscription_type, status, created_at)
+        ''')
+        
+        # Уведомления платёжного провайдера (api_server.py -> payment_events.py).
+        # status: new — ждёт воркера, дальше итог обработки (process_payment_events)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS payment_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider TEXT NOT NULL,
+                txn_id TEXT NOT NULL,
+                payment_id INTEGER,
+                amount REAL,
+                event_type TEXT,
+                payload TEXT,
+                status TEXT DEFAULT 'new',
+                received_at TEXT,
+                processed_at TEXT,
+                UNIQUE (provider, txn_id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_payment_events_new ON payment_events(id) WHERE status = 'new'")
+        
+        # Промокоды: скидка на следующую оплату и/или бонусные дни подписки.
+        # max_uses NULL — без ограничения, per_user — сколько раз один пользователь
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS promo_codes (
+                code TEXT PRIMARY KEY,
+                discount INTEGER DEFAULT 0,
+                bonus_days INTEGER DEFAULT 0,
+                max_uses INTEGER,
+                uses INTEGER DEFAULT 0,
+                per_user INTEGER DEFAULT 1,
+                expires_at TEXT,
+                created_by INTEGER,
+                created_at TEXT
+            )
+        ''')
+        # payment_id — заявка, к которой применена скидка (NULL — ещё не применена)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS promo_redemptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT,
+                user_id INTEGER,
+                discount INTEGER DEFAULT 0,
+                payment_id INTEGER,
+                redeemed_at TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_promo_redemptions_user ON promo_redemptions(user_id, code)")
+        
+        # Таблица API клиентов (лаунчеры, плагины, реселлеры)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_clients (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                kind TEXT,
+                key_digest TEXT UNIQUE,
+                scopes TEXT,
+                rate_limit REAL DEFAULT 10,
+                is_active INTEGER DEFAULT 1,
+                created_at TEXT,
+                updated_at TEXT
+            )
+        ''')
+        # Ключей в сутки через /api/keys/batch (NULL — KEY_DAILY_QUOTA из config)
+        self._ensure_column(cursor, "api_clients", "key_quota", "INTEGER")
+        
+        # Рассылки и их получатели (прогресс сохраняется, чтобы продолжить после перезапуска)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_id INTEGER,
+                from_chat_id INTEGER,
+                message_id INTEGER,
+                status_chat_id INTEGER,
+                status_message_id INTEGER,
+                status TEXT,
+                total INTEGER DEFAULT 0,
+                created_at TEXT,
+                finished_at TEXT
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                broadcast_id INTEGER,
+                user_id INTEGER,
+                status TEXT DEFAULT 'pending',
+                error TEXT,
+                PRIMARY KEY (broadcast_id, user_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Состояния FSM (fsm_storage.SQLiteStorage)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                updated_at REAL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at)")
         
         # Таблица логов
         cursor.execute('''
@@ -75,9 +234,32 @@ class Database:
             )
         ''')
         
+        # Дневные агрегаты для аналитики: (день, метрика, разрез) -> значение.
+        # Пополняются в тех же транзакциях, что и исходные события (_bump);
+        # при создании таблицы заполняются один раз из истории (_backfill_rollups)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollups'")
+        rollups_exist = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                day TEXT,
+                metric TEXT,
+                dim TEXT DEFAULT '',
+                value REAL DEFAULT 0,
+                PRIMARY KEY (day, metric, dim)
+            ) WITHOUT ROWID
+        ''')
+        if not rollups_exist:
+            self._backfill_rollups(cursor)
+        
         conn.commit()
         conn.close()
     
+    def _ensure_column(self, cursor, table: str, column: str, definition: str):
+        """Добавление колонки в существующую таблицу (миграция старых БД)"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
     # ========== ПОЛЬЗОВАТЕЛИ ==========
     
     def user_exists(self, user_id: int) -> bool:
@@ -88,13 +270,15 @@ class Database:
         conn.close()
         return result is not None
     
-    def register_user(self, user_id: int, username: str, nickname: str, password: str):
+    def register_user(self, user_id: int, username: str, nickname: str, password_hash: str):
+        """Регистрация; пароль передаётся уже захэшированным (passwords.hash_password)"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO users (user_id, username, nickname, password, registered_at)
             VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, username, nickname, password, datetime.now().isoformat()))
+        ''', (user_id, username, nickname, password_hash, datetime.now().isoformat()))
+        self._bump(cursor, 'registrations')
         conn.commit()
         conn.close()
         self.log_action(user_id, "REGISTER", f"Зарегистрирован с ником {nickname}")
@@ -109,7 +293,7 @@ class Database:
         if row:
             columns = ['user_id', 'username', 'nickname', 'password', 'registered_at',
                       'subscription_end', 'subscription_type', 'is_banned', 'ban_reason',
-                      'total_paid', 'activated_key', 'hwid']
+                      'total_paid', 'activated_key', 'hwid', 'blocked_bot']
             return dict(zip(columns, row))
         return None
     
@@ -122,7 +306,7 @@ class Database:
         
         columns = ['user_id', 'username', 'nickname', 'password', 'registered_at',
                   'subscription_end', 'subscription_type', 'is_banned', 'ban_reason',
-                  'total_paid', 'activated_key', 'hwid']
+                  'total_paid', 'activated_key', 'hwid', 'blocked_bot']
         return [dict(zip(columns, row)) for row in rows]
     
     def is_banned(self, user_id: int) -> bool:
@@ -147,19 +331,25 @@ class Database:
         conn.close()
         self.log_action(user_id, "UNBAN", "Разбанен")
     
+    def set_blocked_bot(self, user_ids: List[int], blocked: bool = True):
+        """Отметка пользователей, заблокировавших бота (им не шлём рассылки)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany("UPDATE users SET blocked_bot = ? WHERE user_id = ?",
+                          [(int(blocked), user_id) for user_id in user_ids])
+        conn.commit()
+        conn.close()
+    
     def has_subscription(self, user_id: int) -> bool:
-        user = self.get_user(user_id)
-        if not user or not user['subscription_end']:
-            return False
-        
-        if user['subscription_type'] == 'forever':
-            return True
-        
-        end_date = datetime.fromisoformat(user['subscription_end'])
-        return end_date > datetime.now()
+        info = self.get_subscription_info(user_id)
+        return bool(info and info['active'])
     
     def get_subscription_info(self, user_id: int) -> Optional[Dict]:
-        user = self.get_user(user_id)
+        return self.subscription_from_user(self.get_user(user_id))
+    
+    @staticmethod
+    def subscription_from_user(user: Optional[Dict]) -> Optional[Dict]:
+        """Информация о подписке по уже загруженной строке пользователя"""
         if not user or not user['subscription_end']:
             return None
         
@@ -181,30 +371,40 @@ class Database:
             'active': days_left >= 0
         }
     
+    @staticmethod
+    def _extend_subscription(current_end: Optional[str], sub_type: str, days: Optional[int]) -> tuple[str, int]:
+        """Новые (subscription_end, notice_level) после добавления подписки"""
+        now = datetime.now()
+        if sub_type == 'forever':
+            return 'forever', 0
+        
+        end_date = now + timedelta(days=days)
+        if current_end:
+            try:
+                end = datetime.fromisoformat(current_end)
+                if end > now:
+                    end_date = end + timedelta(days=days)
+            except ValueError:
+                pass
+        
+        # Напоминания, время которых уже прошло (подписка на 1 день), не отправляем
+        left = end_date - now
+        notice_level = sum(1 for hours in SUBSCRIPTION_REMINDER_HOURS if left <= timedelta(hours=hours))
+        return end_date.isoformat(), notice_level
+    
     def add_subscription(self, user_id: int, sub_type: str, days: int = None):
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        if sub_type == 'forever':
-            end_date = None
-        else:
-            current_user = self.get_user(user_id)
-            if current_user and current_user['subscription_end']:
-                try:
-                    current_end = datetime.fromisoformat(current_user['subscription_end'])
-                    if current_end > datetime.now():
-                        end_date = current_end + timedelta(days=days)
-                    else:
-                        end_date = datetime.now() + timedelta(days=days)
-                except:
-                    end_date = datetime.now() + timedelta(days=days)
-            else:
-                end_date = datetime.now() + timedelta(days=days)
+        current_user = self.get_user(user_id)
+        subscription_end, notice_level = self._extend_subscription(
+            current_user['subscription_end'] if current_user else None, sub_type, days
+        )
         
         cursor.execute('''
-            UPDATE users SET subscription_end = ?, subscription_type = ?
+            UPDATE users SET subscription_end = ?, subscription_type = ?, notice_level = ?
             WHERE user_id = ?
-        ''', (end_date.isoformat() if end_date else 'forever', sub_type, user_id))
+        ''', (subscription_end, sub_type, notice_level, user_id))
         
         conn.commit()
         conn.close()
@@ -214,13 +414,52 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            UPDATE users SET subscription_end = NULL, subscription_type = NULL
+            UPDATE users SET subscription_end = NULL, subscription_type = NULL, notice_level = 0
             WHERE user_id = ?
         ''', (user_id,))
         conn.commit()
         conn.close()
         self.log_action(user_id, "SUBSCRIPTION_REMOVE", "Подписка удалена")
     
+    def get_expiring_subscriptions(self, since: datetime, until: datetime) -> List[tuple]:
+        """(user_id, subscription_end, notice_level) для подписок, заканчивающихся в [since, until]"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id, subscription_end, notice_level FROM users
+            WHERE subscription_end BETWEEN ? AND ? AND subscription_type != 'forever'
+              AND notice_level <= ?
+        ''', (since.isoformat(), until.isoformat(), len(SUBSCRIPTION_REMINDER_HOURS)))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def get_subscription_states(self, user_ids: List[int]) -> Dict[int, tuple]:
+        """user_id -> (subscription_end, notice_level)"""
+        if not user_ids:
+            return {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ",".join("?" * len(user_ids))
+        cursor.execute(f'''
+            SELECT user_id, subscription_end, notice_level FROM users WHERE user_id IN ({placeholders})
+        ''', list(user_ids))
+        rows = cursor.fetchall()
+        conn.close()
+        return {user_id: (end, level) for user_id, end, level in rows}
+    
+    def set_notice_levels(self, updates: List[tuple]):
+        """Отметка отправленных уведомлений: [(notice_level, user_id, subscription_end)].
+        Пропускает пользователей, чья подписка успела измениться"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE users SET notice_level = ?1
+            WHERE user_id = ?2 AND subscription_end = ?3 AND notice_level < ?1
+        ''', updates)
+        conn.commit()
+        conn.close()
+    
     def update_total_paid(self, user_id: int, amount: float):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -232,8 +471,52 @@ class Database:
     
     # ========== КЛЮЧИ ==========
     
+    def load_key_filter(self):
+        """Фильтр Блума неиспользованных ключей заново (запас вдвое на новые ключи)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT key FROM keys WHERE is_used = 0")
+        keys = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM keys")
+        last_id = cursor.fetchone()[0]
+        conn.close()
+        
+        key_filter = keycodes.CountingBloomFilter(max(1024, 2 * len(keys)), KEY_FILTER_ERROR_RATE)
+        for key in keys:
+            key_filter.add(key)
+        with self._key_filter_lock:
+            self.key_filter = key_filter
+            self._key_filter_last_id = last_id
+            self._key_filter_checked = time.monotonic()
+    
+    def _refresh_key_filter(self):
+        """Добавить в фильтр ключи, созданные другими процессами (не чаще KEY_FILTER_REFRESH_SECONDS)"""
+        if time.monotonic() - self._key_filter_checked < KEY_FILTER_REFRESH_SECONDS:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, key, is_used FROM keys WHERE id > ? ORDER BY id", (self._key_filter_last_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        with self._key_filter_lock:
+            for key_id, key, is_used in rows:
+                if key_id > self._key_filter_last_id:
+                    if not is_used:
+                        self.key_filter.add(key)
+                    self._key_filter_last_id = key_id
+            self._key_filter_checked = time.monotonic()
+            overfilled = len(self.key_filter) > self.key_filter.capacity
+        if overfilled:
+            self.load_key_filter()
+    
+    def key_may_exist(self, key: str) -> bool:
+        """False — неиспользованного ключа точно нет, в БД идти не нужно"""
+        self._refresh_key_filter()
+        return key in self.key_filter
+    
     def generate_key(self, key_type: str, days: int, created_by: int) -> str:
-        key = 'RAVEN-' + ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(16))
+        key = keycodes.generate_key()
         
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -241,9 +524,15 @@ class Database:
             INSERT INTO keys (key, key_type, days, created_at, created_by)
             VALUES (?, ?, ?, ?, ?)
         ''', (key, key_type, days, datetime.now().isoformat(), created_by))
+        key_id = cursor.lastrowid
         conn.commit()
         conn.close()
         
+        with self._key_filter_lock:
+            self.key_filter.add(key)
+            # Свой ключ уже в фильтре — при подгрузке не добавлять его второй раз
+            if key_id == self._key_filter_last_id + 1:
+                self._key_filter_last_id = key_id
         return key
     
     def get_key(self, key: str) -> Optional[Dict]:
@@ -260,6 +549,12 @@ class Database:
         return None
     
     def activate_key(self, key: str, user_id: int) -> tuple[bool, str]:
+        """Активация ключа; key — уже разобранный keycodes.parse_key"""
+        if not self.key_may_exist(key):
+            keycodes.KEY_CHECKS.inc(result="filtered")
+            return False, "❌ Ключ не найден или уже использован!"
+        keycodes.KEY_CHECKS.inc(result="database")
+        
         key_data = self.get_key(key)
         
         if not key_data:
@@ -268,20 +563,26 @@ class Database:
         if key_data['is_used']:
             return False, "❌ Ключ уже использован!"
         
-        # Активируем ключ
+        # Активируем ключ (условие на is_used — два одновременных ввода не активируют его дважды)
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE keys SET is_used = 1, used_by = ?, used_at = ?
-            WHERE key = ?
+            WHERE key = ? AND is_used = 0
         ''', (user_id, datetime.now().isoformat(), key))
+        if cursor.rowcount == 0:
+            conn.close()
+            return False, "❌ Ключ уже использован!"
         
         cursor.execute('''
             UPDATE users SET activated_key = ? WHERE user_id = ?
         ''', (key, user_id))
+        self._bump(cursor, 'key_activations')
         
         conn.commit()
         conn.close()
+        with self._key_filter_lock:
+            self.key_filter.remove(key)
         
         # Добавляем подписку
         if key_data['key_type'] == 'forever':
@@ -306,23 +607,63 @@ class Database:
     def delete_key(self, key: str):
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute("SELECT is_used FROM keys WHERE key = ?", (key,))
+        row = cursor.fetchone()
         cursor.execute("DELETE FROM keys WHERE key = ?", (key,))
         conn.commit()
         conn.close()
+        if row is not None and not row[0]:
+            with self._key_filter_lock:
+                self.key_filter.remove(key)
     
     # ========== ПЛАТЕЖИ ==========
     
-    def create_payment(self, user_id: int, amount: float, sub_type: str) -> int:
+    def create_payment(self, user_id: int, amount: float, sub_type: str,
+                       window_minutes: float = PAYMENT_DEDUP_MINUTES,
+                       redemption_id: Optional[int] = None,
+                       discounted_amount: Optional[float] = None) -> tuple[int, float, bool]:
+        """Заявка на оплату: (id, сумма к оплате, создана ли новая).
+
+        Если у пользователя уже есть ожидающая заявка на этот тариф, созданная
+        не раньше window_minutes назад, возвращается она с той суммой, что
+        записана в ней. Проверка и вставка идут под одной блокировкой записи
+        (BEGIN IMMEDIATE), поэтому два одновременных нажатия не создадут две заявки.
+
+        redemption_id — скидка по промокоду, discounted_amount — цена с ней.
+        Скидка привязывается к новой заявке и больше не действует; если её уже
+        забрала другая заявка, эта создаётся по полной цене amount.
+        """
+        now = datetime.now()
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            SELECT id, amount FROM payments
+            WHERE user_id = ? AND subscription_type = ? AND status = 'pending' AND created_at >= ?
+            ORDER BY created_at DESC LIMIT 1
+        ''', (user_id, sub_type, (now - timedelta(minutes=window_minutes)).isoformat()))
+        row = cursor.fetchone()
+        if row:
+            conn.commit()
+            conn.close()
+            return row[0], row[1], False
+        
         cursor.execute('''
             INSERT INTO payments (user_id, amount, subscription_type, status, created_at)
             VALUES (?, ?, ?, 'pending', ?)
-        ''', (user_id, amount, sub_type, datetime.now().isoformat()))
+        ''', (user_id, amount, sub_type, now.isoformat()))
         payment_id = cursor.lastrowid
+        if redemption_id is not None and discounted_amount is not None:
+            cursor.execute('''
+                UPDATE promo_redemptions SET payment_id = ?
+                WHERE id = ? AND user_id = ? AND payment_id IS NULL
+            ''', (payment_id, redemption_id, user_id))
+            if cursor.rowcount:
+                amount = discounted_amount
+                cursor.execute("UPDATE payments SET amount = ? WHERE id = ?", (amount, payment_id))
         conn.commit()
         conn.close()
-        return payment_id
+        return payment_id, amount, True
     
     def get_pending_payments(self) -> List[Dict]:
         conn = self.get_connection()
@@ -335,47 +676,457 @@ class Database:
                   'created_at', 'confirmed_at', 'confirmed_by']
         return [dict(zip(columns, row)) for row in rows]
     
-    def confirm_payment(self, payment_id: int, admin_id: int) -> Optional[Dict]:
+    def get_payment(self, payment_id: int) -> Optional[Dict]:
         conn = self.get_connection()
         cursor = conn.cursor()
-        
         cursor.execute("SELECT * FROM payments WHERE id = ?", (payment_id,))
         row = cursor.fetchone()
+        conn.close()
         
-        if not row:
-            conn.close()
-            return None
+        if row:
+            columns = ['id', 'user_id', 'amount', 'subscription_type', 'status',
+                      'created_at', 'confirmed_at', 'confirmed_by']
+            return dict(zip(columns, row))
+        return None
+    
+    def get_pending_page(self, before_id: Optional[int] = None, limit: int = 8) -> List[Dict]:
+        """Страница очереди ожидающих платежей (новые сверху) вместе с ником пользователя.
         
-        columns = ['id', 'user_id', 'amount', 'subscription_type', 'status', 
-                  'created_at', 'confirmed_at', 'confirmed_by']
-        payment = dict(zip(columns, row))
+        Пагинация по ключу: следующая страница — before_id = id последнего платежа.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT p.id, p.user_id, p.amount, p.subscription_type, p.created_at, u.nickname, u.username
+            FROM payments p LEFT JOIN users u ON u.user_id = p.user_id
+            WHERE p.status = 'pending' AND p.id < ?
+            ORDER BY p.id DESC LIMIT ?
+        ''', (before_id or 2 ** 63 - 1, limit))
+        rows = cursor.fetchall()
+        conn.close()
         
+        columns = ['id', 'user_id', 'amount', 'subscription_type', 'created_at', 'nickname', 'username']
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def get_user_payments(self, user_id: int, before_id: Optional[int] = None, limit: int = 10) -> List[Dict]:
+        """Платежи пользователя, новые сверху; следующая страница — before_id = id последнего"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
         cursor.execute('''
-            UPDATE payments SET status = 'confirmed', confirmed_at = ?, confirmed_by = ?
-            WHERE id = ?
-        ''', (datetime.now().isoformat(), admin_id, payment_id))
+            SELECT id, amount, subscription_type, status, created_at FROM payments
+            WHERE user_id = ? AND id < ?
+            ORDER BY id DESC LIMIT ?
+        ''', (user_id, before_id or 2 ** 63 - 1, limit))
+        rows = cursor.fetchall()
+        conn.close()
         
-        conn.commit()
+        columns = ['id', 'amount', 'subscription_type', 'status', 'created_at']
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def count_pending_payments(self) -> int:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM payments WHERE status = 'pending'")
+        count = cursor.fetchone()[0]
         conn.close()
+        return count
+    
+    def _take_pending(self, cursor, payment_ids: List[int], status: str, admin_id: Optional[int]) -> List[Dict]:
+        """Перевести ожидающие платежи из списка в status; уже обработанные пропускаются"""
+        ids = sorted(set(payment_ids))
+        if not ids:
+            return []
+        placeholders = ", ".join("?" * len(ids))
+        cursor.execute(f'''
+            SELECT p.id, p.user_id, p.amount, p.subscription_type, u.nickname, u.subscription_end,
+                   u.registered_at, u.first_paid_at
+            FROM payments p LEFT JOIN users u ON u.user_id = p.user_id
+            WHERE p.id IN ({placeholders}) AND p.status = 'pending'
+            ORDER BY p.id
+        ''', ids)
+        columns = ['id', 'user_id', 'amount', 'subscription_type', 'nickname', 'subscription_end',
+                   'registered_at', 'first_paid_at']
+        payments = [dict(zip(columns, row)) for row in cursor.fetchall()]
         
-        # Добавляем подписку
+        cursor.executemany('''
+            UPDATE payments SET status = ?, confirmed_at = ?, confirmed_by = ?
+            WHERE id = ? AND status = 'pending'
+        ''', [(status, datetime.now().isoformat(), admin_id, p['id']) for p in payments])
+        if status == 'rejected':
+            for payment in payments:
+                self._bump(cursor, 'payments_rejected', dim=payment['subscription_type'])
+        return payments
+    
+    def confirm_payments(self, payment_ids: List[int], admin_id: int) -> List[Dict]:
+        """Подтверждение пачки платежей одной транзакцией: статусы, подписки, суммы, логи.
+        
+        Возвращает подтверждённые платежи; subscription_end в каждом — окончание
+        подписки пользователя после всех его платежей из пачки.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        payments = self._take_pending(cursor, payment_ids, 'confirmed', admin_id)
+        self._apply_confirmed(cursor, payments)
+        conn.commit()
+        conn.close()
+        return payments
+    
+    def _apply_confirmed(self, cursor, payments: List[Dict]):
+        """Подписки, суммы и логи по только что подтверждённым платежам (внутри транзакции)"""
         days_map = {'1_day': 1, '14_days': 14, '30_days': 30, 'forever': None}
-        days = days_map.get(payment['subscription_type'])
+        now = datetime.now().isoformat()
         
-        if payment['subscription_type'] == 'forever':
-            self.add_subscription(payment['user_id'], 'forever')
-        else:
-            self.add_subscription(payment['user_id'], payment['subscription_type'], days)
+        # Несколько платежей одного пользователя продлевают подписку по очереди
+        users = {}
+        logs = []
+        for payment in payments:
+            user = users.setdefault(payment['user_id'], {
+                'end': payment['subscription_end'], 'type': None, 'level': 0, 'paid': 0
+            })
+            sub_type = payment['subscription_type']
+            # Подписку «навсегда» платёж за срок не укорачивает
+            if user['end'] != 'forever' or sub_type == 'forever':
+                user['end'], user['level'] = self._extend_subscription(user['end'], sub_type, days_map.get(sub_type))
+                user['type'] = sub_type
+                logs.append((payment['user_id'], "SUBSCRIPTION_ADD", f"Добавлена подписка: {sub_type}", now))
+            user['paid'] += payment['amount']
+            logs.append((payment['user_id'], "PAYMENT_CONFIRM", f"Оплата подтверждена: {payment['amount']}₽", now))
+            self._bump(cursor, 'revenue', payment['amount'], dim=sub_type)
+            self._bump(cursor, 'payments_confirmed', dim=sub_type)
+        
+        # Первая оплата пользователя: день оплаты и когорта его дня регистрации
+        for payment in {p['user_id']: p for p in payments}.values():
+            if payment['first_paid_at'] is None and payment['registered_at']:
+                self._bump(cursor, 'first_payments')
+                self._bump(cursor, 'cohort_paid', day=payment['registered_at'][:10])
+        
+        cursor.executemany('''
+            UPDATE users SET subscription_end = ?, subscription_type = COALESCE(?, subscription_type),
+                notice_level = ?, total_paid = total_paid + ?, first_paid_at = COALESCE(first_paid_at, ?)
+            WHERE user_id = ?
+        ''', [(u['end'], u['type'], u['level'], u['paid'], now, user_id) for user_id, u in users.items()])
+        cursor.executemany('''
+            INSERT INTO logs (user_id, action, details, created_at) VALUES (?, ?, ?, ?)
+        ''', logs)
+        
+        for payment in payments:
+            payment['subscription_end'] = users[payment['user_id']]['end']
+    
+    def confirm_payment(self, payment_id: int, admin_id: int) -> Optional[Dict]:
+        payments = self.confirm_payments([payment_id], admin_id)
+        return payments[0] if payments else None
+    
+    def reject_payments(self, payment_ids: List[int], admin_id: Optional[int] = None) -> List[Dict]:
+        """Отклонение пачки платежей одной транзакцией; возвращает отклонённые"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        payments = self._take_pending(cursor, payment_ids, 'rejected', admin_id)
+        conn.commit()
+        conn.close()
+        return payments
+    
+    def reject_payment(self, payment_id: int, admin_id: Optional[int] = None) -> Optional[Dict]:
+        payments = self.reject_payments([payment_id], admin_id)
+        return payments[0] if payments else None
+    
+    def get_used_txns(self, provider: str) -> set:
+        """Ключи операций провайдера, уже записанных в payment_events"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT txn_id FROM payment_events WHERE provider = ?", (provider,))
+        txns = {row[0] for row in cursor.fetchall()}
+        conn.close()
+        return txns
+    
+    def confirm_txn_payments(self, provider: str, matches: List[tuple], admin_id: int) -> List[Dict]:
+        """Подтверждение платежей по операциям (txn_id, id платежа, сумма) одной транзакцией.
+        
+        Каждая операция записывается в payment_events (UNIQUE (provider, txn_id)),
+        и платёж подтверждается, только если запись новая: один перевод не
+        оплатит две заявки, даже если выписку загрузят повторно.
+        """
+        now = datetime.now().isoformat()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        fresh = {}
+        for txn_id, payment_id, amount in matches:
+            cursor.execute('''
+                INSERT OR IGNORE INTO payment_events
+                (provider, txn_id, payment_id, amount, event_type, status, received_at, processed_at)
+                VALUES (?, ?, ?, ?, 'paid', 'confirmed', ?, ?)
+            ''', (provider, txn_id, payment_id, amount, now, now))
+            if cursor.rowcount:
+                fresh[payment_id] = txn_id
+        
+        payments = self._take_pending(cursor, list(fresh), 'confirmed', admin_id)
+        self._apply_confirmed(cursor, payments)
+        # Заявку успели обработать иначе — перевод всё равно учтён, но не за неё
+        taken = {p['id'] for p in payments}
+        cursor.executemany(
+            "UPDATE payment_events SET status = 'not_pending' WHERE provider = ? AND txn_id = ?",
+            [(provider, txn_id) for payment_id, txn_id in fresh.items() if payment_id not in taken]
+        )
+        conn.commit()
+        conn.close()
+        return payments
+    
+    def process_payment_events(self, limit: int = 100) -> tuple[List[Dict], List[Dict]]:
+        """Пачка новых уведомлений провайдера: (подтверждённые платежи, обработанные события).
+        
+        Платежи подтверждаются и события получают итог в одной транзакции —
+        после сбоя пачка либо применена целиком, либо останется 'new'.
+        Итоги: confirmed, ignored (не оплата), not_found, not_pending (уже
+        подтверждён, отклонён или оплачен другим событием), amount_mismatch.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            SELECT id, provider, txn_id, payment_id, amount, event_type, received_at
+            FROM payment_events WHERE status = 'new'
+            ORDER BY id LIMIT ?
+        ''', (limit,))
+        columns = ['id', 'provider', 'txn_id', 'payment_id', 'amount', 'event_type', 'received_at']
+        events = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        if not events:
+            conn.commit()
+            conn.close()
+            return [], []
+        
+        ids = sorted({e['payment_id'] for e in events if e['payment_id'] is not None})
+        placeholders = ", ".join("?" * len(ids))
+        cursor.execute(f"SELECT id, amount, status FROM payments WHERE id IN ({placeholders})", ids)
+        payments = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        
+        to_confirm = set()
+        for event in events:
+            payment = payments.get(event['payment_id'])
+            if event['event_type'] != 'paid':
+                event['status'] = 'ignored'
+            elif payment is None:
+                event['status'] = 'not_found'
+            elif payment[1] != 'pending' or event['payment_id'] in to_confirm:
+                event['status'] = 'not_pending'
+            elif round((event['amount'] or 0) * 100) != round(payment[0] * 100):
+                event['status'] = 'amount_mismatch'
+            else:
+                event['status'] = 'confirmed'
+                to_confirm.add(event['payment_id'])
+        
+        confirmed = self._take_pending(cursor, list(to_confirm), 'confirmed', None)
+        self._apply_confirmed(cursor, confirmed)
+        now = datetime.now().isoformat()
+        cursor.executemany(
+            "UPDATE payment_events SET status = ?, processed_at = ? WHERE id = ?",
+            [(e['status'], now, e['id']) for e in events]
+        )
+        conn.commit()
+        conn.close()
+        return confirmed, events
+    
+    # ========== ПРОМОКОДЫ ==========
+    
+    def create_promo(self, code: str, discount: int, bonus_days: int, max_uses: Optional[int],
+                     per_user: int, expires_at: Optional[datetime], created_by: int) -> bool:
+        """Новый промокод; False — такой код уже есть"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR IGNORE INTO promo_codes
+            (code, discount, bonus_days, max_uses, per_user, expires_at, created_by, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (code, discount, bonus_days, max_uses, per_user,
+              expires_at.isoformat() if expires_at else None, created_by, datetime.now().isoformat()))
+        created = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return created
+    
+    def get_promo(self, code: str) -> Optional[Dict]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT code, discount, bonus_days, max_uses, uses, per_user, expires_at
+            FROM promo_codes WHERE code = ?
+        ''', (code,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            columns = ['code', 'discount', 'bonus_days', 'max_uses', 'uses', 'per_user', 'expires_at']
+            return dict(zip(columns, row))
+        return None
+    
+    def redeem_promo(self, code: str, user_id: int) -> tuple[str, Optional[Dict]]:
+        """Использование промокода: ('ok' | 'not_found' | 'expired' | 'exhausted' | 'used', промокод).
+        
+        Все условия (срок, общий лимит, лимит на пользователя) проверяет один
+        условный UPDATE счётчика: при тысячах одновременных активаций лимит не
+        превышается, а блокировка записи держится только на время этого
+        UPDATE и вставки активации. Бонусные дни начисляются в той же транзакции.
+        """
+        now = datetime.now()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE promo_codes SET uses = uses + 1
+            WHERE code = ?
+              AND (max_uses IS NULL OR uses < max_uses)
+              AND (expires_at IS NULL OR expires_at > ?)
+              AND per_user > (SELECT COUNT(*) FROM promo_redemptions WHERE user_id = ? AND code = ?)
+        ''', (code, now.isoformat(), user_id, code))
+        taken = cursor.rowcount > 0
+        
+        cursor.execute('''
+            SELECT code, discount, bonus_days, max_uses, uses, per_user, expires_at
+            FROM promo_codes WHERE code = ?
+        ''', (code,))
+        row = cursor.fetchone()
+        columns = ['code', 'discount', 'bonus_days', 'max_uses', 'uses', 'per_user', 'expires_at']
+        promo = dict(zip(columns, row)) if row else None
+        
+        if not taken:
+            conn.rollback()
+            if promo is not None:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM promo_redemptions WHERE user_id = ? AND code = ?", (user_id, code)
+                )
+                used = cursor.fetchone()[0]
+            conn.close()
+            if promo is None:
+                return 'not_found', None
+            if promo['expires_at'] and promo['expires_at'] <= now.isoformat():
+                return 'expired', promo
+            if used >= promo['per_user']:
+                return 'used', promo
+            return 'exhausted', promo
+        
+        cursor.execute('''
+            INSERT INTO promo_redemptions (code, user_id, discount, redeemed_at)
+            VALUES (?, ?, ?, ?)
+        ''', (code, user_id, promo['discount'], now.isoformat()))
+        
+        if promo['bonus_days']:
+            cursor.execute("SELECT subscription_end FROM users WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            current_end = row[0] if row else None
+            # Подписку «навсегда» бонусные дни не меняют
+            if current_end != 'forever':
+                subscription_end, notice_level = self._extend_subscription(current_end, 'promo', promo['bonus_days'])
+                cursor.execute('''
+                    UPDATE users SET subscription_end = ?, subscription_type = COALESCE(subscription_type, 'promo'),
+                        notice_level = ?
+                    WHERE user_id = ?
+                ''', (subscription_end, notice_level, user_id))
+        
+        cursor.execute('''
+            INSERT INTO logs (user_id, action, details, created_at) VALUES (?, ?, ?, ?)
+        ''', (user_id, "PROMO_REDEEM", f"Промокод {code}", now.isoformat()))
+        conn.commit()
+        conn.close()
+        return 'ok', promo
+    
+    def get_promo_discount(self, user_id: int) -> Optional[tuple[int, int]]:
+        """Лучшая ещё не применённая скидка пользователя: (id активации, процент)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, discount FROM promo_redemptions
+            WHERE user_id = ? AND payment_id IS NULL AND discount > 0
+            ORDER BY discount DESC, id LIMIT 1
+        ''', (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return tuple(row) if row else None
+    
+    # ========== РАССЫЛКИ ==========
+    
+    def create_broadcast(self, admin_id: int, from_chat_id: int, message_id: int,
+                         status_chat_id: int, status_message_id: int) -> int:
+        """Создание рассылки и снимок списка получателей"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO broadcasts (admin_id, from_chat_id, message_id, status_chat_id,
+                                    status_message_id, status, created_at)
+            VALUES (?, ?, ?, ?, ?, 'running', ?)
+        ''', (admin_id, from_chat_id, message_id, status_chat_id, status_message_id,
+              datetime.now().isoformat()))
+        broadcast_id = cursor.lastrowid
         
-        self.update_total_paid(payment['user_id'], payment['amount'])
-        self.log_action(payment['user_id'], "PAYMENT_CONFIRM", f"Оплата подтверждена: {payment['amount']}₽")
+        cursor.execute('''
+            INSERT INTO broadcast_recipients (broadcast_id, user_id)
+            SELECT ?, user_id FROM users WHERE is_banned = 0 AND blocked_bot = 0
+        ''', (broadcast_id,))
+        cursor.execute("UPDATE broadcasts SET total = ? WHERE id = ?", (cursor.rowcount, broadcast_id))
         
-        return payment
+        conn.commit()
+        conn.close()
+        return broadcast_id
+    
+    def get_broadcast(self, broadcast_id: int) -> Optional[Dict]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            columns = ['id', 'admin_id', 'from_chat_id', 'message_id', 'status_chat_id',
+                      'status_message_id', 'status', 'total', 'created_at', 'finished_at']
+            return dict(zip(columns, row))
+        return None
+    
+    def get_running_broadcasts(self) -> List[int]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id")
+        rows = cursor.fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+    
+    def get_pending_recipients(self, broadcast_id: int) -> List[int]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id FROM broadcast_recipients
+            WHERE broadcast_id = ? AND status = 'pending'
+        ''', (broadcast_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+    
+    def save_broadcast_results(self, broadcast_id: int, results: List[tuple]):
+        """Сохранение пачки результатов: [(user_id, status, error), ...]"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE broadcast_recipients SET status = ?, error = ?
+            WHERE broadcast_id = ? AND user_id = ?
+        ''', [(status, error, broadcast_id, user_id) for user_id, status, error in results])
+        conn.commit()
+        conn.close()
+    
+    def get_broadcast_counts(self, broadcast_id: int) -> Dict[str, int]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT status, COUNT(*) FROM broadcast_recipients
+            WHERE broadcast_id = ? GROUP BY status
+        ''', (broadcast_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return dict(rows)
     
-    def reject_payment(self, payment_id: int):
+    def finish_broadcast(self, broadcast_id: int):
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE payments SET status = 'rejected' WHERE id = ?", (payment_id,))
+        cursor.execute('''
+            UPDATE broadcasts SET status = 'done', finished_at = ? WHERE id = ?
+        ''', (datetime.now().isoformat(), broadcast_id))
         conn.commit()
         conn.close()
     
@@ -389,11 +1140,10 @@ class Database:
         cursor.execute("SELECT COUNT(*) FROM users")
         total_users = cursor.fetchone()[0]
         
-        # С подпиской
+        # С подпиской (без OR, чтобы срочные считались по индексу idx_users_subscription_end)
         cursor.execute('''
-            SELECT COUNT(*) FROM users 
-            WHERE subscription_end IS NOT NULL 
-            AND (subscription_type = 'forever' OR subscription_end > ?)
+            SELECT (SELECT COUNT(*) FROM users WHERE subscription_type = 'forever')
+                 + (SELECT COUNT(*) FROM users WHERE subscription_end > ? AND subscription_type != 'forever')
         ''', (datetime.now().isoformat(),))
         with_subscription = cursor.fetchone()[0]
         
@@ -437,6 +1187,106 @@ class Database:
             'registered_today': registered_today
         }
     
+    # ========== АНАЛИТИКА ==========
+    
+    # Метрики daily_rollups. revenue, payments_* — в разрезе тарифа; cohort_paid
+    # записывается на день регистрации: сколько зарегистрированных в этот день уже оплатили
+    ROLLUP_METRICS = ('revenue', 'payments_confirmed', 'payments_rejected', 'registrations',
+                      'key_activations', 'first_payments', 'cohort_paid')
+    
+    @staticmethod
+    def _bump(cursor, metric: str, amount: float = 1, dim: str = '', day: Optional[str] = None):
+        """Прибавить к дневному агрегату (внутри транзакции события)"""
+        cursor.execute('''
+            INSERT INTO daily_rollups (day, metric, dim, value) VALUES (?, ?, ?, ?)
+            ON CONFLICT (day, metric, dim) DO UPDATE SET value = value + excluded.value
+        ''', (day or date.today().isoformat(), metric, dim or '', amount))
+    
+    def _backfill_rollups(self, cursor):
+        """Заполнение daily_rollups из истории: платежи, регистрации, логи активаций ключей"""
+        cursor.execute('''
+            UPDATE users SET first_paid_at = (
+                SELECT MIN(COALESCE(confirmed_at, created_at)) FROM payments p
+                WHERE p.user_id = users.user_id AND p.status = 'confirmed'
+            ) WHERE first_paid_at IS NULL
+        ''')
+        cursor.execute('''
+            INSERT INTO daily_rollups (day, metric, dim, value)
+            SELECT substr(confirmed_at, 1, 10), 'revenue', COALESCE(subscription_type, ''), SUM(amount)
+            FROM payments WHERE status = 'confirmed' AND confirmed_at IS NOT NULL GROUP BY 1, 3
+            UNION ALL
+            SELECT substr(confirmed_at, 1, 10), 'payments_confirmed', COALESCE(subscription_type, ''), COUNT(*)
+            FROM payments WHERE status = 'confirmed' AND confirmed_at IS NOT NULL GROUP BY 1, 3
+            UNION ALL
+            -- Старый reject_payment не проставлял confirmed_at: такие отказы — по дню заявки
+            SELECT substr(COALESCE(confirmed_at, created_at), 1, 10), 'payments_rejected',
+                   COALESCE(subscription_type, ''), COUNT(*)
+            FROM payments WHERE status = 'rejected' GROUP BY 1, 3
+            UNION ALL
+            SELECT substr(registered_at, 1, 10), 'registrations', '', COUNT(*)
+            FROM users WHERE registered_at IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT substr(first_paid_at, 1, 10), 'first_payments', '', COUNT(*)
+            FROM users WHERE first_paid_at IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT substr(registered_at, 1, 10), 'cohort_paid', '', COUNT(*)
+            FROM users WHERE first_paid_at IS NOT NULL AND registered_at IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT substr(created_at, 1, 10), 'key_activations', '', COUNT(*)
+            FROM logs WHERE action = 'KEY_ACTIVATE' GROUP BY 1
+        ''')
+    
+    def rebuild_rollups(self):
+        """Пересчитать daily_rollups с нуля (если агрегаты разошлись с историей)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM daily_rollups")
+        self._backfill_rollups(cursor)
+        conn.commit()
+        conn.close()
+    
+    def get_analytics(self, days: int) -> Dict:
+        """Итоги за последние days дней и за такой же период перед ними, выручка по дням.
+        
+        Читаются только строки daily_rollups за 2 * days дней (метрик ~ десяток на день).
+        """
+        today = date.today()
+        start = today - timedelta(days=days - 1)
+        previous_start = start - timedelta(days=days)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT day, metric, dim, value FROM daily_rollups
+            WHERE day >= ? AND day <= ?
+        ''', (previous_start.isoformat(), today.isoformat()))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        current = dict.fromkeys(self.ROLLUP_METRICS, 0)
+        previous = dict.fromkeys(self.ROLLUP_METRICS, 0)
+        by_tariff: Dict[str, List[float]] = {}
+        daily_revenue = [0.0] * days
+        for day, metric, dim, value in rows:
+            if day < start.isoformat():
+                previous[metric] = previous.get(metric, 0) + value
+                continue
+            current[metric] = current.get(metric, 0) + value
+            if metric == 'revenue':
+                daily_revenue[(date.fromisoformat(day) - start).days] += value
+                by_tariff.setdefault(dim, [0, 0])[0] += value
+            elif metric == 'payments_confirmed':
+                by_tariff.setdefault(dim, [0, 0])[1] += value
+        
+        return {
+            'days': days,
+            'current': current,
+            'previous': previous,
+            'by_tariff': by_tariff,
+            'daily_revenue': daily_revenue
+        }
+    
     # ========== ЛОГИ ==========
     
     def log_action(self, user_id: int, action: str, details: str):
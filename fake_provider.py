@@ -0,0 +1,82 @@
+# fake_provider.py - локальная замена платёжного провайдера
+#
+# Шлёт в api_server.py подписанные уведомления об оплате так же, как это
+# делал бы настоящий провайдер: POST /api/payments/webhook/<провайдер>,
+# тело JSON, заголовки X-Timestamp и X-Signature (HMAC-SHA256 секретом из
+# PAYMENT_PROVIDER_SECRETS). Если сумма не указана, берётся из заявки в БД.
+#
+# Примеры:
+#   python fake_provider.py 42                  # оплата заявки #42
+#   python fake_provider.py 42 --repeat 3       # повторная доставка того же txn_id
+#   python fake_provider.py 42 --amount 10      # сумма не совпадает с заявкой
+#   python fake_provider.py 42 --bad-signature  # должен вернуться 401
+import argparse
+import json
+import secrets
+import sqlite3
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from api_server import DB_PATH, payment_signature
+from config import PAYMENT_PROVIDER_SECRETS
+
+
+def payment_amount(payment_id: int) -> float:
+    conn = sqlite3.connect(DB_PATH)
+    row = conn.execute("SELECT amount FROM payments WHERE id = ?", (payment_id,)).fetchone()
+    conn.close()
+    if row is None:
+        sys.exit(f"Заявка #{payment_id} не найдена в {DB_PATH}, укажите --amount")
+    return row[0]
+
+
+def send_event(url: str, secret: str, event: dict, bad_signature: bool = False) -> tuple[int, str]:
+    body = json.dumps(event).encode()
+    timestamp = str(int(time.time()))
+    signature = payment_signature(secret, timestamp, body)
+    if bad_signature:
+        signature = signature[::-1]
+    request = urllib.request.Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "X-Timestamp": timestamp,
+        "X-Signature": signature,
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Уведомление об оплате от тестового провайдера")
+    parser.add_argument("payment_id", type=int, help="ID заявки (order_id у провайдера)")
+    parser.add_argument("--amount", type=float, help="Сумма оплаты (по умолчанию — из заявки)")
+    parser.add_argument("--txn", help="ID транзакции провайдера (по умолчанию — случайный)")
+    parser.add_argument("--status", default="paid", help="Тип события: paid, refunded, failed")
+    parser.add_argument("--repeat", type=int, default=1, help="Сколько раз доставить то же событие")
+    parser.add_argument("--provider", default="fake")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--bad-signature", action="store_true", help="Испортить подпись")
+    args = parser.parse_args()
+
+    secret = PAYMENT_PROVIDER_SECRETS.get(args.provider)
+    if secret is None:
+        sys.exit(f"Провайдер {args.provider} не описан в PAYMENT_PROVIDER_SECRETS")
+
+    event = {
+        "txn_id": args.txn or "fake_" + secrets.token_hex(8),
+        "order_id": args.payment_id,
+        "amount": args.amount if args.amount is not None else payment_amount(args.payment_id),
+        "status": args.status,
+    }
+    url = f"{args.url.rstrip('/')}/api/payments/webhook/{args.provider}"
+    for _ in range(args.repeat):
+        status, body = send_event(url, secret, event, args.bad_signature)
+        print(f"{status} {body.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# fsm_storage.py - хранилище FSM aiogram в SQLite
+#
+# Состояния переживают перезапуск бота и могут быть общими для нескольких
+# процессов. Чтение обслуживается из кэша в памяти (запись идёт сразу и в кэш,
+# и в БД); при нескольких процессах кэш нужно отключить (FSM_CACHE = False),
+# иначе процесс не увидит изменений, сделанных соседом.
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM хранилище на таблице fsm_states с write-through кэшем"""
+
+    def __init__(self, db_name: str, ttl: float, use_cache: bool = True, cleanup_interval: float = 600):
+        self.db_name = db_name
+        self.ttl = ttl
+        self.use_cache = use_cache
+        self.cleanup_interval = cleanup_interval
+        self._conn = sqlite3.connect(db_name)
+        # ключ -> (состояние, данные, время изменения)
+        self._cache: Dict[str, Tuple[Optional[str], Dict[str, Any], float]] = {}
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _load(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        if self.use_cache:
+            entry = self._cache.get(key)
+            record_cache("fsm", entry is not None)
+            if entry is not None:
+                return entry[0], entry[1]
+
+        row = self._conn.execute("SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (key,)).fetchone()
+        state, data = (row[0], json.loads(row[1]) if row[1] else {}) if row else (None, {})
+        # Пустое состояние (нет строки) не кэшируем: это почти каждый пользователь,
+        # нажавший кнопку, а промах стоит одного поиска по первичному ключу.
+        # Время изменения берём из БД: запись уйдёт из кэша вместе со строкой таблицы
+        if self.use_cache and row:
+            self._cache[key] = (state, data, row[2])
+        return state, data
+
+    def _save(self, key: str, state: Optional[str], data: Dict[str, Any]):
+        now = time.time()
+        if state is None and not data:
+            # Пустая запись — удаляем, чтобы таблица не росла
+            self._conn.execute("DELETE FROM fsm_states WHERE key = ?", (key,))
+            self._cache.pop(key, None)
+        else:
+            self._conn.execute('''
+                INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data,
+                                               updated_at = excluded.updated_at
+            ''', (key, state, json.dumps(data, ensure_ascii=False), now))
+            if self.use_cache:
+                self._cache[key] = (state, data, now)
+        self._conn.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        _, data = self._load(storage_key)
+        self._save(storage_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._load(self._key(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+        state, _ = self._load(storage_key)
+        self._save(storage_key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._load(self._key(key))[1].copy()
+
+    def cleanup(self) -> int:
+        """Удаление брошенных состояний старше ttl"""
+        cutoff = time.time() - self.ttl
+        removed = self._conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (cutoff,)).rowcount
+        self._conn.commit()
+        for key in [k for k, entry in self._cache.items() if entry[2] < cutoff]:
+            del self._cache[key]
+        return removed
+
+    def start_cleanup(self):
+        """Периодическая очистка в фоне"""
+        async def cleanup_loop():
+            while True:
+                removed = self.cleanup()
+                if removed:
+                    logger.info(f"🧹 FSM: удалено {removed} брошенных состояний")
+                await asyncio.sleep(self.cleanup_interval)
+
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(cleanup_loop())
+
+    async def close(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+        self._conn.close()
@@ -1,19 +1,25 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from datetime import datetime
 
+import callbacks as cb
+from callbacks import CallbackTable
 from database import db
+from broadcast import broadcasts
+from outbox import notifier
+import texts
+from render import edit_text, edit_markup
 from keyboards import (
     admin_menu_keyboard, admin_users_keyboard, admin_keys_keyboard,
     key_type_keyboard, user_manage_keyboard, give_sub_keyboard,
-    back_to_menu_keyboard
+    back_to_menu_keyboard, analytics_keyboard
 )
-from config import ADMIN_IDS, SUBSCRIPTION_NAMES
+from config import ADMIN_IDS, SUBSCRIPTION_NAMES, ANALYTICS_PERIODS
 
 router = Router()
+callbacks = CallbackTable(router)
 
 class AdminStates(StatesGroup):
     waiting_user_id = State()
@@ -33,78 +39,78 @@ async def cmd_admin(message: Message):
         return
     
     await message.answer(
-        "🔧 <b>Админ-панель Raven Client</b>\n\n"
-        "Выберите раздел:",
+        texts.ADMIN_PANEL,
         reply_markup=admin_menu_keyboard(),
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data == "admin_menu")
+@callbacks(cb.ADMIN_MENU)
 async def callback_admin_menu(callback: CallbackQuery, state: FSMContext):
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Нет доступа!")
         return
     
     await state.clear()
-    await callback.message.edit_text(
-        "🔧 <b>Админ-панель Raven Client</b>\n\n"
-        "Выберите раздел:",
+    await edit_text(
+        callback.message,
+        texts.ADMIN_PANEL,
         reply_markup=admin_menu_keyboard(),
         parse_mode="HTML"
     )
 
 # ========== СТАТИСТИКА ==========
 
-@router.callback_query(F.data == "admin_stats")
+@callbacks(cb.ADMIN_STATS)
 async def callback_admin_stats(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
     
-    stats = db.get_stats()
-    
-    text = (
-        "📊 <b>Статистика Raven Client</b>\n\n"
-        f"<b>👥 Пользователи:</b>\n"
-        f"├ Всего: {stats['total_users']}\n"
-        f"├ С подпиской: {stats['with_subscription']}\n"
-        f"├ Без подписки: {stats['without_subscription']}\n"
-        f"├ Забанено: {stats['banned']}\n"
-        f"└ Сегодня: +{stats['registered_today']}\n\n"
-        f"<b>🔑 Ключи:</b>\n"
-        f"├ Всего: {stats['total_keys']}\n"
-        f"├ Использовано: {stats['used_keys']}\n"
-        f"└ Свободно: {stats['unused_keys']}\n\n"
-        f"<b>💰 Финансы:</b>\n"
-        f"├ Общий доход: {stats['total_revenue']}₽\n"
-        f"└ Ожидает оплат: {stats['pending_payments']}"
-    )
+    text = texts.admin_stats(db.get_stats())
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         text,
         reply_markup=admin_menu_keyboard(),
         parse_mode="HTML"
     )
 
+@callbacks(cb.ADMIN_ANALYTICS)
+async def callback_admin_analytics(callback: CallbackQuery, days: int):
+    if not is_admin(callback.from_user.id):
+        return
+    
+    if days not in ANALYTICS_PERIODS:
+        days = ANALYTICS_PERIODS[0]
+    
+    await edit_text(
+        callback.message,
+        texts.analytics_report(db.get_analytics(days)),
+        reply_markup=analytics_keyboard(days),
+        parse_mode="HTML"
+    )
+
 # ========== ПОЛЬЗОВАТЕЛИ ==========
 
-@router.callback_query(F.data == "admin_users")
+@callbacks(cb.ADMIN_USERS)
 async def callback_admin_users(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "👥 <b>Управление пользователями</b>\n\n"
         "Выберите действие:",
         reply_markup=admin_users_keyboard(),
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data == "admin_find_user")
+@callbacks(cb.ADMIN_FIND_USER)
 async def callback_find_user(callback: CallbackQuery, state: FSMContext):
     if not is_admin(callback.from_user.id):
         return
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "🔍 <b>Поиск пользователя</b>\n\n"
         "Введите Telegram ID пользователя:",
         reply_markup=back_to_menu_keyboard(),
@@ -119,7 +125,7 @@ async def process_user_id(message: Message, state: FSMContext):
     
     try:
         user_id = int(message.text.strip())
-    except:
+    except ValueError:
         await message.answer("❌ Введите корректный ID!")
         return
     
@@ -132,97 +138,41 @@ async def process_user_id(message: Message, state: FSMContext):
     await state.clear()
     await show_user_info(message, user)
 
-async def show_user_info(message: Message, user: dict):
+def user_card(user: dict):
+    """Текст и клавиатура карточки пользователя"""
     sub_info = db.get_subscription_info(user['user_id'])
-    
-    if sub_info and sub_info['active']:
-        if sub_info['type'] == 'forever':
-            sub_text = "♾ Навсегда"
-        else:
-            sub_text = f"✅ {sub_info['days_left']} дней"
-    else:
-        sub_text = "❌ Нет"
-    
-    ban_text = "🚫 Да" if user['is_banned'] else "✅ Нет"
-    reg_date = datetime.fromisoformat(user['registered_at']).strftime("%d.%m.%Y %H:%M")
-    
-    text = (
-        f"👤 <b>Информация о пользователе</b>\n\n"
-        f"🆔 ID: <code>{user['user_id']}</code>\n"
-        f"👤 Username: @{user['username'] or 'Нет'}\n"
-        f"🎮 Никнейм: {user['nickname']}\n"
-        f"🔐 Пароль: <code>{user['password']}</code>\n\n"
-        f"📅 Регистрация: {reg_date}\n"
-        f"💰 Оплачено: {user['total_paid']}₽\n"
-        f"📦 Подписка: {sub_text}\n"
-        f"🚫 Бан: {ban_text}\n"
-        f"🔑 Ключ: {user['activated_key'] or 'Нет'}"
-    )
-    
-    has_sub = sub_info and sub_info['active']
-    
-    await message.answer(
-        text,
-        reply_markup=user_manage_keyboard(user['user_id'], user['is_banned'], has_sub),
-        parse_mode="HTML"
-    )
+    has_sub = bool(sub_info and sub_info['active'])
+    keyboard = user_manage_keyboard(user['user_id'], bool(user['is_banned']), has_sub)
+    return texts.user_info(user, sub_info), keyboard
+
+async def show_user_info(message: Message, user: dict):
+    text, keyboard = user_card(user)
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
 
-@router.callback_query(F.data.startswith("manage_user_"))
-async def callback_manage_user(callback: CallbackQuery):
+@callbacks(cb.MANAGE_USER)
+async def callback_manage_user(callback: CallbackQuery, user_id: int):
     if not is_admin(callback.from_user.id):
         return
     
-    user_id = int(callback.data.replace("manage_user_", ""))
     user = db.get_user(user_id)
     
     if not user:
         await callback.answer("❌ Пользователь не найден!")
         return
     
-    sub_info = db.get_subscription_info(user['user_id'])
-    
-    if sub_info and sub_info['active']:
-        if sub_info['type'] == 'forever':
-            sub_text = "♾ Навсегда"
-        else:
-            sub_text = f"✅ {sub_info['days_left']} дней"
-    else:
-        sub_text = "❌ Нет"
-    
-    ban_text = "🚫 Да" if user['is_banned'] else "✅ Нет"
-    reg_date = datetime.fromisoformat(user['registered_at']).strftime("%d.%m.%Y %H:%M")
-    
-    text = (
-        f"👤 <b>Информация о пользователе</b>\n\n"
-        f"🆔 ID: <code>{user['user_id']}</code>\n"
-        f"👤 Username: @{user['username'] or 'Нет'}\n"
-        f"🎮 Никнейм: {user['nickname']}\n"
-        f"🔐 Пароль: <code>{user['password']}</code>\n\n"
-        f"📅 Регистрация: {reg_date}\n"
-        f"💰 Оплачено: {user['total_paid']}₽\n"
-        f"📦 Подписка: {sub_text}\n"
-        f"🚫 Бан: {ban_text}\n"
-        f"🔑 Ключ: {user['activated_key'] or 'Нет'}"
-    )
-    
-    has_sub = sub_info and sub_info['active']
-    
-    await callback.message.edit_text(
-        text,
-        reply_markup=user_manage_keyboard(user['user_id'], user['is_banned'], has_sub),
-        parse_mode="HTML"
-    )
+    text, keyboard = user_card(user)
+    await edit_text(callback.message, text, reply_markup=keyboard, parse_mode="HTML")
 
 # Бан пользователя
-@router.callback_query(F.data.startswith("ban_"))
-async def callback_ban_user(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.BAN_USER)
+async def callback_ban_user(callback: CallbackQuery, state: FSMContext, user_id: int):
     if not is_admin(callback.from_user.id):
         return
     
-    user_id = int(callback.data.replace("ban_", ""))
     await state.update_data(ban_user_id=user_id)
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "🚫 <b>Бан пользователя</b>\n\n"
         "Введите причину бана:",
         parse_mode="HTML"
@@ -244,23 +194,19 @@ async def process_ban_reason(message: Message, state: FSMContext):
     await message.answer(f"✅ Пользователь {user_id} забанен!\nПричина: {reason}")
     
     # Уведомляем пользователя
-    try:
-        await message.bot.send_message(
-            user_id,
-            f"🚫 <b>Вы были заблокированы!</b>\n\n"
-            f"📝 Причина: {reason}",
-            parse_mode="HTML"
-        )
-    except:
-        pass
+    notifier.send(
+        user_id,
+        f"🚫 <b>Вы были заблокированы!</b>\n\n"
+        f"📝 Причина: {reason}",
+        parse_mode="HTML"
+    )
 
 # Разбан пользователя
-@router.callback_query(F.data.startswith("unban_"))
-async def callback_unban_user(callback: CallbackQuery):
+@callbacks(cb.UNBAN_USER)
+async def callback_unban_user(callback: CallbackQuery, user_id: int):
     if not is_admin(callback.from_user.id):
         return
     
-    user_id = int(callback.data.replace("unban_", ""))
     db.unban_user(user_id)
     
     await callback.answer("✅ Пользователь разбанен!")
@@ -270,81 +216,65 @@ async def callback_unban_user(callback: CallbackQuery):
     sub_info = db.get_subscription_info(user_id)
     has_sub = sub_info and sub_info['active']
     
-    await callback.message.edit_reply_markup(
+    await edit_markup(
+        callback.message,
         reply_markup=user_manage_keyboard(user_id, False, has_sub)
     )
     
     # Уведомляем пользователя
-    try:
-        await callback.bot.send_message(
-            user_id,
-            "✅ <b>Вы были разблокированы!</b>\n\n"
-            "Можете продолжить использование бота.",
-            parse_mode="HTML"
-        )
-    except:
-        pass
+    notifier.send(
+        user_id,
+        "✅ <b>Вы были разблокированы!</b>\n\n"
+        "Можете продолжить использование бота.",
+        parse_mode="HTML"
+    )
 
 # Забрать подписку
-@router.callback_query(F.data.startswith("remove_sub_"))
-async def callback_remove_sub(callback: CallbackQuery):
+@callbacks(cb.REMOVE_SUB)
+async def callback_remove_sub(callback: CallbackQuery, user_id: int):
     if not is_admin(callback.from_user.id):
         return
     
-    user_id = int(callback.data.replace("remove_sub_", ""))
     db.remove_subscription(user_id)
     
     await callback.answer("✅ Подписка удалена!")
     
     user = db.get_user(user_id)
-    await callback.message.edit_reply_markup(
+    await edit_markup(
+        callback.message,
         reply_markup=user_manage_keyboard(user_id, user['is_banned'], False)
     )
     
-    try:
-        await callback.bot.send_message(
-            user_id,
-            "❌ <b>Ваша подписка была отозвана администратором.</b>",
-            parse_mode="HTML"
-        )
-    except:
-        pass
+    notifier.send(
+        user_id,
+        "❌ <b>Ваша подписка была отозвана администратором.</b>",
+        parse_mode="HTML"
+    )
 
 # Выдать подписку
-@router.callback_query(F.data.startswith("give_sub_"))
-async def callback_give_sub(callback: CallbackQuery):
+@callbacks(cb.GIVE_SUB)
+async def callback_give_sub(callback: CallbackQuery, user_id: int):
     if not is_admin(callback.from_user.id):
         return
     
-    user_id = int(callback.data.replace("give_sub_", ""))
-    
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "➕ <b>Выдача подписки</b>\n\n"
         "Выберите тип подписки:",
         reply_markup=give_sub_keyboard(user_id),
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data.startswith("give_"))
-async def callback_give_sub_type(callback: CallbackQuery):
+@callbacks(cb.GIVE_SUB_TYPE)
+async def callback_give_sub_type(callback: CallbackQuery, sub_type: str, user_id: int):
     if not is_admin(callback.from_user.id):
         return
     
-    parts = callback.data.split("_")
-    
-    if parts[1] == "sub":  # give_sub_userID
+    days_map = {'1_day': 1, '14_days': 14, '30_days': 30}
+    if sub_type != 'forever' and sub_type not in days_map:
+        await callback.answer("❌ Неверный тип подписки!")
         return
-    
-    # give_TYPE_userID (например give_1_day_12345 или give_forever_12345)
-    if parts[1] == "forever":
-        sub_type = "forever"
-        user_id = int(parts[2])
-        days = None
-    else:
-        sub_type = f"{parts[1]}_{parts[2]}"  # 1_day, 14_days, 30_days
-        user_id = int(parts[3])
-        days_map = {'1_day': 1, '14_days': 14, '30_days': 30}
-        days = days_map.get(sub_type)
+    days = days_map.get(sub_type)
     
     if sub_type == 'forever':
         db.add_subscription(user_id, 'forever')
@@ -354,128 +284,92 @@ async def callback_give_sub_type(callback: CallbackQuery):
     await callback.answer("✅ Подписка выдана!")
     
     user = db.get_user(user_id)
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         f"✅ Пользователю {user['nickname']} выдана подписка: {SUBSCRIPTION_NAMES.get(sub_type, sub_type)}",
         reply_markup=admin_menu_keyboard(),
         parse_mode="HTML"
     )
     
-    try:
-        await callback.bot.send_message(
-            user_id,
-            f"🎉 <b>Вам выдана подписка!</b>\n\n"
-            f"📦 Тип: {SUBSCRIPTION_NAMES.get(sub_type, sub_type)}",
-            parse_mode="HTML"
-        )
-    except:
-        pass
+    notifier.send(
+        user_id,
+        f"🎉 <b>Вам выдана подписка!</b>\n\n"
+        f"📦 Тип: {SUBSCRIPTION_NAMES.get(sub_type, sub_type)}",
+        parse_mode="HTML"
+    )
 
 # Список с подпиской
-@router.callback_query(F.data == "admin_users_sub")
+@callbacks(cb.ADMIN_USERS_SUB)
 async def callback_users_with_sub(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
     
     users = db.get_all_users()
-    users_with_sub = [u for u in users if db.has_subscription(u['user_id'])]
-    
-    if not users_with_sub:
-        await callback.message.edit_text(
-            "📋 <b>Пользователи с подпиской</b>\n\n"
-            "Список пуст.",
-            reply_markup=admin_users_keyboard(),
-            parse_mode="HTML"
-        )
-        return
+    subs = {u['user_id']: db.subscription_from_user(u) for u in users}
+    users_with_sub = [u for u in users if subs[u['user_id']] and subs[u['user_id']]['active']]
     
-    text = "📋 <b>Пользователи с подпиской</b>\n\n"
-    
-    for i, user in enumerate(users_with_sub[:20], 1):
-        sub_info = db.get_subscription_info(user['user_id'])
-        if sub_info['type'] == 'forever':
-            sub_text = "♾"
-        else:
-            sub_text = f"{sub_info['days_left']}д"
-        
-        text += f"{i}. {user['nickname']} (<code>{user['user_id']}</code>) - {sub_text}\n"
-    
-    if len(users_with_sub) > 20:
-        text += f"\n... и ещё {len(users_with_sub) - 20}"
-    
-    await callback.message.edit_text(
-        text,
+    await edit_text(
+        callback.message,
+        texts.users_with_sub(users_with_sub, subs),
         reply_markup=admin_users_keyboard(),
         parse_mode="HTML"
     )
 
 # Забаненные
-@router.callback_query(F.data == "admin_users_banned")
+@callbacks(cb.ADMIN_USERS_BANNED)
 async def callback_users_banned(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
     
-    users = db.get_all_users()
-    banned_users = [u for u in users if u['is_banned']]
-    
-    if not banned_users:
-        await callback.message.edit_text(
-            "🚫 <b>Забаненные пользователи</b>\n\n"
-            "Список пуст.",
-            reply_markup=admin_users_keyboard(),
-            parse_mode="HTML"
-        )
-        return
+    banned_users = [u for u in db.get_all_users() if u['is_banned']]
     
-    text = "🚫 <b>Забаненные пользователи</b>\n\n"
-    
-    for i, user in enumerate(banned_users[:20], 1):
-        text += f"{i}. {user['nickname']} (<code>{user['user_id']}</code>)\n"
-        text += f"   Причина: {user['ban_reason'] or 'Не указана'}\n"
-    
-    await callback.message.edit_text(
-        text,
+    await edit_text(
+        callback.message,
+        texts.banned_users(banned_users),
         reply_markup=admin_users_keyboard(),
         parse_mode="HTML"
     )
 
 # ========== КЛЮЧИ ==========
 
-@router.callback_query(F.data == "admin_keys")
+@callbacks(cb.ADMIN_KEYS)
 async def callback_admin_keys(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "🔑 <b>Управление ключами</b>\n\n"
         "Выберите действие:",
         reply_markup=admin_keys_keyboard(),
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data == "admin_create_key")
+@callbacks(cb.ADMIN_CREATE_KEY)
 async def callback_create_key(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "➕ <b>Создание ключа</b>\n\n"
         "Выберите тип ключа:",
         reply_markup=key_type_keyboard(),
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data.startswith("gen_key_"))
-async def callback_gen_key(callback: CallbackQuery):
+@callbacks(cb.GEN_KEY)
+async def callback_gen_key(callback: CallbackQuery, key_type: str):
     if not is_admin(callback.from_user.id):
         return
     
-    key_type = callback.data.replace("gen_key_", "")
     days_map = {'1_day': 1, '14_days': 14, '30_days': 30, 'forever': 0}
     days = days_map.get(key_type, 0)
     
     key = db.generate_key(key_type, days, callback.from_user.id)
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         f"✅ <b>Ключ создан!</b>\n\n"
         f"🔑 Ключ: <code>{key}</code>\n"
         f"📦 Тип: {SUBSCRIPTION_NAMES.get(key_type, key_type)}\n"
@@ -484,153 +378,45 @@ async def callback_gen_key(callback: CallbackQuery):
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data == "admin_all_keys")
+@callbacks(cb.ADMIN_ALL_KEYS)
 async def callback_all_keys(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
     
-    keys = db.get_all_keys()
-    
-    if not keys:
-        await callback.message.edit_text(
-            "🔑 <b>Все ключи</b>\n\nСписок пуст.",
-            reply_markup=admin_keys_keyboard(),
-            parse_mode="HTML"
-        )
-        return
-    
-    text = "🔑 <b>Все ключи</b>\n\n"
-    
-    for key in keys[:15]:
-        status = "✅" if not key['is_used'] else "❌"
-        text += f"{status} <code>{key['key']}</code>\n"
-        text += f"   Тип: {key['key_type']}, Дней: {key['days'] or '∞'}\n"
-    
-    if len(keys) > 15:
-        text += f"\n... и ещё {len(keys) - 15}"
-    
-    await callback.message.edit_text(
-        text,
+    await edit_text(
+        callback.message,
+        texts.keys_list(db.get_all_keys()),
         reply_markup=admin_keys_keyboard(),
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data == "admin_unused_keys")
+@callbacks(cb.ADMIN_UNUSED_KEYS)
 async def callback_unused_keys(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
     
-    keys = db.get_all_keys()
-    unused = [k for k in keys if not k['is_used']]
-    
-    if not unused:
-        await callback.message.edit_text(
-            "✅ <b>Неиспользованные ключи</b>\n\nСписок пуст.",
-            reply_markup=admin_keys_keyboard(),
-            parse_mode="HTML"
-        )
-        return
-    
-    text = "✅ <b>Неиспользованные ключи</b>\n\n"
-    
-    for key in unused[:15]:
-        text += f"<code>{key['key']}</code>\n"
-        text += f"   Тип: {key['key_type']}, Дней: {key['days'] or '∞'}\n"
+    unused = [k for k in db.get_all_keys() if not k['is_used']]
     
-    if len(unused) > 15:
-        text += f"\n... и ещё {len(unused) - 15}"
-    
-    await callback.message.edit_text(
-        text,
+    await edit_text(
+        callback.message,
+        texts.keys_list(unused, unused_only=True),
         reply_markup=admin_keys_keyboard(),
         parse_mode="HTML"
     )
 
 # ========== ПЛАТЕЖИ ==========
 
-@router.callback_query(F.data == "admin_payments")
-async def callback_admin_payments(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
-        return
-    
-    payments = db.get_pending_payments()
-    
-    if not payments:
-        await callback.message.edit_text(
-            "💰 <b>Ожидающие платежи</b>\n\n"
-            "Нет ожидающих платежей.",
-            reply_markup=admin_menu_keyboard(),
-            parse_mode="HTML"
-        )
-        return
-    
-    text = "💰 <b>Ожидающие платежи</b>\n\n"
-    
-    for p in payments[:10]:
-        user = db.get_user(p['user_id'])
-        created = datetime.fromisoformat(p['created_at']).strftime("%d.%m %H:%M")
-        text += (
-            f"#{p['id']} | {user['nickname']} | {p['amount']}₽\n"
-            f"   {SUBSCRIPTION_NAMES.get(p['subscription_type'], p['subscription_type'])} | {created}\n\n"
-        )
-    
-    await callback.message.edit_text(
-        text,
-        reply_markup=admin_menu_keyboard(),
-        parse_mode="HTML"
-    )
-
-@router.callback_query(F.data.startswith("confirm_pay_"))
-async def callback_confirm_payment(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
-        return
-    
-    payment_id = int(callback.data.replace("confirm_pay_", ""))
-    payment = db.confirm_payment(payment_id, callback.from_user.id)
-    
-    if not payment:
-        await callback.answer("❌ Платёж не найден!")
-        return
-    
-    await callback.message.edit_text(
-        f"✅ Платёж #{payment_id} подтверждён!",
-        parse_mode="HTML"
-    )
-    
-    # Уведомляем пользователя
-    try:
-        await callback.bot.send_message(
-            payment['user_id'],
-            f"✅ <b>Оплата подтверждена!</b>\n\n"
-            f"📦 Тариф: {SUBSCRIPTION_NAMES.get(payment['subscription_type'], payment['subscription_type'])}\n"
-            f"💰 Сумма: {payment['amount']}₽\n\n"
-            f"Спасибо за покупку! 🎉",
-            parse_mode="HTML"
-        )
-    except:
-        pass
-
-@router.callback_query(F.data.startswith("reject_pay_"))
-async def callback_reject_payment(callback: CallbackQuery):
-    if not is_admin(callback.from_user.id):
-        return
-    
-    payment_id = int(callback.data.replace("reject_pay_", ""))
-    db.reject_payment(payment_id)
-    
-    await callback.message.edit_text(
-        f"❌ Платёж #{payment_id} отклонён!",
-        parse_mode="HTML"
-    )
+# Очередь платежей, подтверждение и отклонение — в handlers/payment.py
 
 # ========== РАССЫЛКА ==========
 
-@router.callback_query(F.data == "admin_broadcast")
+@callbacks(cb.ADMIN_BROADCAST)
 async def callback_broadcast(callback: CallbackQuery, state: FSMContext):
     if not is_admin(callback.from_user.id):
         return
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         "📨 <b>Рассылка</b>\n\n"
         "Отправьте сообщение для рассылки всем пользователям:",
         parse_mode="HTML"
@@ -644,50 +430,26 @@ async def process_broadcast(message: Message, state: FSMContext):
     
     await state.clear()
     
-    users = db.get_all_users()
-    success = 0
-    failed = 0
-    
     status_msg = await message.answer("📨 Рассылка началась...")
     
-    for user in users:
-        if user['is_banned']:
-            continue
-        try:
-            await message.copy_to(user['user_id'])
-            success += 1
-        except:
-            failed += 1
-    
-    await status_msg.edit_text(
-        f"✅ <b>Рассылка завершена!</b>\n\n"
-        f"📨 Отправлено: {success}\n"
-        f"❌ Ошибок: {failed}",
-        parse_mode="HTML"
-    )
+    # Отправка идёт в фоне; прогресс обновляется в status_msg
+    await broadcasts.start(message.bot, message, status_msg)
 
 # История действий пользователя
-@router.callback_query(F.data.startswith("user_logs_"))
-async def callback_user_logs(callback: CallbackQuery):
+@callbacks(cb.USER_LOGS)
+async def callback_user_logs(callback: CallbackQuery, user_id: int):
     if not is_admin(callback.from_user.id):
         return
     
-    user_id = int(callback.data.replace("user_logs_", ""))
     logs = db.get_user_logs(user_id, 15)
     
     if not logs:
         await callback.answer("📜 Логов нет")
         return
     
-    text = f"📜 <b>Логи пользователя {user_id}</b>\n\n"
-    
-    for log in logs:
-        dt = datetime.fromisoformat(log['created_at']).strftime("%d.%m %H:%M")
-        text += f"[{dt}] {log['action']}: {log['details']}\n"
-    
-    from keyboards import admin_users_keyboard
-    await callback.message.edit_text(
-        text,
+    await edit_text(
+        callback.message,
+        texts.user_logs(user_id, logs),
         reply_markup=admin_users_keyboard(),
         parse_mode="HTML"
     )
\ No newline at end of file
@@ -1,104 +1,87 @@
-from aiogram import Router, F, Bot
+import asyncio
+from typing import Optional
+
+from aiogram import Router, F
+from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from datetime import datetime
+from datetime import datetime, timedelta
 
+import callbacks as cb
+from callbacks import CallbackTable
 from database import db
+from middlewares.user_context import UserContext
+from outbox import notifier
+import reconcile
+import texts
+from promo import promos, normalize_code, discounted
+from render import edit_text
 from keyboards import (
     subscription_keyboard, payment_keyboard, back_to_menu_keyboard,
-    payment_confirm_keyboard
+    payment_confirm_keyboard, payments_review_keyboard, admin_menu_keyboard, user_payments_keyboard
+)
+from config import (
+    PRICES, SUBSCRIPTION_NAMES, ADMIN_IDS, PAYMENTS_PAGE_SIZE, USER_PAYMENTS_PAGE_SIZE, RECONCILE_MAX_BYTES
 )
-from config import PRICES, SUBSCRIPTION_NAMES, PAYMENT_CARD, PAYMENT_SBP, ADMIN_IDS
 
 router = Router()
+callbacks = CallbackTable(router)
 
 class PaymentStates(StatesGroup):
     waiting_payment_proof = State()
 
+class ReconcileStates(StatesGroup):
+    waiting_statement = State()
+
 # ========== ПОКУПКА ПОДПИСКИ ==========
 
-@router.callback_query(F.data == "buy_subscription")
+@callbacks(cb.BUY_MENU)
 async def callback_buy_subscription(callback: CallbackQuery):
     """Меню выбора подписки"""
     
-    # Проверяем бан
-    if db.is_banned(callback.from_user.id):
-        await callback.answer("🚫 Вы заблокированы!", show_alert=True)
-        return
+    text = texts.BUY_MENU
     
-    text = (
-        "💳 <b>Покупка подписки Raven Client</b>\n\n"
-        "Выберите подходящий тариф:\n\n"
-        f"⏱ <b>1 день</b> — {PRICES['1_day']}₽\n"
-        f"   └ Идеально для теста\n\n"
-        f"📅 <b>14 дней</b> — {PRICES['14_days']}₽\n"
-        f"   └ Выгодно для начала\n\n"
-        f"📆 <b>30 дней</b> — {PRICES['30_days']}₽\n"
-        f"   └ Оптимальный выбор\n\n"
-        f"♾ <b>Навсегда</b> — {PRICES['forever']}₽\n"
-        f"   └ Максимальная выгода!"
-    )
-    
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         text, 
         reply_markup=subscription_keyboard(), 
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data.in_({"buy_1_day", "buy_14_days", "buy_30_days", "buy_forever"}))
-async def callback_select_subscription(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.BUY)
+async def callback_select_subscription(callback: CallbackQuery, state: FSMContext, sub_type: str):
     """Выбор конкретной подписки"""
     
-    sub_type = callback.data.replace("buy_", "")
-    
     if sub_type not in PRICES:
         await callback.answer("❌ Неверный тип подписки!", show_alert=True)
         return
     
-    price = PRICES[sub_type]
     name = SUBSCRIPTION_NAMES[sub_type]
+    price, percent, _ = promo_price(callback.from_user.id, sub_type)
     
     # Сохраняем выбор в состояние
     await state.update_data(selected_sub=sub_type, selected_price=price)
     
-    text = (
-        f"💳 <b>Оформление подписки</b>\n\n"
-        f"📦 Тариф: <b>{name}</b>\n"
-        f"💰 Стоимость: <b>{price}₽</b>\n\n"
-        f"━━━━━━━━━━━━━━━━━━━━━━\n"
-        f"<b>💳 Реквизиты для оплаты:</b>\n\n"
-        f"🏦 <b>Карта:</b>\n"
-        f"<code>{PAYMENT_CARD}</code>\n\n"
-        f"📱 <b>СБП (по номеру):</b>\n"
-        f"<code>{PAYMENT_SBP}</code>\n"
-        f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"⚠️ <b>ВАЖНО!</b>\n"
-        f"В комментарии к переводу укажите:\n"
-        f"<code>{callback.from_user.id}</code>\n\n"
-        f"После оплаты нажмите кнопку ниже 👇"
-    )
+    text = texts.payment_details(name, price, callback.from_user.id, percent)
     
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         text, 
         reply_markup=payment_keyboard(sub_type), 
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data.startswith("paid_"))
-async def callback_payment_done(callback: CallbackQuery, state: FSMContext):
-    """Пользователь нажал "Оплатил" """
-    
-    sub_type = callback.data.replace("paid_", "")
-    price = PRICES.get(sub_type, 0)
-    name = SUBSCRIPTION_NAMES.get(sub_type, sub_type)
-    
-    # Создаём запись о платеже
-    payment_id = db.create_payment(callback.from_user.id, price, sub_type)
-    
-    # Получаем данные пользователя
-    user = db.get_user(callback.from_user.id)
-    
+def promo_price(user_id: int, sub_type: str) -> tuple[int, int, Optional[int]]:
+    """(цена с учётом скидки по промокоду, процент скидки, id активации промокода)"""
+    discount = db.get_promo_discount(user_id)
+    if discount is None:
+        return PRICES[sub_type], 0, None
+    redemption_id, percent = discount
+    return discounted(PRICES[sub_type], percent), percent, redemption_id
+
+def notify_new_payment(callback: CallbackQuery, user: dict, payment_id: int, name: str, price: float):
+    """Уведомление админам о новой заявке"""
     # Формируем сообщение для админов
     admin_text = (
         f"💰 <b>НОВАЯ ЗАЯВКА НА ОПЛАТУ!</b>\n\n"
@@ -110,29 +93,50 @@ async def callback_payment_done(callback: CallbackQuery, state: FSMContext):
         f"└ Всего оплачено ранее: {user['total_paid']}₽\n\n"
         f"📦 <b>Заказ:</b>\n"
         f"├ Тариф: {name}\n"
-        f"├ Сумма: {price}₽\n"
+        f"├ Сумма: {price:g}₽\n"
         f"└ ID платежа: #{payment_id}\n"
         f"━━━━━━━━━━━━━━━━━━━━━━\n"
         f"🕐 Время: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"
     )
     
     # Отправляем уведомление всем админам
-    for admin_id in ADMIN_IDS:
-        try:
-            await callback.bot.send_message(
-                admin_id,
-                admin_text,
-                reply_markup=payment_confirm_keyboard(payment_id, callback.from_user.id),
-                parse_mode="HTML"
-            )
-        except Exception as e:
-            print(f"Ошибка отправки админу {admin_id}: {e}")
+    notifier.notify_admins(
+        admin_text,
+        reply_markup=payment_confirm_keyboard(payment_id, callback.from_user.id),
+        parse_mode="HTML"
+    )
+
+@callbacks(cb.PAID)
+async def callback_payment_done(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext, sub_type: str):
+    """Пользователь нажал "Оплатил" """
+    
+    if sub_type not in PRICES:
+        await callback.answer("❌ Неверный тип подписки!", show_alert=True)
+        return
+    
+    discounted_price, _, redemption_id = promo_price(callback.from_user.id, sub_type)
+    name = SUBSCRIPTION_NAMES.get(sub_type, sub_type)
+    
+    # Создаём запись о платеже; повторное нажатие вернёт уже созданную заявку.
+    # Скидка по промокоду расходуется только новой заявкой. Показываем сумму,
+    # записанную в заявке: с ней сверяются провайдер и выписка
+    payment_id, price, created = db.create_payment(
+        callback.from_user.id, PRICES[sub_type], sub_type,
+        redemption_id=redemption_id, discounted_amount=discounted_price if redemption_id else None
+    )
+    
+    if created:
+        notify_new_payment(callback, user_ctx.user, payment_id, name, price)
+    else:
+        # Заявка уже у админов — второй раз их не тревожим
+        await callback.answer(f"⏳ Заявка #{payment_id} уже отправлена, ожидайте подтверждения")
     
     # Отвечаем пользователю
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         f"✅ <b>Заявка на оплату отправлена!</b>\n\n"
         f"📦 Тариф: {name}\n"
-        f"💰 Сумма: {price}₽\n"
+        f"💰 Сумма: {price:g}₽\n"
         f"🔢 Номер заявки: #{payment_id}\n\n"
         f"⏳ Ожидайте подтверждения от администратора.\n"
         f"Обычно это занимает <b>до 30 минут</b>.\n\n"
@@ -145,29 +149,35 @@ async def callback_payment_done(callback: CallbackQuery, state: FSMContext):
 
 # ========== АДМИН: ПОДТВЕРЖДЕНИЕ ПЛАТЕЖЕЙ ==========
 
-@router.callback_query(F.data.startswith("confirm_pay_"))
-async def callback_confirm_payment(callback: CallbackQuery):
+def notify_payers(payments: list, render):
+    """Уведомления пользователям одной пачкой: по сообщению на пользователя"""
+    by_user = {}
+    for payment in payments:
+        by_user.setdefault(payment['user_id'], []).append(payment)
+    notifier.send_many(((user_id, render(items)) for user_id, items in by_user.items()), parse_mode="HTML")
+
+@callbacks(cb.CONFIRM_PAYMENT)
+async def callback_confirm_payment(callback: CallbackQuery, payment_id: int):
     """Админ подтверждает платёж"""
     
     if callback.from_user.id not in ADMIN_IDS:
         await callback.answer("❌ Нет доступа!", show_alert=True)
         return
     
-    payment_id = int(callback.data.replace("confirm_pay_", ""))
     payment = db.confirm_payment(payment_id, callback.from_user.id)
     
     if not payment:
         await callback.answer("❌ Платёж не найден или уже обработан!", show_alert=True)
         return
     
-    user = db.get_user(payment['user_id'])
     name = SUBSCRIPTION_NAMES.get(payment['subscription_type'], payment['subscription_type'])
     
     # Обновляем сообщение у админа
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         f"✅ <b>ПЛАТЁЖ ПОДТВЕРЖДЁН!</b>\n\n"
         f"🔢 ID платежа: #{payment_id}\n"
-        f"👤 Пользователь: {user['nickname']} ({payment['user_id']})\n"
+        f"👤 Пользователь: {payment['nickname']} ({payment['user_id']})\n"
         f"📦 Тариф: {name}\n"
         f"💰 Сумма: {payment['amount']}₽\n\n"
         f"✅ Подтвердил: @{callback.from_user.username or callback.from_user.id}\n"
@@ -176,58 +186,32 @@ async def callback_confirm_payment(callback: CallbackQuery):
     )
     
     # Уведомляем пользователя
-    try:
-        sub_info = db.get_subscription_info(payment['user_id'])
-        
-        if sub_info and sub_info['type'] == 'forever':
-            end_text = "♾ Навсегда"
-        elif sub_info:
-            end_text = f"до {sub_info['end'].strftime('%d.%m.%Y %H:%M')}"
-        else:
-            end_text = "Активна"
-        
-        await callback.bot.send_message(
-            payment['user_id'],
-            f"🎉 <b>Оплата подтверждена!</b>\n\n"
-            f"📦 Тариф: <b>{name}</b>\n"
-            f"💰 Сумма: <b>{payment['amount']}₽</b>\n"
-            f"📅 Подписка: <b>{end_text}</b>\n\n"
-            f"Спасибо за покупку! Приятной игры! 🦅",
-            parse_mode="HTML"
-        )
-    except Exception as e:
-        print(f"Ошибка уведомления пользователя: {e}")
+    notify_payers([payment], texts.payment_confirmed)
     
     await callback.answer("✅ Платёж подтверждён!")
 
-@router.callback_query(F.data.startswith("reject_pay_"))
-async def callback_reject_payment(callback: CallbackQuery):
+@callbacks(cb.REJECT_PAYMENT)
+async def callback_reject_payment(callback: CallbackQuery, payment_id: int):
     """Админ отклоняет платёж"""
     
     if callback.from_user.id not in ADMIN_IDS:
         await callback.answer("❌ Нет доступа!", show_alert=True)
         return
     
-    payment_id = int(callback.data.replace("reject_pay_", ""))
-    
-    # Получаем данные платежа до отклонения
-    payments = db.get_pending_payments()
-    payment = next((p for p in payments if p['id'] == payment_id), None)
+    payment = db.reject_payment(payment_id, callback.from_user.id)
     
     if not payment:
         await callback.answer("❌ Платёж не найден или уже обработан!", show_alert=True)
         return
     
-    db.reject_payment(payment_id)
-    
-    user = db.get_user(payment['user_id'])
     name = SUBSCRIPTION_NAMES.get(payment['subscription_type'], payment['subscription_type'])
     
     # Обновляем сообщение у админа
-    await callback.message.edit_text(
+    await edit_text(
+        callback.message,
         f"❌ <b>ПЛАТЁЖ ОТКЛОНЁН!</b>\n\n"
         f"🔢 ID платежа: #{payment_id}\n"
-        f"👤 Пользователь: {user['nickname']} ({payment['user_id']})\n"
+        f"👤 Пользователь: {payment['nickname']} ({payment['user_id']})\n"
         f"📦 Тариф: {name}\n"
         f"💰 Сумма: {payment['amount']}₽\n\n"
         f"❌ Отклонил: @{callback.from_user.username or callback.from_user.id}\n"
@@ -236,36 +220,157 @@ async def callback_reject_payment(callback: CallbackQuery):
     )
     
     # Уведомляем пользователя
-    try:
-        await callback.bot.send_message(
-            payment['user_id'],
-            f"❌ <b>Заявка на оплату отклонена</b>\n\n"
-            f"📦 Тариф: {name}\n"
-            f"💰 Сумма: {payment['amount']}₽\n\n"
-            f"Возможные причины:\n"
-            f"• Платёж не найден\n"
-            f"• Неверная сумма\n"
-            f"• Не указан ID в комментарии\n\n"
-            f"Если вы уверены, что оплатили — обратитесь к администратору.",
-            parse_mode="HTML"
-        )
-    except Exception as e:
-        print(f"Ошибка уведомления пользователя: {e}")
+    notify_payers([payment], texts.payment_rejected)
     
     await callback.answer("❌ Платёж отклонён!")
 
-# ========== ПРОМОКОДЫ (бонус) ==========
+# ========== АДМИН: ОЧЕРЕДЬ ПЛАТЕЖЕЙ ==========
+# Платежи отмечаются кнопками (выбор хранится в FSM и переживает листание),
+# затем подтверждаются или отклоняются разом — одной транзакцией в БД.
+
+async def show_payments_queue(callback: CallbackQuery, state: FSMContext, before_id: int = 0):
+    data = await state.get_data()
+    selected = set(data.get('selected_payments', []))
+    
+    rows = db.get_pending_page(before_id or None, PAYMENTS_PAGE_SIZE + 1)
+    page = rows[:PAYMENTS_PAGE_SIZE]
+    next_before = page[-1]['id'] if len(rows) > PAYMENTS_PAGE_SIZE else None
+    
+    await edit_text(
+        callback.message,
+        texts.payments_review(page, db.count_pending_payments(), len(selected)),
+        reply_markup=payments_review_keyboard(page, selected, before_id, next_before),
+        parse_mode="HTML"
+    )
+
+@callbacks(cb.ADMIN_PAYMENTS)
+async def callback_admin_payments(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+    await show_payments_queue(callback, state)
+
+@callbacks(cb.PAYMENTS_PAGE)
+async def callback_payments_page(callback: CallbackQuery, state: FSMContext, before_id: int):
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+    await show_payments_queue(callback, state, before_id)
+
+@callbacks(cb.TOGGLE_PAYMENT)
+async def callback_toggle_payment(callback: CallbackQuery, state: FSMContext, payment_id: int, before_id: int):
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+    
+    data = await state.get_data()
+    selected = set(data.get('selected_payments', []))
+    selected ^= {payment_id}
+    await state.update_data(selected_payments=sorted(selected))
+    await show_payments_queue(callback, state, before_id)
+
+async def process_selected(callback: CallbackQuery, state: FSMContext, confirm: bool):
+    """Массовое подтверждение или отклонение отмеченных платежей"""
+    data = await state.get_data()
+    selected = data.get('selected_payments', [])
+    if not selected:
+        await callback.answer("Ничего не выбрано")
+        return
+    
+    if confirm:
+        payments = db.confirm_payments(selected, callback.from_user.id)
+        notify_payers(payments, texts.payment_confirmed)
+        result = f"✅ Подтверждено: {len(payments)}"
+    else:
+        payments = db.reject_payments(selected, callback.from_user.id)
+        notify_payers(payments, texts.payment_rejected)
+        result = f"❌ Отклонено: {len(payments)}"
+    
+    skipped = len(selected) - len(payments)
+    if skipped:
+        result += f"\nУже обработаны ранее: {skipped}"
+    
+    await state.update_data(selected_payments=[])
+    await callback.answer(result, show_alert=bool(skipped))
+    await show_payments_queue(callback, state)
+
+@callbacks(cb.CONFIRM_SELECTED)
+async def callback_confirm_selected(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+    await process_selected(callback, state, confirm=True)
+
+@callbacks(cb.REJECT_SELECTED)
+async def callback_reject_selected(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+    await process_selected(callback, state, confirm=False)
+
+# ========== АДМИН: СВЕРКА С ВЫПИСКОЙ ==========
+
+@callbacks(cb.RECONCILE)
+async def callback_reconcile(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+    
+    await edit_text(
+        callback.message,
+        "📥 <b>Сверка с выпиской</b>\n\n"
+        "Пришлите выгрузку из банка документом (CSV или OFX).\n\n"
+        "Переводы, где в комментарии указан ID пользователя и сумма совпадает "
+        "ровно с одной заявкой, будут подтверждены автоматически. Переводы, "
+        "сделанные раньше заявки или учтённые по прошлым выпискам, пропускаются.",
+        reply_markup=back_to_menu_keyboard(),
+        parse_mode="HTML"
+    )
+    await state.set_state(ReconcileStates.waiting_statement)
+
+def reconcile_statement(buffer) -> reconcile.ReconcileReport:
+    return reconcile.match_statement(
+        reconcile.read_statement(buffer), db.get_pending_payments(), db.get_used_txns(reconcile.PROVIDER)
+    )
+
+@router.message(ReconcileStates.waiting_statement, F.document)
+async def process_statement(message: Message, state: FSMContext):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    if (message.document.file_size or 0) > RECONCILE_MAX_BYTES:
+        await message.answer(f"❌ Файл больше {RECONCILE_MAX_BYTES // 1024 // 1024} МБ")
+        return
+    
+    buffer = await message.bot.download(message.document)
+    try:
+        # Разбор и сопоставление — в потоке, чтобы большая выписка не держала event loop
+        report = await asyncio.to_thread(reconcile_statement, buffer)
+    except reconcile.StatementError as e:
+        await message.answer(f"❌ Не удалось прочитать выписку: {e}")
+        return
+    
+    payments = db.confirm_txn_payments(
+        reconcile.PROVIDER,
+        [(row.txn_key, payment_id, row.amount / 100) for row, payment_id in report.matched],
+        message.from_user.id
+    )
+    notify_payers(payments, texts.payment_confirmed)
+    db.log_action(message.from_user.id, "RECONCILE", f"Сверка: строк {report.rows}, подтверждено {len(payments)}")
+    
+    await state.clear()
+    await message.answer(
+        texts.reconcile_report(report, len(payments)),
+        reply_markup=admin_menu_keyboard(),
+        parse_mode="HTML"
+    )
+
+# ========== ПРОМОКОДЫ ==========
 
 class PromoStates(StatesGroup):
     waiting_promo = State()
 
-@router.callback_query(F.data == "use_promo")
+@callbacks(cb.USE_PROMO)
 async def callback_use_promo(callback: CallbackQuery, state: FSMContext):
     """Использование промокода"""
     
-    await callback.message.edit_text(
-        "🎁 <b>Промокод</b>\n\n"
-        "Введите промокод для получения скидки или бонуса:",
+    await edit_text(
+        callback.message,
+        texts.PROMO_ENTER,
         reply_markup=back_to_menu_keyboard(),
         parse_mode="HTML"
     )
@@ -275,70 +380,67 @@ async def callback_use_promo(callback: CallbackQuery, state: FSMContext):
 async def process_promo(message: Message, state: FSMContext):
     """Обработка промокода"""
     
-    promo = message.text.strip().upper()
-    
-    # Здесь можно добавить логику проверки промокодов
-    # Пока заглушка
+    code = normalize_code(message.text or "")
+    if code is None:
+        status, promo = 'not_found', None
+    else:
+        status, promo = promos.redeem(code, message.from_user.id)
     
     await state.clear()
     await message.answer(
-        "❌ Промокод не найден или уже использован.",
+        texts.promo_result(status, promo),
         reply_markup=back_to_menu_keyboard(),
         parse_mode="HTML"
     )
 
-# ========== ИСТОРИЯ ПЛАТЕЖЕЙ ПОЛЬЗОВАТЕЛЯ ==========
-
-@router.callback_query(F.data == "my_payments")
-async def callback_my_payments(callback: CallbackQuery):
-    """История платежей пользователя"""
+@router.message(Command("newpromo"))
+async def cmd_new_promo(message: Message):
+    """Админ создаёт промокод: /newpromo КОД скидка% бонус_дней [активаций] [на_пользователя] [дней_действия]"""
     
-    user_id = callback.from_user.id
-    
-    # Получаем платежи пользователя из базы
-    from database import db
-    
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM payments 
-        WHERE user_id = ? 
-        ORDER BY created_at DESC 
-        LIMIT 10
-    ''', (user_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    
-    if not rows:
-        await callback.message.edit_text(
-            "💳 <b>История платежей</b>\n\n"
-            "У вас пока нет платежей.",
-            reply_markup=back_to_menu_keyboard(),
-            parse_mode="HTML"
-        )
+    if message.from_user.id not in ADMIN_IDS:
         return
     
-    columns = ['id', 'user_id', 'amount', 'subscription_type', 'status', 
-               'created_at', 'confirmed_at', 'confirmed_by']
-    payments = [dict(zip(columns, row)) for row in rows]
-    
-    text = "💳 <b>История платежей</b>\n\n"
-    
-    status_emoji = {
-        'pending': '⏳',
-        'confirmed': '✅',
-        'rejected': '❌'
-    }
+    args = (message.text or "").split()[1:]
+    try:
+        code = normalize_code(args[0])
+        discount, bonus_days = int(args[1].rstrip("%")), int(args[2])
+        optional = [int(value) for value in args[3:6]]
+        max_uses, per_user, valid_days = optional + [0, 1, 0][len(optional):]
+    except (IndexError, ValueError):
+        code = None
+    if code is None or not 0 <= discount <= 100 or bonus_days < 0 or not (discount or bonus_days) \
+            or max_uses < 0 or per_user < 1 or valid_days < 0:
+        await message.answer(texts.PROMO_USAGE, parse_mode="HTML")
+        return
     
-    for p in payments:
-        emoji = status_emoji.get(p['status'], '❓')
-        date = datetime.fromisoformat(p['created_at']).strftime("%d.%m.%Y")
-        name = SUBSCRIPTION_NAMES.get(p['subscription_type'], p['subscription_type'])
-        
-        text += f"{emoji} #{p['id']} | {name} | {p['amount']}₽ | {date}\n"
+    expires_at = datetime.now() + timedelta(days=valid_days) if valid_days else None
+    if not promos.create(code, discount, bonus_days, max_uses or None, per_user, expires_at, message.from_user.id):
+        await message.answer(f"❌ Промокод <code>{code}</code> уже существует.", parse_mode="HTML")
+        return
     
-    await callback.message.edit_text(
-        text,
-        reply_markup=back_to_menu_keyboard(),
+    db.log_action(message.from_user.id, "PROMO_CREATE", f"Промокод {code}: {discount}%, +{bonus_days} дн.")
+    await message.answer(texts.promo_created(promos.get(code)), parse_mode="HTML")
+
+# ========== ИСТОРИЯ ПЛАТЕЖЕЙ ПОЛЬЗОВАТЕЛЯ ==========
+
+async def show_user_payments(callback: CallbackQuery, before_id: int = 0):
+    rows = db.get_user_payments(callback.from_user.id, before_id or None, USER_PAYMENTS_PAGE_SIZE + 1)
+    page = rows[:USER_PAYMENTS_PAGE_SIZE]
+    next_before = page[-1]['id'] if len(rows) > USER_PAYMENTS_PAGE_SIZE else None
+    
+    await edit_text(
+        callback.message,
+        texts.user_payments(page, first_page=not before_id),
+        reply_markup=user_payments_keyboard(before_id, next_before),
         parse_mode="HTML"
-    )
\ No newline at end of file
+    )
+
+@callbacks(cb.MY_PAYMENTS)
+async def callback_my_payments(callback: CallbackQuery):
+    """История платежей пользователя"""
+    await show_user_payments(callback)
+
+@callbacks(cb.MY_PAYMENTS_PAGE)
+async def callback_my_payments_page(callback: CallbackQuery, before_id: int):
+    """Более ранние платежи"""
+    await show_user_payments(callback, before_id)
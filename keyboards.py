@@ -1,131 +1,224 @@
+from functools import lru_cache
+from typing import Collection, Dict, List, Optional, Tuple
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
-from config import PRICES, SUBSCRIPTION_NAMES
+from pydantic import ConfigDict
+
+from config import PRICES, SUBSCRIPTION_NAMES, ANALYTICS_PERIODS
+import callbacks as cb
+
+# Статичные клавиатуры собираются один раз при импорте, клавиатуры с параметрами
+# кэшируются по набору аргументов. Объекты общие для всех апдейтов, поэтому
+# они неизменяемые (FrozenKeyboard): поменять кнопки можно только новой клавиатурой.
+
+class FrozenButton(InlineKeyboardButton):
+    """InlineKeyboardButton без присваивания полей (у aiogram кнопка изменяемая)"""
+    model_config = ConfigDict(frozen=True)
+
+class FrozenKeyboard(InlineKeyboardMarkup):
+    """InlineKeyboardMarkup, который нельзя изменить после создания.
+
+    frozen запрещает только присваивание полей, поэтому ряды хранятся
+    кортежами, а кнопки копируются в FrozenButton.
+    """
+    model_config = ConfigDict(frozen=True)
+    
+    inline_keyboard: Tuple[Tuple[FrozenButton, ...], ...]
+
+def _keyboard(*rows) -> FrozenKeyboard:
+    return FrozenKeyboard(inline_keyboard=tuple(
+        tuple(FrozenButton(**button.model_dump(exclude_none=True)) for button in row) for row in rows
+    ))
+
+MAIN_MENU = _keyboard(
+    [InlineKeyboardButton(text="👤 Профиль", callback_data=cb.PROFILE.pack())],
+    [InlineKeyboardButton(text="🔑 Активировать ключ", callback_data=cb.ACTIVATE_KEY.pack())],
+    [InlineKeyboardButton(text="💳 Купить подписку", callback_data=cb.BUY_MENU.pack())],
+    [InlineKeyboardButton(text="🎁 Промокод", callback_data=cb.USE_PROMO.pack())],
+    [InlineKeyboardButton(text="📥 Скачать клиент", callback_data=cb.DOWNLOAD.pack())],
+    [InlineKeyboardButton(text="💳 Мои платежи", callback_data=cb.MY_PAYMENTS.pack())],
+    [InlineKeyboardButton(text="❓ Помощь", callback_data=cb.HELP.pack()),
+     InlineKeyboardButton(text="📢 Новости", url="https://t.me/your_channel")]
+)
+
+BACK_TO_MENU = _keyboard(
+    [InlineKeyboardButton(text="◀️ Назад в меню", callback_data=cb.MAIN_MENU.pack())]
+)
+
+SUBSCRIPTION = _keyboard(
+    [InlineKeyboardButton(text=f"⏱ 1 день — {PRICES['1_day']}₽", callback_data=cb.BUY.pack("1_day"))],
+    [InlineKeyboardButton(text=f"📅 14 дней — {PRICES['14_days']}₽", callback_data=cb.BUY.pack("14_days"))],
+    [InlineKeyboardButton(text=f"📆 30 дней — {PRICES['30_days']}₽", callback_data=cb.BUY.pack("30_days"))],
+    [InlineKeyboardButton(text=f"♾ Навсегда — {PRICES['forever']}₽", callback_data=cb.BUY.pack("forever"))],
+    [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.MAIN_MENU.pack())]
+)
+
+CANCEL = _keyboard(
+    [InlineKeyboardButton(text="❌ Отмена", callback_data=cb.MAIN_MENU.pack())]
+)
 
 def main_menu_keyboard() -> InlineKeyboardMarkup:
     """Главное меню"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="👤 Профиль", callback_data="profile")],
-        [InlineKeyboardButton(text="🔑 Активировать ключ", callback_data="activate_key")],
-        [InlineKeyboardButton(text="💳 Купить подписку", callback_data="buy_subscription")],
-        [InlineKeyboardButton(text="🎁 Промокод", callback_data="use_promo")],  # Новое
-        [InlineKeyboardButton(text="📥 Скачать клиент", callback_data="download_client")],
-        [InlineKeyboardButton(text="💳 Мои платежи", callback_data="my_payments")],  # Новое
-        [InlineKeyboardButton(text="❓ Помощь", callback_data="help"),
-         InlineKeyboardButton(text="📢 Новости", url="https://t.me/your_channel")]
-    ])
-    return keyboard
+    return MAIN_MENU
 
 def back_to_menu_keyboard() -> InlineKeyboardMarkup:
     """Кнопка назад в меню"""
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="◀️ Назад в меню", callback_data="main_menu")]
-    ])
+    return BACK_TO_MENU
 
 def subscription_keyboard() -> InlineKeyboardMarkup:
     """Меню покупки подписки"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=f"⏱ 1 день — {PRICES['1_day']}₽", callback_data="buy_1_day")],
-        [InlineKeyboardButton(text=f"📅 14 дней — {PRICES['14_days']}₽", callback_data="buy_14_days")],
-        [InlineKeyboardButton(text=f"📆 30 дней — {PRICES['30_days']}₽", callback_data="buy_30_days")],
-        [InlineKeyboardButton(text=f"♾ Навсегда — {PRICES['forever']}₽", callback_data="buy_forever")],
-        [InlineKeyboardButton(text="◀️ Назад", callback_data="main_menu")]
-    ])
-    return keyboard
+    return SUBSCRIPTION
 
+@lru_cache(maxsize=None)
 def payment_keyboard(sub_type: str) -> InlineKeyboardMarkup:
     """Меню оплаты"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="💳 Оплатил(а)", callback_data=f"paid_{sub_type}")],
-        [InlineKeyboardButton(text="◀️ Отмена", callback_data="buy_subscription")]
-    ])
-    return keyboard
+    return _keyboard(
+        [InlineKeyboardButton(text="💳 Оплатил(а)", callback_data=cb.PAID.pack(sub_type))],
+        [InlineKeyboardButton(text="◀️ Отмена", callback_data=cb.BUY_MENU.pack())]
+    )
 
 def cancel_keyboard() -> InlineKeyboardMarkup:
     """Кнопка отмены"""
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="❌ Отмена", callback_data="main_menu")]
-    ])
+    return CANCEL
 
 # ========== АДМИН КЛАВИАТУРЫ ==========
 
+ADMIN_MENU = _keyboard(
+    [InlineKeyboardButton(text="📊 Статистика", callback_data=cb.ADMIN_STATS.pack()),
+     InlineKeyboardButton(text="📈 Аналитика", callback_data=cb.ADMIN_ANALYTICS.pack(ANALYTICS_PERIODS[0]))],
+    [InlineKeyboardButton(text="👥 Пользователи", callback_data=cb.ADMIN_USERS.pack())],
+    [InlineKeyboardButton(text="🔑 Ключи", callback_data=cb.ADMIN_KEYS.pack())],
+    [InlineKeyboardButton(text="💰 Платежи", callback_data=cb.ADMIN_PAYMENTS.pack())],
+    [InlineKeyboardButton(text="📨 Рассылка", callback_data=cb.ADMIN_BROADCAST.pack())],
+    [InlineKeyboardButton(text="◀️ В меню пользователя", callback_data=cb.MAIN_MENU.pack())]
+)
+
+ADMIN_USERS = _keyboard(
+    [InlineKeyboardButton(text="🔍 Найти пользователя", callback_data=cb.ADMIN_FIND_USER.pack())],
+    [InlineKeyboardButton(text="📋 Список с подпиской", callback_data=cb.ADMIN_USERS_SUB.pack())],
+    [InlineKeyboardButton(text="🚫 Забаненные", callback_data=cb.ADMIN_USERS_BANNED.pack())],
+    [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.ADMIN_MENU.pack())]
+)
+
+ADMIN_KEYS = _keyboard(
+    [InlineKeyboardButton(text="➕ Создать ключ", callback_data=cb.ADMIN_CREATE_KEY.pack())],
+    [InlineKeyboardButton(text="📋 Все ключи", callback_data=cb.ADMIN_ALL_KEYS.pack())],
+    [InlineKeyboardButton(text="✅ Неиспользованные", callback_data=cb.ADMIN_UNUSED_KEYS.pack())],
+    [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.ADMIN_MENU.pack())]
+)
+
+KEY_TYPE = _keyboard(
+    [InlineKeyboardButton(text="1 день", callback_data=cb.GEN_KEY.pack("1_day"))],
+    [InlineKeyboardButton(text="14 дней", callback_data=cb.GEN_KEY.pack("14_days"))],
+    [InlineKeyboardButton(text="30 дней", callback_data=cb.GEN_KEY.pack("30_days"))],
+    [InlineKeyboardButton(text="Навсегда", callback_data=cb.GEN_KEY.pack("forever"))],
+    [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.ADMIN_KEYS.pack())]
+)
+
 def admin_menu_keyboard() -> InlineKeyboardMarkup:
     """Админ меню"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
-        [InlineKeyboardButton(text="👥 Пользователи", callback_data="admin_users")],
-        [InlineKeyboardButton(text="🔑 Ключи", callback_data="admin_keys")],
-        [InlineKeyboardButton(text="💰 Платежи", callback_data="admin_payments")],
-        [InlineKeyboardButton(text="📨 Рассылка", callback_data="admin_broadcast")],
-        [InlineKeyboardButton(text="◀️ В меню пользователя", callback_data="main_menu")]
-    ])
-    return keyboard
+    return ADMIN_MENU
 
 def admin_users_keyboard() -> InlineKeyboardMarkup:
     """Меню управления пользователями"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔍 Найти пользователя", callback_data="admin_find_user")],
-        [InlineKeyboardButton(text="📋 Список с подпиской", callback_data="admin_users_sub")],
-        [InlineKeyboardButton(text="🚫 Забаненные", callback_data="admin_users_banned")],
-        [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_menu")]
-    ])
-    return keyboard
+    return ADMIN_USERS
 
 def admin_keys_keyboard() -> InlineKeyboardMarkup:
     """Меню управления ключами"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="➕ Создать ключ", callback_data="admin_create_key")],
-        [InlineKeyboardButton(text="📋 Все ключи", callback_data="admin_all_keys")],
-        [InlineKeyboardButton(text="✅ Неиспользованные", callback_data="admin_unused_keys")],
-        [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_menu")]
-    ])
-    return keyboard
+    return ADMIN_KEYS
 
 def key_type_keyboard() -> InlineKeyboardMarkup:
     """Выбор типа ключа"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="1 день", callback_data="gen_key_1_day")],
-        [InlineKeyboardButton(text="14 дней", callback_data="gen_key_14_days")],
-        [InlineKeyboardButton(text="30 дней", callback_data="gen_key_30_days")],
-        [InlineKeyboardButton(text="Навсегда", callback_data="gen_key_forever")],
-        [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_keys")]
-    ])
-    return keyboard
+    return KEY_TYPE
 
+@lru_cache(maxsize=1024)
+def user_payments_keyboard(before_id: int, next_before: Optional[int]) -> InlineKeyboardMarkup:
+    """Листание истории платежей пользователя"""
+    nav = []
+    if before_id:
+        nav.append(InlineKeyboardButton(text="⏮ Последние", callback_data=cb.MY_PAYMENTS.pack()))
+    if next_before:
+        nav.append(InlineKeyboardButton(text="⏪ Раньше", callback_data=cb.MY_PAYMENTS_PAGE.pack(next_before)))
+    return _keyboard(
+        *([nav] if nav else []),
+        [InlineKeyboardButton(text="◀️ Назад в меню", callback_data=cb.MAIN_MENU.pack())]
+    )
+
+@lru_cache(maxsize=None)
+def analytics_keyboard(days: int) -> InlineKeyboardMarkup:
+    """Выбор периода аналитики (текущий отмечен)"""
+    return _keyboard(
+        [InlineKeyboardButton(text=f"• {period} дн. •" if period == days else f"{period} дн.",
+                              callback_data=cb.ADMIN_ANALYTICS.pack(period))
+         for period in ANALYTICS_PERIODS],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.ADMIN_MENU.pack())]
+    )
+
+@lru_cache(maxsize=1024)
 def user_manage_keyboard(user_id: int, is_banned: bool, has_sub: bool) -> InlineKeyboardMarkup:
     """Управление пользователем"""
     buttons = []
     
     if is_banned:
-        buttons.append([InlineKeyboardButton(text="✅ Разбанить", callback_data=f"unban_{user_id}")])
+        buttons.append([InlineKeyboardButton(text="✅ Разбанить", callback_data=cb.UNBAN_USER.pack(user_id))])
     else:
-        buttons.append([InlineKeyboardButton(text="🚫 Забанить", callback_data=f"ban_{user_id}")])
+        buttons.append([InlineKeyboardButton(text="🚫 Забанить", callback_data=cb.BAN_USER.pack(user_id))])
     
     if has_sub:
-        buttons.append([InlineKeyboardButton(text="❌ Забрать подписку", callback_data=f"remove_sub_{user_id}")])
+        buttons.append([InlineKeyboardButton(text="❌ Забрать подписку", callback_data=cb.REMOVE_SUB.pack(user_id))])
     else:
-        buttons.append([InlineKeyboardButton(text="➕ Выдать подписку", callback_data=f"give_sub_{user_id}")])
+        buttons.append([InlineKeyboardButton(text="➕ Выдать подписку", callback_data=cb.GIVE_SUB.pack(user_id))])
     
-    buttons.append([InlineKeyboardButton(text="📜 История действий", callback_data=f"user_logs_{user_id}")])
-    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_users")])
+    buttons.append([InlineKeyboardButton(text="📜 История действий", callback_data=cb.USER_LOGS.pack(user_id))])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=cb.ADMIN_USERS.pack())])
     
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+    return _keyboard(*buttons)
 
+@lru_cache(maxsize=1024)
 def give_sub_keyboard(user_id: int) -> InlineKeyboardMarkup:
     """Выбор подписки для выдачи"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="1 день", callback_data=f"give_1_day_{user_id}")],
-        [InlineKeyboardButton(text="14 дней", callback_data=f"give_14_days_{user_id}")],
-        [InlineKeyboardButton(text="30 дней", callback_data=f"give_30_days_{user_id}")],
-        [InlineKeyboardButton(text="Навсегда", callback_data=f"give_forever_{user_id}")],
-        [InlineKeyboardButton(text="◀️ Назад", callback_data=f"manage_user_{user_id}")]
-    ])
-    return keyboard
+    return _keyboard(
+        [InlineKeyboardButton(text="1 день", callback_data=cb.GIVE_SUB_TYPE.pack("1_day", user_id))],
+        [InlineKeyboardButton(text="14 дней", callback_data=cb.GIVE_SUB_TYPE.pack("14_days", user_id))],
+        [InlineKeyboardButton(text="30 дней", callback_data=cb.GIVE_SUB_TYPE.pack("30_days", user_id))],
+        [InlineKeyboardButton(text="Навсегда", callback_data=cb.GIVE_SUB_TYPE.pack("forever", user_id))],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data=cb.MANAGE_USER.pack(user_id))]
+    )
 
+@lru_cache(maxsize=1024)
 def payment_confirm_keyboard(payment_id: int, user_id: int) -> InlineKeyboardMarkup:
     """Подтверждение платежа"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"confirm_pay_{payment_id}")],
-        [InlineKeyboardButton(text="❌ Отклонить", callback_data=f"reject_pay_{payment_id}")],
-        [InlineKeyboardButton(text="👤 Профиль", callback_data=f"manage_user_{user_id}")]
-    ])
-    return keyboard
\ No newline at end of file
+    return _keyboard(
+        [InlineKeyboardButton(text="✅ Подтвердить", callback_data=cb.CONFIRM_PAYMENT.pack(payment_id))],
+        [InlineKeyboardButton(text="❌ Отклонить", callback_data=cb.REJECT_PAYMENT.pack(payment_id))],
+        [InlineKeyboardButton(text="👤 Профиль", callback_data=cb.MANAGE_USER.pack(user_id))]
+    )
+
+def payments_review_keyboard(page: List[Dict], selected: Collection[int], before_id: int,
+                             next_before: Optional[int]) -> InlineKeyboardMarkup:
+    """Очередь платежей: отметка, массовые действия, листание"""
+    buttons = []
+    for p in page:
+        mark = "☑️" if p['id'] in selected else "⬜"
+        buttons.append([InlineKeyboardButton(
+            text=f"{mark} #{p['id']} — {p['amount']}₽",
+            callback_data=cb.TOGGLE_PAYMENT.pack(p['id'], before_id)
+        )])
+    
+    if selected:
+        buttons.append([
+            InlineKeyboardButton(text=f"✅ Подтвердить ({len(selected)})", callback_data=cb.CONFIRM_SELECTED.pack()),
+            InlineKeyboardButton(text=f"❌ Отклонить ({len(selected)})", callback_data=cb.REJECT_SELECTED.pack())
+        ])
+    
+    nav = []
+    if before_id:
+        nav.append(InlineKeyboardButton(text="⏮ В начало", callback_data=cb.ADMIN_PAYMENTS.pack()))
+    if next_before:
+        nav.append(InlineKeyboardButton(text="Дальше ▶️", callback_data=cb.PAYMENTS_PAGE.pack(next_before)))
+    if nav:
+        buttons.append(nav)
+    
+    buttons.append([InlineKeyboardButton(text="📥 Сверить с выпиской банка", callback_data=cb.RECONCILE.pack())])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=cb.ADMIN_MENU.pack())])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -0,0 +1,104 @@
+# keycodes.py - формат ключей активации и фильтр Блума неиспользованных ключей
+#
+# Новый формат: RAVEN-XXXX-XXXX-XXXX-XXXX-CC
+#   16 случайных символов в алфавите Crockford base32 (80 бит, без I, L, O, U —
+#   их легко перепутать) и 2 символа проверки (10 бит blake2b от тела). Опечатка
+#   или выдуманный ключ отсекаются без обращения к БД с вероятностью 1023/1024.
+#   При вводе регистр, пробелы и дефисы не важны, O читается как 0, I и L — как 1.
+# Старый формат RAVEN-XXXXXXXXXXXXXXXX (16 символов A-Z0-9 без проверки)
+# по-прежнему принимается как есть.
+#
+# Неиспользованные ключи лежат в счётном фильтре Блума (Database.key_filter):
+# ключ, которого нет в фильтре, точно не существует или уже использован, и
+# БД не трогается. Счётчики вместо битов позволяют удалять ключ при активации.
+import hashlib
+import math
+import re
+import secrets
+from typing import Iterable, Optional
+
+from metrics import Counter
+
+PREFIX = "RAVEN"
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+BODY_LENGTH = 16
+CHECK_LENGTH = 2
+GROUP = 4
+
+LEGACY_RE = re.compile(r"^RAVEN-[A-Z0-9]{16}$")
+_CROCKFORD = str.maketrans("OIL", "011")
+
+KEY_CHECKS = Counter("raven_bot_key_checks_total", "Проверки введённых ключей по итогу", ("result",))
+
+
+def _check(body: str) -> str:
+    value = int.from_bytes(hashlib.blake2b(body.encode(), digest_size=2, person=b"raven-key").digest(), "big")
+    return "".join(ALPHABET[(value >> (5 * i)) & 31] for i in reversed(range(CHECK_LENGTH)))
+
+
+def _format(body: str) -> str:
+    groups = [body[i:i + GROUP] for i in range(0, BODY_LENGTH, GROUP)]
+    return "-".join([PREFIX, *groups, _check(body)])
+
+
+def generate_key() -> str:
+    value = secrets.randbits(5 * BODY_LENGTH)
+    return _format("".join(ALPHABET[(value >> (5 * i)) & 31] for i in range(BODY_LENGTH)))
+
+
+def parse_key(text: str) -> Optional[str]:
+    """Ключ в каноническом виде или None, если это точно не ключ (без I/O)"""
+    raw = re.sub(r"\s+", "", text or "").upper()
+    if LEGACY_RE.match(raw):
+        return raw
+
+    compact = raw.replace("-", "")
+    if not compact.startswith(PREFIX) or len(compact) != len(PREFIX) + BODY_LENGTH + CHECK_LENGTH:
+        return None
+    compact = compact[len(PREFIX):].translate(_CROCKFORD)
+    if any(char not in ALPHABET for char in compact):
+        return None
+    body, check = compact[:BODY_LENGTH], compact[BODY_LENGTH:]
+    if _check(body) != check:
+        return None
+    return _format(body)
+
+
+class CountingBloomFilter:
+    """Фильтр Блума со счётчиками (байт на ячейку): поддерживает удаление.
+
+    Удалять можно только то, что было добавлено, — иначе появятся ложные
+    отрицания. Счётчик, дошедший до 255, больше не меняется.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.counters = bytearray(self.size)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Двойное хэширование: k позиций из двух 64-битных половин одного дайджеста
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            if self.counters[position] < 255:
+                self.counters[position] += 1
+        self.count += 1
+
+    def remove(self, item: str):
+        for position in self._positions(item):
+            if 0 < self.counters[position] < 255:
+                self.counters[position] -= 1
+        self.count = max(0, self.count - 1)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.counters[position] for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
@@ -0,0 +1,275 @@
+# load_test.py - нагрузочный тест API сервера лаунчера
+#
+# Создаёт временную БД с N синтетическими пользователями, поднимает api_server
+# локально и гоняет смесь запросов login / verify_session / logout / online
+# с заданной частотой. Результат (RPS и p50/p95/p99 по эндпоинтам) выводится
+# в JSON, чтобы сравнивать прогоны между коммитами.
+#
+# Задержка считается от запланированного момента отправки, а не от фактического
+# старта запроса: если сервер (или пул клиентов) не успевает и запросы копятся
+# в очереди, время ожидания попадает в перцентили. Время самого запроса
+# выводится отдельно (service_*), запросы, стартовавшие позже плана больше чем
+# на LATE_THRESHOLD, считаются в late_starts.
+#
+# Пример:
+#   python load_test.py --users 1000 --rate 300 --duration 30 \
+#       --mix login=30,verify_session=50,logout=10,online=10 --output run.json
+import argparse
+import hashlib
+import http.client
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ENDPOINTS = {
+    "login": ("POST", "/api/auth/login"),
+    "verify_session": ("POST", "/api/auth/verify_session"),
+    "logout": ("POST", "/api/auth/logout"),
+    "online": ("GET", "/api/stats/online"),
+}
+
+# Отставание старта от плана, после которого запрос считается опоздавшим
+LATE_THRESHOLD = 0.01
+
+
+def parse_mix(value: str) -> dict:
+    """'login=30,online=70' -> {'login': 30.0, 'online': 70.0}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Неизвестный эндпоинт: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def seed_users(db_path: str, count: int, hashed: bool = True) -> list:
+    """Создание схемы и синтетических пользователей с вечной подпиской.
+
+    Хэш общего пароля считается один раз, иначе посев занял бы минуты;
+    hashed=False создаёт строки старого формата (пароль открытым текстом).
+    """
+    from database import Database
+    from passwords import hash_password
+    Database(db_path)
+
+    password = "load_password"
+    stored = hash_password(password) if hashed else password
+    now = datetime.now().isoformat()
+    users = [
+        (1_000_000 + i, f"load_{i}", f"loadtest_{i}", stored, now, "forever", "forever")
+        for i in range(count)
+    ]
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT INTO users (user_id, username, nickname, password, registered_at,
+                           subscription_end, subscription_type)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', users)
+    conn.commit()
+    conn.close()
+    return [{"nickname": u[2], "password": password, "hwid": f"HWID-{u[0]}"} for u in users]
+
+
+def start_server(db_path: str, ip_limit: bool = False):
+    """Запуск api_server в фоновом потоке на свободном порту"""
+    from werkzeug.serving import make_server
+    import api_server
+    from ratelimit import RateLimiter
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    api_server.DB_PATH = db_path
+    if not ip_limit:
+        # Вся синтетическая нагрузка идёт с одного IP
+        api_server.login_ip_limiter = RateLimiter(rate=1e9, capacity=1e9)
+    api_server.start_background_workers()
+
+    server = make_server("127.0.0.1", 0, api_server.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_key = hashlib.sha256(api_server.API_SECRET.encode()).hexdigest()[:32]
+    return server, api_key
+
+
+class LoadRunner:
+    def __init__(self, port: int, api_key: str, users: list, mix: dict):
+        self.port = port
+        self.api_key = api_key
+        self.users = users
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.sessions = []  # (token, hwid)
+        self.lock = threading.Lock()
+        self.latencies = {name: [] for name in ENDPOINTS}  # от запланированной отправки
+        self.service_times = {name: [] for name in ENDPOINTS}  # от фактического старта
+        self.late_starts = {name: 0 for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.throttled = {name: 0 for name in ENDPOINTS}
+
+    def request(self, name: str, scheduled: float, body: dict = None):
+        method, path = ENDPOINTS[name]
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"X-API-Key": self.api_key, "Content-Type": "application/json"}
+
+        start = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = json.loads(response.read() or b"{}")
+            conn.close()
+            ok = response.status == 200 and data.get("success", False)
+            data["_status"] = response.status
+        except (OSError, ValueError, http.client.HTTPException):
+            data, ok = {}, False
+        finished = time.perf_counter()
+
+        with self.lock:
+            self.latencies[name].append(finished - scheduled)
+            self.service_times[name].append(finished - start)
+            if start - scheduled > LATE_THRESHOLD:
+                self.late_starts[name] += 1
+            if data.get("_status") == 429:
+                self.throttled[name] += 1
+            elif not ok:
+                self.errors[name] += 1
+        return data if ok else None
+
+    def take_session(self, remove: bool = False):
+        with self.lock:
+            if not self.sessions:
+                return None
+            index = random.randrange(len(self.sessions))
+            if remove:
+                self.sessions[index], self.sessions[-1] = self.sessions[-1], self.sessions[index]
+                return self.sessions.pop()
+            return self.sessions[index]
+
+    def run_one(self, name: str, scheduled: float):
+        if name in ("verify_session", "logout"):
+            session = self.take_session(remove=name == "logout")
+            if session is None:
+                name = "login"
+            else:
+                token, hwid = session
+                self.request(name, scheduled, {"session_token": token, "hwid": hwid})
+                return
+
+        if name == "login":
+            user = random.choice(self.users)
+            data = self.request("login", scheduled, user)
+            if data:
+                with self.lock:
+                    self.sessions.append((data["session_token"], user["hwid"]))
+        else:
+            self.request(name, scheduled)
+
+    def run(self, rate: float, duration: float, workers: int) -> float:
+        interval = 1.0 / rate
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            next_at = started
+            while next_at - started < duration:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                name = random.choices(self.names, self.weights)[0]
+                pool.submit(self.run_one, name, next_at)
+                next_at += interval
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        total = 0
+        for name, values in self.latencies.items():
+            if not values:
+                continue
+            values = sorted(values)
+            service = sorted(self.service_times[name])
+            total += len(values)
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "throttled": self.throttled[name],
+                "late_starts": self.late_starts[name],
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+                "service_p50_ms": round(percentile(service, 50) * 1000, 3),
+                "service_p99_ms": round(percentile(service, 99) * 1000, 3),
+            }
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "late_starts": sum(self.late_starts.values()),
+            "throughput_rps": round(total / elapsed, 2),
+            "endpoints": endpoints,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API сервера Raven Client")
+    parser.add_argument("--users", type=int, default=500, help="Количество синтетических пользователей")
+    parser.add_argument("--rate", type=float, default=200, help="Целевая частота запросов (в секунду)")
+    parser.add_argument("--duration", type=float, default=20, help="Длительность прогона (секунды)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("login=25,verify_session=55,logout=10,online=10"),
+                        help="Смесь запросов: login=25,verify_session=55,logout=10,online=10")
+    parser.add_argument("--workers", type=int, default=64, help="Потоков-клиентов")
+    parser.add_argument("--plaintext", action="store_true",
+                        help="Пароли старого формата (перехэшируются при первом входе)")
+    parser.add_argument("--ip-limit", action="store_true", help="Не отключать лимит входов по IP")
+    parser.add_argument("--seed", type=int, default=None, help="Seed генератора случайных чисел")
+    parser.add_argument("--output", help="Файл для JSON отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "load_test.db")
+        users = seed_users(db_path, args.users, hashed=not args.plaintext)
+        server, api_key = start_server(db_path, args.ip_limit)
+
+        runner = LoadRunner(server.server_port, api_key, users, args.mix)
+        elapsed = runner.run(args.rate, args.duration, args.workers)
+        server.shutdown()
+
+    report = {
+        "config": {
+            "users": args.users,
+            "target_rps": args.rate,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "workers": args.workers,
+            "ip_limit": args.ip_limit,
+            "plaintext_passwords": args.plaintext,
+        },
+        **runner.report(elapsed),
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError
+from aiogram.methods import TelegramMethod, Response
+from aiogram.types import TelegramObject
+
+from metrics import Counter, Histogram
+
+HANDLER_LATENCY = Histogram("raven_bot_handler_seconds", "Время обработки апдейта хендлером", ("handler",))
+HANDLER_CALLS = Counter("raven_bot_handler_calls_total", "Вызовы хендлеров по результату", ("handler", "result"))
+API_LATENCY = Histogram("raven_bot_api_seconds", "Время запросов к Telegram Bot API", ("method",))
+API_ERRORS = Counter("raven_bot_api_errors_total", "Ошибки запросов к Telegram Bot API", ("method", "error"))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Замер времени каждого хендлера (внутренний middleware)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        # Нажатия из CallbackTable идут через общий хендлер — берём настоящий
+        handler_object = data.get("callback_handler") or data.get("handler")
+        name = getattr(handler_object.callback, "__name__", "unknown") if handler_object else "unknown"
+
+        start = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception:
+            HANDLER_CALLS.inc(handler=name, result="error")
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, handler=name)
+
+        HANDLER_CALLS.inc(handler=name, result="ok")
+        return result
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Замер времени запросов к Telegram API (middleware сессии бота)"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ) -> Response:
+        name = getattr(method, "__api_method__", type(method).__name__)
+
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramAPIError as e:
+            API_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - start, method=name)
@@ -0,0 +1,80 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import UPDATE_CONCURRENCY
+from metrics import Gauge
+
+ORDERING_USERS = Gauge("raven_bot_ordering_users", "Пользователей с апдейтами в обработке или в очереди")
+ORDERING_WAITING = Gauge("raven_bot_ordering_waiting", "Апдейтов, ждущих своей очереди")
+
+
+class KeyedTaskQueue:
+    """Очередь задач по ключу: задачи одного ключа выполняются строго по порядку,
+    разных ключей — параллельно, но не больше concurrency одновременно.
+
+    Очередь ключа существует, пока в ней есть задачи, — пустые удаляются сразу,
+    память занимают только пользователи, чьи апдейты сейчас обрабатываются.
+    """
+
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # ключ -> фьючерсы "твоя очередь" в порядке поступления, голова выполняется
+        self._queues: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self.waiting = 0
+
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        turn = asyncio.get_running_loop().create_future()
+        queue.append(turn)
+        try:
+            if len(queue) > 1:
+                self.waiting += 1
+                try:
+                    await turn
+                finally:
+                    self.waiting -= 1
+            async with self._semaphore:
+                return await func(*args)
+        finally:
+            # Снятая с ожидания задача (отмена) просто выходит из очереди
+            is_head = queue[0] is turn
+            queue.remove(turn)
+            if not queue:
+                del self._queues[key]
+            elif is_head:
+                queue[0].set_result(None)
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+
+class OrderingMiddleware(BaseMiddleware):
+    """Апдейты одного пользователя по порядку (внешний middleware на dp.update).
+
+    aiogram обрабатывает апдейты параллельно (задача на апдейт в polling,
+    handle_in_background в вебхуке), и два быстрых нажатия одного пользователя
+    могут гоняться за FSM и БД. Здесь апдейты с одним from_user.id ставятся в
+    очередь друг за другом, разные пользователи по-прежнему идут параллельно.
+    """
+
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY):
+        self.queue = KeyedTaskQueue(concurrency)
+        ORDERING_USERS.set_function(lambda: len(self.queue))
+        ORDERING_WAITING.set_function(lambda: self.queue.waiting)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is None:
+            return await handler(event, data)
+        return await self.queue.run(from_user.id, handler, event, data)
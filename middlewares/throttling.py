@@ -0,0 +1,59 @@
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, CallbackQuery, Message
+
+from callbacks import SEP
+from config import ADMIN_IDS, THROTTLE_LIMITS, THROTTLE_GROUPS, THROTTLE_MAX_USERS
+from metrics import Counter
+from ratelimit import RateLimiter, TTLCache
+
+THROTTLED = Counter("raven_bot_throttled_total", "Апдейты, отброшенные антифлудом", ("group",))
+
+def callback_group(data: str) -> str:
+    """Группа лимитов для callback_data (по префиксу действия из callbacks.py)"""
+    return THROTTLE_GROUPS.get(data.partition(SEP)[0], "default")
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Антифлуд (внешний middleware, до загрузки пользователя): token bucket на
+    пользователя в каждой группе, лишние нажатия не доходят до БД"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = THROTTLE_LIMITS, max_users: int = THROTTLE_MAX_USERS):
+        self.limiters = {
+            group: RateLimiter(rate, capacity, max_keys=max_users)
+            for group, (rate, capacity) in limits.items()
+        }
+        # Кому уже ответили "слишком часто" на сообщение — не спамим ответами в ответ на спам
+        self.warned = TTLCache(ttl=5, max_size=max_users)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is None or from_user.id in ADMIN_IDS:
+            return await handler(event, data)
+
+        if isinstance(event, CallbackQuery):
+            group = callback_group(event.data or "")
+        else:
+            group = "messages"
+
+        limiter = self.limiters.get(group)
+        if limiter is None:
+            group, limiter = "default", self.limiters["default"]
+        retry_after = limiter.hit(from_user.id)
+        if not retry_after:
+            return await handler(event, data)
+
+        THROTTLED.inc(group=group)
+        wait = max(1, round(retry_after))
+        if isinstance(event, CallbackQuery):
+            await event.answer(f"⏳ Слишком часто! Подождите {wait} сек.")
+        elif isinstance(event, Message) and from_user.id not in self.warned:
+            self.warned.set(from_user.id)
+            await event.answer(f"⏳ Слишком много сообщений, подождите {wait} сек.")
+        return None
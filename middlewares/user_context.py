@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, CallbackQuery, Message
+
+from config import ADMIN_IDS
+from database import db, query_counter, Database
+from metrics import Histogram
+
+DB_QUERIES = Histogram(
+    "raven_bot_db_queries_per_update", "SQL запросов на один апдейт", ("event",),
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 20, 50)
+)
+
+
+@dataclass
+class UserContext:
+    """Пользователь и состояние подписки, загруженные один раз на апдейт"""
+    user_id: int
+    user: Optional[Dict]
+    subscription: Optional[Dict]
+
+    @property
+    def is_registered(self) -> bool:
+        return self.user is not None
+
+    @property
+    def is_banned(self) -> bool:
+        return bool(self.user and self.user['is_banned'])
+
+    @property
+    def has_subscription(self) -> bool:
+        return bool(self.subscription and self.subscription['active'])
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Загрузка пользователя (внешний middleware): в хендлер передаётся user_ctx,
+    забаненные отсекаются здесь же"""
+
+    def __init__(self, database: Database = db):
+        self.db = database
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        counter = [0]
+        token = query_counter.set(counter)
+        try:
+            from_user = data.get("event_from_user")
+            if from_user is None:
+                return await handler(event, data)
+
+            user = self.db.get_user(from_user.id)
+            ctx = UserContext(from_user.id, user, Database.subscription_from_user(user))
+
+            if ctx.is_banned and from_user.id not in ADMIN_IDS:
+                await self._reject(event, ctx)
+                return None
+
+            data["user_ctx"] = ctx
+            return await handler(event, data)
+        finally:
+            query_counter.reset(token)
+            DB_QUERIES.observe(counter[0], event=type(event).__name__)
+
+    @staticmethod
+    async def _reject(event: TelegramObject, ctx: UserContext):
+        if isinstance(event, CallbackQuery):
+            await event.answer("🚫 Вы заблокированы!", show_alert=True)
+        elif isinstance(event, Message):
+            await event.answer(
+                f"🚫 <b>Вы заблокированы!</b>\n\n"
+                f"📝 Причина: {ctx.user['ban_reason'] or 'Не указана'}\n\n"
+                f"Для разблокировки обратитесь к администратору.",
+                parse_mode="HTML"
+            )
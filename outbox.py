@@ -0,0 +1,133 @@
+# outbox.py - единая очередь исходящих уведомлений
+#
+# Хендлеры не ждут отправки: notifier.send() ставит сообщение в очередь и
+# сразу возвращает future с итогом ('sent' / 'blocked' / 'failed'). Пул
+# воркеров соблюдает общий лимит Telegram (telegram_bucket, его же использует
+# рассылка) и лимит на один чат, повторяет отправку при сетевых ошибках и
+# флуд-лимите, а неудачи пишет в лог и метрики — ничего не теряется молча.
+import asyncio
+import logging
+import time
+from typing import Any, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError
+)
+
+from config import ADMIN_IDS, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, NOTIFY_WORKERS, NOTIFY_MAX_ATTEMPTS
+from database import db, Database
+from metrics import Counter, Gauge, Histogram
+from ratelimit import AsyncTokenBucket, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_MESSAGES = Counter("raven_bot_notify_messages_total", "Уведомления по результату", ("kind", "result"))
+NOTIFY_LATENCY = Histogram("raven_bot_notify_seconds", "Время от постановки в очередь до доставки", ("kind",))
+NOTIFY_QUEUE = Gauge("raven_bot_notify_queue_depth", "Уведомлений в очереди")
+
+# Общий лимит бота на все исходящие сообщения
+telegram_bucket = AsyncTokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+
+
+class Notifier:
+    """Очередь уведомлений с пулом воркеров"""
+
+    def __init__(self, database: Database, workers: int = NOTIFY_WORKERS, max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+                 bucket: AsyncTokenBucket = telegram_bucket, chat_rate: float = TELEGRAM_CHAT_RATE):
+        self.db = database
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.bucket = bucket
+        self.chats = RateLimiter(chat_rate, 1, max_keys=10_000)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._bot: Optional[Bot] = None
+        NOTIFY_QUEUE.set_function(self.queue.qsize)
+
+    def start(self, bot: Bot):
+        if self._tasks:
+            return
+        self._bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self, timeout: float = 10):
+        """Дождаться отправки очереди (не дольше timeout) и остановить воркеров"""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"📭 Не отправлено уведомлений при остановке: {self.queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def send(self, chat_id: int, text: str, kind: str = "user", **kwargs: Any) -> asyncio.Future:
+        """Поставить сообщение в очередь; future завершится статусом доставки"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((chat_id, text, kwargs, kind, time.perf_counter(), future))
+        return future
+
+    def send_many(self, messages: Iterable[Tuple[int, str]], kind: str = "user", **kwargs: Any) -> List[asyncio.Future]:
+        """Поставить в очередь пачку сообщений (chat_id, text) с общими параметрами"""
+        loop = asyncio.get_running_loop()
+        enqueued = time.perf_counter()
+        futures = []
+        for chat_id, text in messages:
+            future = loop.create_future()
+            self.queue.put_nowait((chat_id, text, kwargs, kind, enqueued, future))
+            futures.append(future)
+        return futures
+
+    def notify_admins(self, text: str, **kwargs: Any) -> List[asyncio.Future]:
+        """Сообщение всем админам — уходит параллельно"""
+        return self.send_many(((admin_id, text) for admin_id in ADMIN_IDS), kind="admin", **kwargs)
+
+    async def _worker(self):
+        while True:
+            chat_id, text, kwargs, kind, enqueued, future = await self.queue.get()
+            try:
+                try:
+                    status = await self._deliver(chat_id, text, kwargs)
+                except Exception:
+                    logger.exception(f"📭 Уведомление {chat_id} не отправлено")
+                    status = 'failed'
+                NOTIFY_MESSAGES.inc(kind=kind, result=status)
+                if status == 'sent':
+                    NOTIFY_LATENCY.observe(time.perf_counter() - enqueued, kind=kind)
+                if not future.done():
+                    future.set_result(status)
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, chat_id: int, text: str, kwargs: dict) -> str:
+        for attempt in range(self.max_attempts):
+            await self.bucket.acquire()
+            # Лимит чата проверяем последним, сразу перед отправкой: иначе ожидание
+            # общего лимита (например, после RetryAfter) сбило бы интервал между сообщениями
+            while wait := self.chats.hit(chat_id):
+                await asyncio.sleep(wait)
+            try:
+                await self._bot.send_message(chat_id, text, **kwargs)
+                return 'sent'
+            except TelegramRetryAfter as e:
+                self.bucket.pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError as e:
+                logger.info(f"📭 {chat_id} заблокировал бота: {e.message}")
+                self.db.set_blocked_bot([chat_id])
+                return 'blocked'
+            except TelegramBadRequest as e:
+                if 'chat not found' in e.message.lower():
+                    self.db.set_blocked_bot([chat_id])
+                    return 'blocked'
+                logger.error(f"📭 Уведомление {chat_id} отклонено Telegram: {e.message}")
+                return 'failed'
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"📭 Ошибка отправки {chat_id} (попытка {attempt + 1}): {e}")
+                await asyncio.sleep(2 ** attempt)
+        logger.error(f"📭 Уведомление {chat_id} не отправлено за {self.max_attempts} попыток")
+        return 'failed'
+
+
+notifier = Notifier(db)
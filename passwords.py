@@ -0,0 +1,121 @@
+# passwords.py - хэширование паролей (PBKDF2 / scrypt) на ограниченном пуле потоков
+#
+# KDF намеренно медленный, поэтому вычисления идут в отдельном пуле: потоки
+# Flask и цикл asyncio бота только ждут результат, а число одновременных
+# хэширований ограничено PASSWORD_HASH_WORKERS. hashlib отпускает GIL на время
+# вычисления, так что пул действительно работает параллельно.
+import asyncio
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from config import (
+    PASSWORD_HASH_ALGORITHM, PASSWORD_HASH_COST,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+)
+
+ALGORITHMS = ("pbkdf2_sha256", "scrypt")
+SCRYPT_R, SCRYPT_P = 8, 1
+
+# Текущие настройки (можно менять в бенчмарках)
+algorithm = PASSWORD_HASH_ALGORITHM
+cost = PASSWORD_HASH_COST
+
+
+class HashPoolBusy(Exception):
+    """Очередь хэширования переполнена"""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _derive(password: str, salt: bytes, algo: str, work: int) -> bytes:
+    if algo == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, work)
+    if algo == "scrypt":
+        n = 2 ** work
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                              maxmem=256 * n * SCRYPT_R, dklen=32)
+    raise ValueError(f"Неизвестный алгоритм: {algo}")
+
+
+def hash_password(password: str, algo: Optional[str] = None, work: Optional[int] = None) -> str:
+    """Хэш пароля в формате 'алгоритм$стоимость$соль$хэш' (блокирующий вызов)"""
+    algo = algo or algorithm
+    work = work or cost
+    salt = secrets.token_bytes(16)
+    return f"{algo}${work}${_b64(salt)}${_b64(_derive(password, salt, algo, work))}"
+
+
+def is_hashed(stored: Optional[str]) -> bool:
+    return bool(stored) and stored.split("$", 1)[0] in ALGORITHMS
+
+
+def verify_password(password: str, stored: Optional[str]) -> bool:
+    """Проверка пароля; строки старого формата сравниваются как открытый текст"""
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+
+    try:
+        algo, work, salt, expected = stored.split("$")
+        derived = _derive(password, _unb64(salt), algo, int(work))
+    except ValueError:
+        return False
+    return hmac.compare_digest(derived, _unb64(expected))
+
+
+def needs_rehash(stored: Optional[str]) -> bool:
+    """Пароль хранится открытым текстом или с устаревшими параметрами"""
+    if not is_hashed(stored):
+        return True
+    algo, work = stored.split("$")[:2]
+    return algo != algorithm or work != str(cost)
+
+
+class HashPool:
+    """Пул потоков для KDF с ограничением длины очереди"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolBusy()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args, timeout: Optional[float] = None):
+        """Выполнить в пуле и дождаться результата (для потоков Flask)"""
+        return self.submit(fn, *args).result(timeout)
+
+    async def run_async(self, fn, *args):
+        """Выполнить в пуле, не блокируя цикл asyncio"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+pool = HashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+
+async def hash_password_async(password: str) -> str:
+    return await pool.run_async(hash_password, password)
+
+
+async def verify_password_async(password: str, stored: Optional[str]) -> bool:
+    return await pool.run_async(verify_password, password, stored)
@@ -0,0 +1,85 @@
+# payment_events.py - автоподтверждение оплат по уведомлениям провайдера
+#
+# api_server.py принимает подписанное уведомление и только сохраняет его в
+# payment_events (UNIQUE (provider, txn_id) — повторная доставка не создаёт
+# второе событие). Воркер в процессе бота раз в PAYMENT_EVENTS_POLL_SECONDS
+# забирает новые события пачкой: Database.process_payment_events подтверждает
+# подходящие платежи и проставляет итог событиям в одной транзакции, после
+# чего пользователи получают уведомление через общую очередь (outbox.py).
+# Запрос новых событий идёт по частичному индексу idx_payment_events_new,
+# поэтому пустой опрос почти ничего не стоит.
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+import texts
+from config import PAYMENT_EVENTS_POLL_SECONDS, PAYMENT_EVENTS_BATCH
+from database import db, Database
+from handlers.payment import notify_payers
+from metrics import Counter, Histogram
+from outbox import notifier, Notifier
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_EVENTS = Counter("raven_bot_payment_events_total", "Уведомления провайдера по итогу обработки", ("result",))
+PAYMENT_EVENT_DELAY = Histogram(
+    "raven_bot_payment_event_seconds", "Время от приёма уведомления до подтверждения платежа",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 300)
+)
+
+# Итоги, о которых стоит сказать админам
+PROBLEM_STATUSES = ("not_found", "not_pending", "amount_mismatch")
+
+
+class PaymentEventWorker:
+    """Фоновая обработка payment_events"""
+
+    def __init__(self, database: Database, notifier: Notifier,
+                 poll_interval: float = PAYMENT_EVENTS_POLL_SECONDS, batch: int = PAYMENT_EVENTS_BATCH):
+        self.db = database
+        self.notifier = notifier
+        self.poll_interval = poll_interval
+        self.batch = batch
+        self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                processed = await self.process()
+            except Exception:
+                logger.exception("💳 Ошибка обработки уведомлений провайдера")
+                processed = 0
+            # Полная пачка — за ней, скорее всего, есть ещё: берём сразу
+            if processed < self.batch:
+                await asyncio.sleep(self.poll_interval)
+
+    async def process(self) -> int:
+        """Одна пачка событий; возвращает число обработанных"""
+        confirmed, events = await asyncio.to_thread(self.db.process_payment_events, self.batch)
+        if not events:
+            return 0
+
+        now = datetime.now()
+        for event in events:
+            PAYMENT_EVENTS.inc(result=event['status'])
+            if event['status'] == 'confirmed':
+                PAYMENT_EVENT_DELAY.observe((now - datetime.fromisoformat(event['received_at'])).total_seconds())
+
+        if confirmed:
+            notify_payers(confirmed, texts.payment_confirmed)
+            logger.info(f"💳 Автоматически подтверждено платежей: {len(confirmed)}")
+        self.report(confirmed, [e for e in events if e['status'] in PROBLEM_STATUSES])
+        return len(events)
+
+    def report(self, confirmed: List[Dict], problems: List[Dict]):
+        """Админам пишем только о событиях, требующих внимания"""
+        if problems:
+            self.notifier.notify_admins(texts.payment_events_report(confirmed, problems), parse_mode="HTML")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+
+payment_events = PaymentEventWorker(db, notifier)
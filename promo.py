@@ -0,0 +1,79 @@
+# promo.py - промокоды с кэшем горячих кодов
+#
+# Популярный код вводят тысячи пользователей подряд. Строка промокода лежит
+# в TTL кэше, и всё, что можно решить без БД, решается по нему: код не
+# существует, истёк или исчерпан (счётчик использований только растёт,
+# поэтому исчерпанный код исчерпан навсегда). В БД идут только активации,
+# у которых есть шанс пройти, — и там лимиты проверяет один условный UPDATE
+# (Database.redeem_promo).
+import re
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from config import PROMO_CACHE_TTL, PROMO_CACHE_SIZE
+from database import db, Database
+from metrics import record_cache
+from ratelimit import TTLCache
+
+CODE_RE = re.compile(r"^[A-Z0-9_-]{3,32}$")
+
+# Отсутствующий код в кэше (None в TTLCache — промах)
+_MISSING = {}
+
+
+def normalize_code(text: str) -> Optional[str]:
+    """Код из сообщения пользователя или None, если это точно не промокод"""
+    code = text.strip().upper()
+    return code if CODE_RE.match(code) else None
+
+
+def discounted(price: float, discount: int) -> int:
+    """Цена со скидкой в процентах, округлённая до рубля"""
+    return max(1, round(price * (100 - discount) / 100))
+
+
+class PromoCodes:
+    """Проверка и активация промокодов"""
+
+    def __init__(self, database: Database, ttl: float = PROMO_CACHE_TTL, max_size: int = PROMO_CACHE_SIZE):
+        self.db = database
+        self.cache = TTLCache(ttl, max_size)
+
+    def get(self, code: str) -> Optional[Dict]:
+        promo = self.cache.get(code)
+        record_cache("promo", promo is not None)
+        if promo is None:
+            promo = self.db.get_promo(code) or _MISSING
+            self.cache.set(code, promo)
+        return promo or None
+
+    def _precheck(self, promo: Optional[Dict]) -> Optional[str]:
+        """Отказ, который виден без БД"""
+        if promo is None:
+            return 'not_found'
+        if promo['expires_at'] and promo['expires_at'] <= datetime.now().isoformat():
+            return 'expired'
+        if promo['max_uses'] is not None and promo['uses'] >= promo['max_uses']:
+            return 'exhausted'
+        return None
+
+    def redeem(self, code: str, user_id: int) -> Tuple[str, Optional[Dict]]:
+        """Активация: ('ok' | 'not_found' | 'expired' | 'exhausted' | 'used', промокод)"""
+        promo = self.get(code)
+        refused = self._precheck(promo)
+        if refused:
+            return refused, promo
+
+        status, promo = self.db.redeem_promo(code, user_id)
+        # Свежий счётчик из БД: как только код исчерпан, остальные получат отказ из кэша
+        self.cache.set(code, promo or _MISSING)
+        return status, promo
+
+    def create(self, code: str, discount: int, bonus_days: int, max_uses: Optional[int],
+               per_user: int, expires_at: Optional[datetime], created_by: int) -> bool:
+        created = self.db.create_promo(code, discount, bonus_days, max_uses, per_user, expires_at, created_by)
+        self.cache.discard(code)
+        return created
+
+
+promos = PromoCodes(db)
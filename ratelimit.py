@@ -0,0 +1,148 @@
+# ratelimit.py - token bucket лимитеры и TTL кэш в памяти
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не более capacity"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def consume(self, amount: float = 1.0, now: Optional[float] = None) -> float:
+        """Списать токены. Возвращает 0, если можно, иначе сколько секунд ждать"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def idle_full(self, now: float) -> bool:
+        """Ведро уже полностью восстановилось — его можно забыть без потери состояния"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """Набор token bucket по ключу (IP, ник, user_id) с ограничением размера.
+
+    Ключи хранятся в порядке последнего обращения: при переполнении вытесняются
+    самые старые, а полностью восстановившиеся вёдра удаляются с головы списка.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: Hashable, amount: float = 1.0) -> float:
+        """Попытка по ключу. 0 — разрешено, иначе Retry-After в секундах"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity, now)
+            else:
+                self._buckets.move_to_end(key)
+
+            retry_after = bucket.consume(amount, now)
+            self._evict(now)
+            return retry_after
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while len(buckets) > self.max_keys:
+            buckets.popitem(last=False)
+        # Несколько самых давних ключей за вызов — амортизированно O(1)
+        for _ in range(2):
+            if not buckets:
+                break
+            key, bucket = next(iter(buckets.items()))
+            if not bucket.idle_full(now):
+                break
+            del buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class TTLCache:
+    """Ограниченный по размеру кэш с временем жизни записей"""
+
+    def __init__(self, ttl: float, max_size: int = 100_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any = True):
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+            # Записи добавляются по порядку истечения — чистим просроченные с головы
+            while self._data:
+                oldest_key, (expires_at, _) = next(iter(self._data.items()))
+                if expires_at > now:
+                    break
+                del self._data[oldest_key]
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class AsyncTokenBucket:
+    """Token bucket для asyncio: acquire() ждёт токен, ожидающие обслуживаются по очереди"""
+
+    def __init__(self, rate: float, capacity: float):
+        self._bucket = TokenBucket(rate, capacity)
+        self._lock = asyncio.Lock()
+        self._paused_until = 0.0
+
+    async def acquire(self, amount: float = 1.0):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                wait = self._bucket.consume(amount, now)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Остановить выдачу токенов (например, после RetryAfter от Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
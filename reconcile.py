@@ -0,0 +1,247 @@
+# reconcile.py - сверка банковской выписки с ожидающими платежами
+#
+# Пользователь пишет в комментарии к переводу свой Telegram ID (см. реквизиты
+# в texts.payment_details). Выписка (CSV или OFX) читается построчно, ожидающие
+# платежи раскладываются в словарь (user_id, сумма в копейках) -> [id платежа],
+# и каждая строка выписки ищется в нём за O(1):
+#   - matched   — ровно одна заявка с этим ID и суммой: подтверждается;
+#   - ambiguous — подходит несколько заявок, на заявку пришло два перевода
+#                 или у операции нет даты;
+#   - unmatched — нет ID в комментарии, нет заявки на такую сумму или перевод
+#                 сделан раньше, чем создана заявка.
+# Расходные операции (сумма <= 0) пропускаются.
+#
+# Каждый перевод засчитывается один раз: ключ операции (txn_key — номер
+# операции банка или отпечаток даты, суммы и назначения) при подтверждении
+# записывается в payment_events (provider = 'statement', UNIQUE (provider,
+# txn_id)). Повторная или пересекающаяся выписка такие строки пропускает.
+import codecs
+import csv
+import hashlib
+import html
+import io
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Collection, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+# Ключевые слова в заголовках колонок CSV (ищутся как подстрока, без учёта регистра)
+AMOUNT_COLUMNS = ("сумма", "приход", "поступлени", "amount", "credit")
+COMMENT_COLUMNS = ("назначение", "комментари", "описание", "сообщение", "comment", "description", "memo", "purpose", "details")
+TXN_COLUMNS = ("номер", "операци", "reference", "transaction", "id")
+DATE_COLUMNS = ("дата", "date")
+DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y", "%d.%m.%y", "%Y%m%d")
+
+# payment_events.provider для переводов, подтверждённых по выписке
+PROVIDER = "statement"
+
+# Telegram ID в комментарии: отдельное число из 5-15 цифр
+USER_ID_RE = re.compile(r"(?<!\d)\d{5,15}(?!\d)")
+OFX_TAG_RE = re.compile(r"<(/?)([A-Za-z.]+)>([^<\r\n]*)")
+
+
+class StatementError(Exception):
+    """Файл не похож на выписку"""
+
+
+@dataclass
+class StatementRow:
+    line: int
+    amount: int  # копейки
+    comment: str
+    txn_id: str = ""
+    posted: Optional[date] = None
+
+    @property
+    def txn_key(self) -> str:
+        """Ключ операции: номер из выписки или отпечаток строки, если номера нет"""
+        if self.txn_id:
+            return self.txn_id
+        raw = f"{self.posted}|{self.amount}|{self.comment}"
+        return "row:" + hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+@dataclass
+class ReconcileReport:
+    rows: int = 0
+    skipped: int = 0
+    matched: List[Tuple[StatementRow, int]] = field(default_factory=list)  # (строка, id платежа)
+    ambiguous: List[Tuple[StatementRow, str]] = field(default_factory=list)  # (строка, причина)
+    unmatched: List[Tuple[StatementRow, str]] = field(default_factory=list)
+    already_used: int = 0  # переводы, уже засчитанные по прошлым выпискам
+
+
+def to_cents(value) -> Optional[int]:
+    """Сумма из выписки ("1 234,50", "-89.00") или из БД в копейках"""
+    if isinstance(value, str):
+        value = value.replace("\xa0", "").replace(" ", "").replace(",", ".").replace("−", "-")
+        if not value:
+            return None
+    try:
+        return int((Decimal(str(value)) * 100).to_integral_value())
+    except InvalidOperation:
+        return None
+
+
+def to_date(value: str) -> Optional[date]:
+    """Дата операции из выписки ("19.10.2026 14:03", "2026-10-19", OFX "20261019120000[+3:MSK]")"""
+    value = value.strip()
+    token = value[:8] if value[:8].isdigit() else re.split(r"[\sT]", value, maxsplit=1)[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(token, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+# ========== ЧТЕНИЕ ВЫПИСКИ ==========
+
+def _open_text(stream: BinaryIO) -> TextIO:
+    """Текстовый поток поверх файла: UTF-8 (с BOM или без), иначе cp1251"""
+    head = stream.read(65536)
+    stream.seek(0)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError:
+        encoding = "cp1251"
+    return io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+
+
+def _find_column(header: List[str], keywords: Tuple[str, ...], exclude: Collection[int] = ()) -> Optional[int]:
+    for keyword in keywords:
+        for index, name in enumerate(header):
+            if keyword in name and index not in exclude:
+                return index
+    return None
+
+
+def _read_csv(text: TextIO) -> Iterator[StatementRow]:
+    first_line = text.readline()
+    delimiter = max((";", ",", "\t"), key=first_line.count)
+    header = [name.strip().lower() for name in next(csv.reader([first_line], delimiter=delimiter), [])]
+
+    amount_col = _find_column(header, AMOUNT_COLUMNS)
+    comment_col = _find_column(header, COMMENT_COLUMNS)
+    if amount_col is None or comment_col is None:
+        raise StatementError("в заголовке CSV не найдены колонки суммы и назначения платежа")
+    date_col = _find_column(header, DATE_COLUMNS)
+    # "Дата операции" — не номер операции
+    txn_col = _find_column(header, TXN_COLUMNS, exclude=(amount_col, comment_col, date_col))
+
+    reader = csv.reader(text, delimiter=delimiter)
+    for values in reader:
+        line = reader.line_num + 1  # + строка заголовка
+        if len(values) <= max(amount_col, comment_col):
+            continue
+        amount = to_cents(values[amount_col])
+        if amount is None:
+            continue
+        yield StatementRow(
+            line=line,
+            amount=amount,
+            comment=values[comment_col],
+            txn_id=values[txn_col].strip() if txn_col is not None and txn_col < len(values) else "",
+            posted=to_date(values[date_col]) if date_col is not None and date_col < len(values) else None
+        )
+
+
+def _read_ofx(text: TextIO) -> Iterator[StatementRow]:
+    """Транзакции <STMTTRN> из OFX (SGML без закрывающих тегов или XML)"""
+    transaction: Optional[Dict[str, str]] = None
+    number = 0
+    for line in text:
+        for closing, tag, value in OFX_TAG_RE.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if not closing:
+                    transaction = {}
+                    continue
+                if transaction is not None:
+                    number += 1
+                    amount = to_cents(transaction.get("TRNAMT", ""))
+                    if amount is not None:
+                        yield StatementRow(
+                            line=number,
+                            amount=amount,
+                            comment=" ".join(filter(None, (transaction.get("NAME"), transaction.get("MEMO")))),
+                            txn_id=transaction.get("FITID", ""),
+                            posted=to_date(transaction.get("DTPOSTED", ""))
+                        )
+                transaction = None
+            elif transaction is not None and not closing:
+                transaction[tag] = html.unescape(value.strip())
+
+
+def read_statement(stream: BinaryIO) -> Iterator[StatementRow]:
+    """Строки выписки по одной. stream — файл с поддержкой seek (BytesIO после bot.download)"""
+    head = stream.read(4096).lstrip().upper()
+    stream.seek(0)
+    text = _open_text(stream)
+    if head.startswith(b"OFXHEADER") or b"<OFX>" in head or head.startswith(b"<?XML"):
+        return _read_ofx(text)
+    return _read_csv(text)
+
+
+# ========== СОПОСТАВЛЕНИЕ ==========
+
+def match_statement(rows: Iterable[StatementRow], pending: List[Dict],
+                    used: Collection[str] = ()) -> ReconcileReport:
+    """Сопоставление строк выписки с ожидающими платежами (ничего не меняет в БД).
+
+    used — ключи операций, уже засчитанных раньше (Database.get_used_txns).
+    """
+    # (user_id, копейки) -> [(id платежа, дата заявки)]
+    index: Dict[Tuple[int, int], List[Tuple[int, date]]] = defaultdict(list)
+    for payment in pending:
+        created = datetime.fromisoformat(payment['created_at']).date()
+        index[(payment['user_id'], to_cents(payment['amount']))].append((payment['id'], created))
+
+    report = ReconcileReport()
+    claimed: Dict[Tuple[int, int], int] = {}  # ключ -> строка выписки, уже занявшая заявку
+    seen = set(used)
+    for row in rows:
+        report.rows += 1
+        if row.amount <= 0:
+            report.skipped += 1
+            continue
+        if row.txn_key in seen:
+            report.already_used += 1
+            continue
+        seen.add(row.txn_key)
+
+        user_ids = {int(value) for value in USER_ID_RE.findall(row.comment)}
+        if not user_ids:
+            report.unmatched.append((row, "нет ID в комментарии"))
+            continue
+
+        keys = [(user_id, row.amount) for user_id in user_ids if (user_id, row.amount) in index]
+        if not keys:
+            report.unmatched.append((row, "нет заявки на эту сумму"))
+            continue
+        if row.posted is None:
+            report.ambiguous.append((row, "нет даты операции"))
+            continue
+        # Перевод, сделанный до заявки, оплачивал что-то другое
+        eligible = {key: [pid for pid, created in index[key] if created <= row.posted] for key in keys}
+        keys = [key for key in keys if eligible[key]]
+        if not keys:
+            report.unmatched.append((row, "перевод раньше заявки"))
+            continue
+        if len(keys) > 1:
+            report.ambiguous.append((row, "несколько ID с заявками: " + ", ".join(str(k[0]) for k in keys)))
+            continue
+
+        key = keys[0]
+        payment_ids = eligible[key]
+        if len(payment_ids) > 1:
+            report.ambiguous.append((row, "несколько заявок: " + ", ".join(f"#{pid}" for pid in sorted(payment_ids))))
+        elif key in claimed:
+            report.ambiguous.append((row, f"повторный перевод по заявке #{payment_ids[0]} (строка {claimed[key]})"))
+        else:
+            claimed[key] = row.line
+            report.matched.append((row, payment_ids[0]))
+    return report
@@ -0,0 +1,141 @@
+# render.py - правка сообщений бота без лишних запросов к Telegram
+#
+# Хендлеры меню перерисовывают сообщение при каждом нажатии. Если текст и
+# кнопки не изменились (повторное нажатие 📊 или 👤), Telegram отвечает
+# "message is not modified" — запрос потрачен впустую. Здесь для каждого
+# (chat_id, message_id) в LRU хранится отпечаток последнего отправленного
+# текста и клавиатуры:
+#   - ничего не изменилось — запроса нет;
+#   - изменились только кнопки — edit_reply_markup вместо edit_text;
+#   - иначе — обычный edit_text.
+# edit_date сообщения из апдейта сверяется с сохранённым: если сообщение
+# правил кто-то другой (другой хендлер, второй админ), запись считается устаревшей.
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+from config import RENDER_CACHE_SIZE
+from metrics import Counter
+
+MESSAGE_EDITS = Counter(
+    "raven_bot_message_edits_total",
+    "Перерисовки сообщений: text/markup — запрос отправлен, skipped — запрос сэкономлен",
+    ("result",)
+)
+
+# (отпечаток текста, отпечаток клавиатуры, edit_date после нашей правки)
+Entry = Tuple[Optional[bytes], bytes, Optional[int]]
+
+
+def _digest(value: str) -> bytes:
+    return hashlib.blake2b(value.encode(), digest_size=8).digest()
+
+
+def text_digest(text: str, parse_mode: Optional[str]) -> bytes:
+    return _digest(f"{parse_mode}\x00{text}")
+
+
+def markup_digest(markup: Optional[InlineKeyboardMarkup]) -> bytes:
+    return _digest(markup.model_dump_json(exclude_none=True) if markup else "")
+
+
+def _is_not_modified(error: TelegramBadRequest) -> bool:
+    return "message is not modified" in error.message.lower()
+
+
+class EditCache:
+    """LRU отпечатков последней версии сообщений бота"""
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, Entry]" = OrderedDict()
+
+    def get(self, message: Message) -> Optional[Entry]:
+        key = (message.chat.id, message.message_id)
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[2] != message.edit_date:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def set(self, message: Message, entry: Entry):
+        key = (message.chat.id, message.message_id)
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+edits = EditCache()
+
+
+def _observed(message: Message, parse_mode: Optional[str]) -> Entry:
+    """Отпечаток сообщения в том виде, в каком его прислал Telegram"""
+    text = message.html_text if parse_mode == "HTML" else message.text
+    return (
+        text_digest(text, parse_mode) if text is not None else None,
+        markup_digest(message.reply_markup),
+        message.edit_date
+    )
+
+
+def _edit_date(result, message: Message) -> Optional[int]:
+    return result.edit_date if isinstance(result, Message) else message.edit_date
+
+
+async def edit_text(message: Message, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None,
+                    cache: EditCache = edits, **kwargs) -> bool:
+    """Замена message.edit_text. False — сообщение уже такое, запрос не отправлялся"""
+    new_text = text_digest(text, kwargs.get("parse_mode"))
+    new_markup = markup_digest(reply_markup)
+    previous = cache.get(message) or _observed(message, kwargs.get("parse_mode"))
+
+    if previous[:2] == (new_text, new_markup):
+        MESSAGE_EDITS.inc(result="skipped")
+        return False
+
+    try:
+        if previous[0] == new_text:
+            result = await message.edit_reply_markup(reply_markup=reply_markup)
+            MESSAGE_EDITS.inc(result="markup")
+        else:
+            result = await message.edit_text(text, reply_markup=reply_markup, **kwargs)
+            MESSAGE_EDITS.inc(result="text")
+    except TelegramBadRequest as e:
+        if not _is_not_modified(e):
+            raise
+        result = None
+    cache.set(message, (new_text, new_markup, _edit_date(result, message)))
+    return True
+
+
+async def edit_markup(message: Message, reply_markup: Optional[InlineKeyboardMarkup] = None,
+                      cache: EditCache = edits) -> bool:
+    """Замена message.edit_reply_markup с тем же пропуском пустых правок"""
+    new_markup = markup_digest(reply_markup)
+    previous = cache.get(message)
+    known_text = previous[0] if previous else None
+    current_markup = previous[1] if previous else markup_digest(message.reply_markup)
+
+    if current_markup == new_markup:
+        MESSAGE_EDITS.inc(result="skipped")
+        return False
+
+    try:
+        result = await message.edit_reply_markup(reply_markup=reply_markup)
+        MESSAGE_EDITS.inc(result="markup")
+    except TelegramBadRequest as e:
+        if not _is_not_modified(e):
+            raise
+        result = None
+    cache.set(message, (known_text, new_markup, _edit_date(result, message)))
+    return True
@@ -0,0 +1,151 @@
+# scheduler.py - напоминания об окончании подписки
+#
+# Окончания подписок на ближайшие SCHEDULER_HORIZON_HOURS читаются из БД
+# запросом по индексу idx_users_subscription_end и лежат в min-куче событий
+# (время, user_id, уровень). Планировщик спит ровно до ближайшего события или
+# до следующего перечитывания. Уровень — сколько уведомлений по текущей
+# подписке уже отправлено (users.notice_level): 1..N — напоминания за
+# SUBSCRIPTION_REMINDER_HOURS, N+1 — подписка закончилась.
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from config import (
+    SUBSCRIPTION_REMINDER_HOURS, SCHEDULER_HORIZON_HOURS, SCHEDULER_RELOAD_MINUTES, SCHEDULER_GRACE_HOURS
+)
+from database import db, Database
+from keyboards import subscription_keyboard
+from metrics import Counter, Gauge
+from outbox import notifier, Notifier
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_NOTICES = Counter("raven_bot_subscription_notices_total", "Уведомления об окончании подписки", ("notice",))
+SCHEDULER_EVENTS = Gauge("raven_bot_scheduler_events", "Запланированных событий в куче")
+
+# (время события, user_id, уровень, subscription_end на момент загрузки)
+Event = Tuple[float, int, int, str]
+
+
+def _left_text(left: timedelta) -> str:
+    hours = max(1, round(left.total_seconds() / 3600))
+    if hours >= 24:
+        return f"{round(hours / 24)} дн."
+    return f"{hours} ч."
+
+
+class ExpiryScheduler:
+    """Min-куча предстоящих напоминаний и окончаний подписок"""
+
+    def __init__(self, database: Database, notifier: Notifier, reminder_hours=SUBSCRIPTION_REMINDER_HOURS,
+                 horizon_hours: float = SCHEDULER_HORIZON_HOURS, reload_minutes: float = SCHEDULER_RELOAD_MINUTES,
+                 grace_hours: float = SCHEDULER_GRACE_HOURS):
+        self.db = database
+        self.notifier = notifier
+        self.reminder_hours = tuple(reminder_hours)
+        self.horizon = timedelta(hours=horizon_hours)
+        self.reload_interval = reload_minutes * 60
+        self.grace = timedelta(hours=grace_hours)
+        self.heap: List[Event] = []
+        self._task = None
+        SCHEDULER_EVENTS.set_function(lambda: len(self.heap))
+
+    @property
+    def expired_level(self) -> int:
+        return len(self.reminder_hours) + 1
+
+    def _events(self, user_id: int, end: str, level: int, now: float) -> List[Event]:
+        """События, которые ещё предстоят пользователю.
+
+        Из уже наступивших берётся только самое позднее: если бот был выключен,
+        пользователь получит одно актуальное уведомление, а не все пропущенные.
+        """
+        end_ts = datetime.fromisoformat(end).timestamp()
+        offsets = [hours * 3600 for hours in self.reminder_hours] + [0]
+        events = []
+        for next_level, offset in enumerate(offsets, 1):
+            if next_level <= level:
+                continue
+            due = end_ts - offset
+            if due <= now and events and events[-1][0] <= now:
+                events.pop()
+            events.append((due, user_id, next_level, end))
+        return events
+
+    def load(self):
+        """Перечитать окончания в пределах горизонта"""
+        now_dt = datetime.now()
+        now = time.time()
+        rows = self.db.get_expiring_subscriptions(now_dt - self.grace, now_dt + self.horizon)
+        heap = []
+        for user_id, end, level in rows:
+            heap.extend(self._events(user_id, end, level, now))
+        heapq.heapify(heap)
+        self.heap = heap
+
+    async def run(self):
+        next_reload = 0.0
+        while True:
+            now = time.time()
+            if now >= next_reload:
+                self.load()
+                next_reload = now + self.reload_interval
+
+            # Спим ровно до ближайшего события (или до перечитывания)
+            wake_at = min(next_reload, self.heap[0][0]) if self.heap else next_reload
+            if wake_at > now:
+                await asyncio.sleep(wake_at - now)
+                continue
+
+            due = []
+            while self.heap and self.heap[0][0] <= now:
+                due.append(heapq.heappop(self.heap))
+            try:
+                self.fire(due)
+            except Exception:
+                logger.exception("⏰ Ошибка отправки напоминаний о подписке")
+
+    def fire(self, events: List[Event]):
+        """Отправка наступивших уведомлений и пакетная отметка в БД"""
+        # Подписку могли продлить или отозвать после загрузки — сверяемся с БД одним запросом
+        states = self.db.get_subscription_states([user_id for _, user_id, _, _ in events])
+        latest = {}
+        for _, user_id, level, end in events:
+            state = states.get(user_id)
+            if state is None or state[0] != end or state[1] >= level:
+                continue
+            if level > latest.get(user_id, (0, None))[0]:
+                latest[user_id] = (level, end)
+
+        updates = []
+        for user_id, (level, end) in latest.items():
+            self.notifier.send(user_id, self._text(level, end), reply_markup=subscription_keyboard(), parse_mode="HTML")
+            updates.append((level, user_id, end))
+            SCHEDULER_NOTICES.inc(notice="expired" if level == self.expired_level else f"{self.reminder_hours[level - 1]}h")
+        if updates:
+            self.db.set_notice_levels(updates)
+            logger.info(f"⏰ Уведомлений об окончании подписки: {len(updates)}")
+
+    def _text(self, level: int, end: str) -> str:
+        if level == self.expired_level:
+            return (
+                "⌛ <b>Ваша подписка закончилась</b>\n\n"
+                "Продлите её, чтобы продолжить пользоваться Raven Client:"
+            )
+        # Время берём фактическое: после перезапуска напоминание может уйти позже срока
+        end_date = datetime.fromisoformat(end)
+        return (
+            f"⏰ <b>Подписка заканчивается через {_left_text(end_date - datetime.now())}</b>\n\n"
+            f"📅 Окончание: {end_date.strftime('%d.%m.%Y %H:%M')}\n\n"
+            f"Продлите заранее — оставшиеся дни сохранятся:"
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+
+expiry_scheduler = ExpiryScheduler(db, notifier)
@@ -0,0 +1,491 @@
+# texts.py - шаблоны сообщений бота
+#
+# Статичные тексты собираются один раз при импорте (цены берутся из config),
+# остальные — шаблоны str.format, в которые подставляются только значения.
+# Один шаблон на экран: хендлеры, показывающие один и тот же экран разными
+# путями (команда и кнопка), используют одну функцию.
+from datetime import datetime
+from html import escape
+from typing import Dict, List, Optional
+
+from config import PRICES, PAYMENT_CARD, PAYMENT_SBP, SUBSCRIPTION_NAMES
+from passwords import is_hashed
+
+
+def _literal(value) -> str:
+    """Значение из config внутри шаблона str.format"""
+    return str(value).replace("{", "{{").replace("}", "}}")
+
+
+# ========== СТАТИЧНЫЕ ТЕКСТЫ ==========
+
+WELCOME = (
+    "🦅 <b>Добро пожаловать в Raven Client!</b>\n\n"
+    "Для начала работы необходимо зарегистрироваться.\n\n"
+    "📝 Введите ваш игровой никнейм:"
+)
+
+HELP = (
+    "❓ <b>Помощь</b>\n\n"
+    "<b>🔑 Как активировать ключ?</b>\n"
+    "Нажмите «Активировать ключ» и введите полученный ключ.\n\n"
+    "<b>💳 Как купить подписку?</b>\n"
+    "1. Нажмите «Купить подписку»\n"
+    "2. Выберите тариф\n"
+    "3. Оплатите по реквизитам\n"
+    "4. Нажмите «Оплатил(а)»\n"
+    "5. Дождитесь подтверждения\n\n"
+    "<b>📥 Как скачать клиент?</b>\n"
+    "После активации подписки нажмите «Скачать клиент».\n\n"
+    "<b>🆘 Возникли проблемы?</b>\n"
+    "Напишите администратору: @your_username"
+)
+
+BUY_MENU = (
+    "💳 <b>Покупка подписки Raven Client</b>\n\n"
+    "Выберите подходящий тариф:\n\n"
+    f"⏱ <b>1 день</b> — {PRICES['1_day']}₽\n"
+    f"   └ Идеально для теста\n\n"
+    f"📅 <b>14 дней</b> — {PRICES['14_days']}₽\n"
+    f"   └ Выгодно для начала\n\n"
+    f"📆 <b>30 дней</b> — {PRICES['30_days']}₽\n"
+    f"   └ Оптимальный выбор\n\n"
+    f"♾ <b>Навсегда</b> — {PRICES['forever']}₽\n"
+    f"   └ Максимальная выгода!"
+)
+
+ADMIN_PANEL = (
+    "🔧 <b>Админ-панель Raven Client</b>\n\n"
+    "Выберите раздел:"
+)
+
+# ========== ШАБЛОНЫ ==========
+
+_MAIN_MENU = (
+    "🦅 <b>Raven Client</b>\n\n"
+    "👤 Привет, <b>{nickname}</b>!\n"
+    "{sub_text}\n\n"
+    "Выберите действие:"
+)
+
+_PROFILE = (
+    "👤 <b>Ваш профиль</b>\n\n"
+    "🎮 Никнейм: <code>{nickname}</code>\n"
+    "🆔 ID: <code>{user_id}</code>\n"
+    "📅 Регистрация: {reg_date}\n\n"
+    "<b>📦 Подписка:</b>\n"
+    "├ Статус: {sub_status}\n"
+    "└ Окончание: {sub_end}\n\n"
+    "💰 Всего оплачено: <b>{total_paid}₽</b>\n"
+    "🔑 Ключ: <code>{key}</code>"
+)
+
+_DOWNLOAD = (
+    "📥 <b>Скачивание Raven Client</b>\n\n"
+    "🎮 Ваш никнейм: <code>{nickname}</code>\n"
+    "🔐 Пароль: указанный при регистрации\n\n"
+    "📎 Ссылка для скачивания:\n"
+    "🔗 <a href='https://your-download-link.com'>Скачать Raven Client</a>\n\n"
+    "⚠️ Используйте эти данные для авторизации в клиенте."
+)
+
+_PAYMENT_DETAILS = (
+    "💳 <b>Оформление подписки</b>\n\n"
+    "📦 Тариф: <b>{name}</b>\n"
+    "💰 Стоимость: <b>{price}₽</b>{discount_text}\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━\n"
+    "<b>💳 Реквизиты для оплаты:</b>\n\n"
+    "🏦 <b>Карта:</b>\n"
+    f"<code>{_literal(PAYMENT_CARD)}</code>\n\n"
+    "📱 <b>СБП (по номеру):</b>\n"
+    f"<code>{_literal(PAYMENT_SBP)}</code>\n"
+    "━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "⚠️ <b>ВАЖНО!</b>\n"
+    "В комментарии к переводу укажите:\n"
+    "<code>{user_id}</code>\n\n"
+    "После оплаты нажмите кнопку ниже 👇"
+)
+
+_USER_INFO = (
+    "👤 <b>Информация о пользователе</b>\n\n"
+    "🆔 ID: <code>{user_id}</code>\n"
+    "👤 Username: @{username}\n"
+    "🎮 Никнейм: {nickname}\n"
+    "🔐 Пароль: {password}\n\n"
+    "📅 Регистрация: {reg_date}\n"
+    "💰 Оплачено: {total_paid}₽\n"
+    "📦 Подписка: {sub_text}\n"
+    "🚫 Бан: {ban_text}\n"
+    "🔑 Ключ: {key}"
+)
+
+_ADMIN_STATS = (
+    "📊 <b>Статистика Raven Client</b>\n\n"
+    "<b>👥 Пользователи:</b>\n"
+    "├ Всего: {total_users}\n"
+    "├ С подпиской: {with_subscription}\n"
+    "├ Без подписки: {without_subscription}\n"
+    "├ Забанено: {banned}\n"
+    "└ Сегодня: +{registered_today}\n\n"
+    "<b>🔑 Ключи:</b>\n"
+    "├ Всего: {total_keys}\n"
+    "├ Использовано: {used_keys}\n"
+    "└ Свободно: {unused_keys}\n\n"
+    "<b>💰 Финансы:</b>\n"
+    "├ Общий доход: {total_revenue}₽\n"
+    "└ Ожидает оплат: {pending_payments}"
+)
+
+_PAYMENT_CONFIRMED = (
+    "🎉 <b>Оплата подтверждена!</b>\n\n"
+    "📦 Тариф: <b>{name}</b>\n"
+    "💰 Сумма: <b>{amount}₽</b>\n"
+    "📅 Подписка: <b>{end_text}</b>\n\n"
+    "Спасибо за покупку! Приятной игры! 🦅"
+)
+
+_PAYMENT_REJECTED = (
+    "❌ <b>Заявка на оплату отклонена</b>\n\n"
+    "📦 Тариф: {name}\n"
+    "💰 Сумма: {amount}₽\n\n"
+    "Возможные причины:\n"
+    "• Платёж не найден\n"
+    "• Неверная сумма\n"
+    "• Не указан ID в комментарии\n\n"
+    "Если вы уверены, что оплатили — обратитесь к администратору."
+)
+
+PROMO_ENTER = (
+    "🎁 <b>Промокод</b>\n\n"
+    "Введите промокод для получения скидки или бонуса:"
+)
+
+_PROMO_REFUSED = {
+    'not_found': "❌ Промокод не найден.",
+    'expired': "⌛ Срок действия промокода истёк.",
+    'exhausted': "❌ Промокод уже использован максимальное количество раз.",
+    'used': "❌ Вы уже использовали этот промокод.",
+}
+
+_REVIEW_ITEM = (
+    "#{id} | {nickname} | {amount}₽\n"
+    "   {name} | {created}\n\n"
+)
+
+
+def _is_active(sub_info: Optional[Dict]) -> bool:
+    return bool(sub_info and sub_info['active'])
+
+
+def main_menu(user: Dict, sub_info: Optional[Dict]) -> str:
+    if not _is_active(sub_info):
+        sub_text = "❌ Подписка: <b>Отсутствует</b>"
+    elif sub_info['type'] == 'forever':
+        sub_text = "✅ Подписка: <b>Навсегда</b>"
+    else:
+        sub_text = f"✅ Подписка: <b>{sub_info['days_left']} дн.</b>"
+    return _MAIN_MENU.format(nickname=user['nickname'], sub_text=sub_text)
+
+
+def profile(user: Dict, sub_info: Optional[Dict]) -> str:
+    if not _is_active(sub_info):
+        sub_status, sub_end = "❌ Отсутствует", "—"
+    elif sub_info['type'] == 'forever':
+        sub_status, sub_end = "♾ Навсегда", "—"
+    else:
+        sub_status = f"✅ Активна ({sub_info['days_left']} дн.)"
+        sub_end = sub_info['end'].strftime("%d.%m.%Y %H:%M")
+    return _PROFILE.format(
+        nickname=user['nickname'],
+        user_id=user['user_id'],
+        reg_date=datetime.fromisoformat(user['registered_at']).strftime("%d.%m.%Y"),
+        sub_status=sub_status,
+        sub_end=sub_end,
+        total_paid=user['total_paid'],
+        key=user['activated_key'] or 'Не активирован'
+    )
+
+
+def download(user: Dict) -> str:
+    return _DOWNLOAD.format(nickname=user['nickname'])
+
+
+def payment_details(name: str, price: int, user_id: int, discount: int = 0) -> str:
+    discount_text = f" (🎁 скидка {discount}% по промокоду)" if discount else ""
+    return _PAYMENT_DETAILS.format(name=name, price=price, user_id=user_id, discount_text=discount_text)
+
+
+def user_info(user: Dict, sub_info: Optional[Dict]) -> str:
+    """Карточка пользователя в админке"""
+    if not _is_active(sub_info):
+        sub_text = "❌ Нет"
+    elif sub_info['type'] == 'forever':
+        sub_text = "♾ Навсегда"
+    else:
+        sub_text = f"✅ {sub_info['days_left']} дней"
+    return _USER_INFO.format(
+        user_id=user['user_id'],
+        username=user['username'] or 'Нет',
+        nickname=user['nickname'],
+        password='🔒 хэширован' if is_hashed(user['password']) else '⚠️ не хэширован',
+        reg_date=datetime.fromisoformat(user['registered_at']).strftime("%d.%m.%Y %H:%M"),
+        total_paid=user['total_paid'],
+        sub_text=sub_text,
+        ban_text="🚫 Да" if user['is_banned'] else "✅ Нет",
+        key=user['activated_key'] or 'Нет'
+    )
+
+
+def admin_stats(stats: Dict) -> str:
+    return _ADMIN_STATS.format_map(stats)
+
+
+def _more(total: int, limit: int) -> str:
+    return f"\n... и ещё {total - limit}" if total > limit else ""
+
+
+def users_with_sub(users: List[Dict], subs: Dict[int, Dict], limit: int = 20) -> str:
+    """Админка: пользователи с активной подпиской (subs — user_id -> подписка)"""
+    text = "📋 <b>Пользователи с подпиской</b>\n\n"
+    if not users:
+        return text + "Список пуст."
+    for i, user in enumerate(users[:limit], 1):
+        sub_info = subs[user['user_id']]
+        sub_text = "♾" if sub_info['type'] == 'forever' else f"{sub_info['days_left']}д"
+        text += f"{i}. {user['nickname']} (<code>{user['user_id']}</code>) - {sub_text}\n"
+    return text + _more(len(users), limit)
+
+
+def banned_users(users: List[Dict], limit: int = 20) -> str:
+    text = "🚫 <b>Забаненные пользователи</b>\n\n"
+    if not users:
+        return text + "Список пуст."
+    for i, user in enumerate(users[:limit], 1):
+        text += f"{i}. {user['nickname']} (<code>{user['user_id']}</code>)\n"
+        text += f"   Причина: {user['ban_reason'] or 'Не указана'}\n"
+    return text
+
+
+def keys_list(keys: List[Dict], unused_only: bool = False, limit: int = 15) -> str:
+    """Админка: все ключи (со статусом) или только неиспользованные"""
+    text = "✅ <b>Неиспользованные ключи</b>\n\n" if unused_only else "🔑 <b>Все ключи</b>\n\n"
+    if not keys:
+        return text + "Список пуст."
+    for key in keys[:limit]:
+        status = "" if unused_only else ("✅ " if not key['is_used'] else "❌ ")
+        text += f"{status}<code>{key['key']}</code>\n"
+        text += f"   Тип: {key['key_type']}, Дней: {key['days'] or '∞'}\n"
+    return text + _more(len(keys), limit)
+
+
+def user_logs(user_id: int, logs: List[Dict]) -> str:
+    text = f"📜 <b>Логи пользователя {user_id}</b>\n\n"
+    for log in logs:
+        dt = datetime.fromisoformat(log['created_at']).strftime("%d.%m %H:%M")
+        text += f"[{dt}] {log['action']}: {log['details']}\n"
+    return text
+
+
+def _tariffs(payments: List[Dict]) -> str:
+    return ", ".join(SUBSCRIPTION_NAMES.get(p['subscription_type'], p['subscription_type']) for p in payments)
+
+
+def payment_confirmed(payments: List[Dict]) -> str:
+    """Пользователю: подтверждены его платежи (обычно один) из confirm_payments"""
+    end = payments[-1]['subscription_end']
+    if end == 'forever':
+        end_text = "♾ Навсегда"
+    elif end:
+        end_text = f"до {datetime.fromisoformat(end).strftime('%d.%m.%Y %H:%M')}"
+    else:
+        end_text = "Активна"
+    return _PAYMENT_CONFIRMED.format(
+        name=_tariffs(payments), amount=sum(p['amount'] for p in payments), end_text=end_text
+    )
+
+
+def payment_rejected(payments: List[Dict]) -> str:
+    return _PAYMENT_REJECTED.format(name=_tariffs(payments), amount=sum(p['amount'] for p in payments))
+
+
+def payments_review(page: List[Dict], total: int, selected: int) -> str:
+    """Страница очереди ожидающих платежей в админке"""
+    if not page:
+        return "💰 <b>Ожидающие платежи</b>\n\nНет ожидающих платежей."
+    items = "".join(
+        _REVIEW_ITEM.format(
+            id=p['id'],
+            nickname=p['nickname'] or p['user_id'],
+            amount=p['amount'],
+            name=SUBSCRIPTION_NAMES.get(p['subscription_type'], p['subscription_type']),
+            created=datetime.fromisoformat(p['created_at']).strftime("%d.%m %H:%M")
+        )
+        for p in page
+    )
+    return (
+        f"💰 <b>Ожидающие платежи</b> ({total})\n\n{items}"
+        f"Отметьте платежи кнопками ниже и подтвердите или отклоните их разом.\n"
+        f"Выбрано: <b>{selected}</b>"
+    )
+
+
+_PAYMENT_STATUS = {
+    'pending': '⏳',
+    'confirmed': '✅',
+    'rejected': '❌'
+}
+
+
+def user_payments(payments: List[Dict], first_page: bool = True) -> str:
+    """Страница истории платежей пользователя (Database.get_user_payments)"""
+    if not payments:
+        if first_page:
+            return "💳 <b>История платежей</b>\n\nУ вас пока нет платежей."
+        return "💳 <b>История платежей</b>\n\nБолее ранних платежей нет."
+    lines = [
+        f"{_PAYMENT_STATUS.get(p['status'], '❓')} #{p['id']} | "
+        f"{SUBSCRIPTION_NAMES.get(p['subscription_type'], p['subscription_type'])} | {p['amount']}₽ | "
+        f"{datetime.fromisoformat(p['created_at']).strftime('%d.%m.%Y')}"
+        for p in payments
+    ]
+    return "💳 <b>История платежей</b>\n\n" + "\n".join(lines)
+
+
+def _statement_lines(items, limit: int) -> str:
+    lines = [
+        f"стр. {row.line}: {row.amount / 100:g}₽ «{escape(row.comment[:40])}» — {reason}"
+        for row, reason in items[:limit]
+    ]
+    if len(items) > limit:
+        lines.append(f"…и ещё {len(items) - limit}")
+    return "\n".join(lines)
+
+
+def reconcile_report(report, confirmed: int, limit: int = 15) -> str:
+    """Итог сверки выписки (reconcile.ReconcileReport)"""
+    text = (
+        "📥 <b>Сверка с выпиской</b>\n\n"
+        f"Строк в выписке: {report.rows} (расходных и пустых: {report.skipped})\n"
+        f"✅ Подтверждено: <b>{confirmed}</b>\n"
+        f"⚠️ Неоднозначно: {len(report.ambiguous)}\n"
+        f"❓ Не найдено: {len(report.unmatched)}"
+    )
+    if report.already_used:
+        text += f"\n🔁 Учтены по прошлым выпискам: {report.already_used}"
+    if len(report.matched) > confirmed:
+        text += f"\n\nУже обработаны другим админом: {len(report.matched) - confirmed}"
+    if report.ambiguous:
+        text += "\n\n<b>⚠️ Проверьте вручную:</b>\n" + _statement_lines(report.ambiguous, limit)
+    if report.unmatched:
+        text += "\n\n<b>❓ Без заявки:</b>\n" + _statement_lines(report.unmatched, limit)
+    return text
+
+
+_EVENT_PROBLEMS = {
+    'not_found': "нет такой заявки",
+    'not_pending': "заявка уже обработана",
+    'amount_mismatch': "сумма не совпадает",
+}
+
+
+def payment_events_report(confirmed: List[Dict], problems: List[Dict], limit: int = 15) -> str:
+    """Админам: итог пачки уведомлений провайдера (payment_events.py)"""
+    text = "💳 <b>Оплаты от провайдера</b>"
+    if confirmed:
+        text += f"\n\n✅ Подтверждено автоматически: <b>{len(confirmed)}</b> на {sum(p['amount'] for p in confirmed)}₽"
+    if problems:
+        lines = [
+            f"{escape(e['provider'])} {escape(e['txn_id'])}: заявка #{e['payment_id']}, "
+            f"{e['amount']}₽ — {_EVENT_PROBLEMS[e['status']]}"
+            for e in problems[:limit]
+        ]
+        if len(problems) > limit:
+            lines.append(f"…и ещё {len(problems) - limit}")
+        text += "\n\n<b>⚠️ Проверьте вручную:</b>\n" + "\n".join(lines)
+    return text
+
+
+def promo_result(status: str, promo: Optional[Dict]) -> str:
+    """Ответ пользователю на введённый промокод (promo.PromoCodes.redeem)"""
+    if status != 'ok':
+        return _PROMO_REFUSED[status]
+    lines = [f"✅ <b>Промокод {promo['code']} активирован!</b>\n"]
+    if promo['bonus_days']:
+        lines.append(f"📅 К подписке добавлено дней: <b>{promo['bonus_days']}</b>")
+    if promo['discount']:
+        lines.append(f"💰 Скидка <b>{promo['discount']}%</b> будет применена к следующей оплате")
+    return "\n".join(lines)
+
+
+def promo_created(promo: Dict) -> str:
+    uses = promo['max_uses'] if promo['max_uses'] is not None else "∞"
+    expires = datetime.fromisoformat(promo['expires_at']).strftime('%d.%m.%Y %H:%M') if promo['expires_at'] else "бессрочно"
+    return (
+        f"✅ <b>Промокод создан</b>\n\n"
+        f"🎁 Код: <code>{promo['code']}</code>\n"
+        f"💰 Скидка: {promo['discount']}%\n"
+        f"📅 Бонусные дни: {promo['bonus_days']}\n"
+        f"👥 Активаций: {uses} (на пользователя: {promo['per_user']})\n"
+        f"⌛ Действует: {expires}"
+    )
+
+
+PROMO_USAGE = (
+    "🎁 <b>Создание промокода</b>\n\n"
+    "<code>/newpromo КОД скидка% бонус_дней [активаций] [на_пользователя] [дней_действия]</code>\n\n"
+    "Активаций 0 — без ограничения. Пример:\n"
+    "<code>/newpromo RAVEN20 20 0 500 1 14</code> — скидка 20%, 500 активаций, 14 дней"
+)
+
+
+_SPARK = "▁▂▃▄▅▆▇█"
+
+
+def _trend(current: float, previous: float) -> str:
+    """Изменение к предыдущему периоду"""
+    if not previous:
+        return " (🆕)" if current else ""
+    change = round((current - previous) / previous * 100)
+    if change == 0:
+        return " (= 0%)"
+    return f" ({'▲' if change > 0 else '▼'} {abs(change)}%)"
+
+
+def _sparkline(values: List[float], width: int = 30) -> str:
+    """Мини-график: не больше width столбиков, дни объединяются поровну"""
+    step = -(-len(values) // width)
+    buckets = [sum(values[i:i + step]) for i in range(0, len(values), step)]
+    top = max(buckets)
+    if not top:
+        return _SPARK[0] * len(buckets)
+    return "".join(_SPARK[min(7, int(value / top * 7.999))] for value in buckets)
+
+
+def analytics_report(data: Dict) -> str:
+    """Экран аналитики из Database.get_analytics"""
+    current, previous = data['current'], data['previous']
+    lines = [
+        f"📈 <b>Аналитика за {data['days']} дн.</b>",
+        f"<i>в скобках — к предыдущим {data['days']} дн.</i>\n",
+        f"💰 Выручка: <b>{current['revenue']:g}₽</b>{_trend(current['revenue'], previous['revenue'])}",
+    ]
+    tariffs = sorted(data['by_tariff'].items(), key=lambda item: -item[1][0])
+    for index, (sub_type, (revenue, count)) in enumerate(tariffs):
+        branch = "└" if index == len(tariffs) - 1 else "├"
+        lines.append(f"{branch} {SUBSCRIPTION_NAMES.get(sub_type, sub_type)}: {revenue:g}₽ · {count:g} шт.")
+
+    registrations = current['registrations']
+    conversion = f"{current['cohort_paid'] / registrations * 100:.1f}%" if registrations else "—"
+    lines += [
+        "",
+        f"✅ Подтверждено: {current['payments_confirmed']:g}{_trend(current['payments_confirmed'], previous['payments_confirmed'])}",
+        f"❌ Отклонено: {current['payments_rejected']:g}",
+        f"👥 Регистрации: {registrations:g}{_trend(registrations, previous['registrations'])}",
+        f"💳 Первые оплаты: {current['first_payments']:g}",
+        f"🔄 Конверсия в оплату: <b>{conversion}</b> ({current['cohort_paid']:g} из {registrations:g} зарегистрированных)",
+        f"🔑 Активации ключей: {current['key_activations']:g}{_trend(current['key_activations'], previous['key_activations'])}",
+        "",
+        "Выручка по дням:",
+        f"<code>{_sparkline(data['daily_revenue'])}</code>",
+    ]
+    return "\n".join(lines)
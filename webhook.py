@@ -0,0 +1,59 @@
+# webhook.py - приём апдейтов Telegram через встроенный aiohttp сервер
+#
+# Telegram получает 200 сразу после проверки секрета и разбора JSON, а сам
+# апдейт обрабатывается в фоновой задаче (handle_in_background), поэтому
+# медленный хендлер не задерживает доставку следующих апдейтов.
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_REQUESTS = Counter("raven_bot_webhook_requests_total", "Запросы к вебхуку по статусу ответа", ("status",))
+
+
+@web.middleware
+async def count_requests(request: web.Request, handler):
+    response = await handler(request)
+    WEBHOOK_REQUESTS.inc(status=response.status)
+    return response
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, secret: str = WEBHOOK_SECRET, path: str = WEBHOOK_PATH) -> web.Application:
+    """aiohttp приложение с эндпоинтом вебхука"""
+    app = web.Application(middlewares=[count_requests])
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret,
+        handle_in_background=True
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Запуск сервера и регистрация вебхука в Telegram"""
+    app = create_webhook_app(bot, dp)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+
+    await bot.set_webhook(
+        WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True
+    )
+    logger.info(f"🌐 Вебхук: {WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH} -> {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
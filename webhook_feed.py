@@ -0,0 +1,123 @@
+# webhook_feed.py - локальная проверка вебхука синтетическими апдейтами
+#
+# Поднимает приложение из webhook.py на свободном порту с тестовым
+# диспетчером (хендлеры только считают апдейты и имитируют работу), шлёт
+# в него сообщения и нажатия кнопок с правильным и неправильным секретом и
+# проверяет, что:
+#   - запросы с верным секретом получают 200 сразу, не дожидаясь хендлера;
+#   - запросы с неверным секретом получают 401 и не доходят до хендлеров;
+#   - все принятые апдейты обработаны.
+#
+# Пример:
+#   python webhook_feed.py --updates 500 --handler-delay 0.2
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from aiogram import Bot, Dispatcher, F
+from aiohttp import ClientSession, web
+
+from webhook import create_webhook_app
+
+SECRET = "webhook_feed_secret"
+PATH = "/telegram/webhook"
+
+
+def synthetic_update(update_id: int) -> dict:
+    user = {"id": 100_000 + update_id % 50, "is_bot": False, "first_name": "Feed"}
+    chat = {"id": user["id"], "type": "private"}
+    if update_id % 2:
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": "feed", "data": "main_menu",
+                "message": {"message_id": update_id, "date": int(time.time()), "chat": chat, "text": "menu"}
+            }
+        }
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": user, "text": "/start"}
+    }
+
+
+async def run(updates: int, handler_delay: float, bad_secret_every: int) -> dict:
+    handled = []
+    dp = Dispatcher()
+
+    @dp.message()
+    @dp.callback_query(F.data)
+    async def handle(event):
+        await asyncio.sleep(handler_delay)
+        handled.append(event)
+
+    bot = Bot("42:FEED")
+    app = create_webhook_app(bot, dp, secret=SECRET, path=PATH)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}{PATH}"
+
+    statuses = {}
+    ack_latencies = []
+    accepted = 0
+
+    async with ClientSession() as session:
+        async def post(update_id: int):
+            nonlocal accepted
+            bad = bad_secret_every and update_id % bad_secret_every == 0
+            headers = {"X-Telegram-Bot-Api-Secret-Token": "wrong" if bad else SECRET}
+            start = time.perf_counter()
+            async with session.post(url, json=synthetic_update(update_id), headers=headers) as response:
+                await response.read()
+            ack_latencies.append(time.perf_counter() - start)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+            if response.status == 200:
+                accepted += 1
+
+        await asyncio.gather(*(post(i) for i in range(1, updates + 1)))
+
+    # Ждём завершения фоновой обработки
+    deadline = time.perf_counter() + handler_delay + 10
+    while len(handled) < accepted and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+    await runner.cleanup()
+
+    ack_latencies.sort()
+    return {
+        "updates": updates,
+        "statuses": statuses,
+        "accepted": accepted,
+        "handled": len(handled),
+        "handler_delay_ms": handler_delay * 1000,
+        "ack_p50_ms": round(ack_latencies[len(ack_latencies) // 2] * 1000, 3),
+        "ack_max_ms": round(ack_latencies[-1] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка вебхука синтетическими апдейтами")
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--handler-delay", type=float, default=0.5, help="Имитация времени работы хендлера (сек)")
+    parser.add_argument("--bad-secret-every", type=int, default=10, help="Каждый N-й запрос с неверным секретом")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.updates, args.handler_delay, args.bad_secret_every))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    rejected = args.updates // args.bad_secret_every if args.bad_secret_every else 0
+    ok = (
+        report["statuses"].get(401, 0) == rejected
+        and report["handled"] == report["accepted"] == args.updates - rejected
+        and report["ack_max_ms"] < args.handler_delay * 1000
+    )
+    print("✅ Вебхук работает корректно" if ok else "❌ Проверка не пройдена")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()